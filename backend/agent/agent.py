@@ -1,38 +1,84 @@
 from dotenv import load_dotenv
+import hashlib
+import json
+import math
 import os
-from google import genai
+import re
 import sys
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from tool.ExchangeRate import TaiwanExchangeRate
+from tool.Currency import SUPPORTED_CURRENCIES
+from tool.RateCache import RateCache
+from tool.Parallel import map_with_deadline, TIMED_OUT
+from tool import BatchConversion
+from tool.RateAnalytics import RateAnalytics
+from tool.Metrics import METRICS
+from tool.Tracing import TRACER, KIND_CLIENT, run_in_context
+from agent.query_parser import QueryParser
+from agent.intent_cache import IntentCache
+
+
+# 串流中的 AI 回應一出現貨幣代碼就先預取匯率
+_CURRENCY_FIELD = re.compile(r'"currency"\s*:\s*"([A-Za-z]{3})"')
 
 
 class AI_Agent:
     load_dotenv()
 
-    def __init__(self, api_key=None, api_secret=None):
+    AI_MODEL = 'gemini-2.0-flash-exp'
+
+    def __init__(self, api_key=None, api_secret=None, rate_cache_ttl: float = None, rate_cache_size: int = 64,
+                 intent_cache_size: int = 512, intent_cache_path: str = None, route_threshold: float = None):
         """
         初始化 AI Agent - 銀行員角色
 
         Args:
             api_key: Gemini API key (可選，會從環境變數讀取)
             api_secret: API secret (可選)
+            rate_cache_ttl: 最新匯率的快取秒數 (可選，預設讀取環境變數 RATE_CACHE_TTL 或 300 秒)
+            rate_cache_size: 最新匯率快取的最大貨幣數量
+            intent_cache_size: AI 意圖快取的最大模板數量 (0 表示停用)
+            intent_cache_path: AI 意圖快取檔案路徑 (可選，預設讀取環境變數 INTENT_CACHE_PATH)
+            route_threshold: 規則解析可信度達到此值時不呼叫 Gemini (可選，預設讀取環境變數 ROUTE_THRESHOLD 或 0.8)
         """
         self.api_key = api_key or os.environ.get("GEMINI_API_KEY")
         self.ai_type = "gemini"
 
-        # 初始化 Gemini 客戶端 (僅在有 API key 時初始化)
-        if self.api_key:
-            try:
-                self.client = genai.Client(api_key=self.api_key)
-            except Exception as e:
-                print(f"Warning: Failed to initialize Gemini client: {e}")
-                self.client = None
-        else:
-            # 沒有 API key 時不初始化 AI client (匯率功能不需要)
-            self.client = None
-
-        # 初始化匯率查詢工具
-        self.exchange_rate = TaiwanExchangeRate()
+        # Gemini 客戶端與匯率查詢工具都延遲到第一次使用時才初始化，
+        # 避免啟動時就載入 google.genai、pandas 與 requests
+        self._lazy_lock = threading.Lock()
+        self._client = None
+        self._client_initialized = False
+        self._exchange_rate = None
+
+        # 最新匯率快取 (過期後先回傳舊值並在背景更新)
+        if rate_cache_ttl is None:
+            rate_cache_ttl = float(os.environ.get("RATE_CACHE_TTL", 300))
+        self.rate_cache = RateCache(maxsize=rate_cache_size, ttl=rate_cache_ttl)
+
+        # 各貨幣的增量統計 (3 日與 7 日視窗)，refresh_all_rates 與趨勢查詢時更新
+        self.analytics = RateAnalytics(windows=(3, 7))
+
+        # 離線模式的查詢解析器 (建立時一次編譯所有貨幣代碼、名稱與別名)
+        self.query_parser = QueryParser(SUPPORTED_CURRENCIES)
+
+        # 查詢路由：規則解析可信度足夠時直接處理，只有不確定或詢問建議的查詢才交給 Gemini
+        if route_threshold is None:
+            route_threshold = float(os.environ.get("ROUTE_THRESHOLD", 0.8))
+        self.route_threshold = route_threshold
+        self._route_lock = threading.Lock()
+        self._route_counts = {"rules": 0, "llm": 0, "intent_cache": 0, "llm_fallback": 0, "offline": 0}
+
+        # AI 意圖快取：相同句型的查詢 (只差金額或貨幣) 直接重用 Gemini 的解析結果
+        # 提示詞或模型變更時版本不同，舊的快取檔案不會被載入
+        self._system_prompt = self._build_system_prompt()
+        version = hashlib.sha1(f"{self.AI_MODEL}\n{self._system_prompt}".encode("utf-8")).hexdigest()[:12]
+        self.intent_cache = IntentCache(
+            self.query_parser, maxsize=intent_cache_size, path=intent_cache_path, version=version
+        ) if intent_cache_size > 0 else None
 
         # 銀行員角色設定
         self.role = "銀行員"
@@ -47,6 +93,41 @@ class AI_Agent:
             "SGD": {"max_amount": 30000, "name": "新加坡"},
         }
 
+    @property
+    def client(self):
+        """Gemini 客戶端 (僅在有 API key 時初始化，沒有 API key 時為 None)"""
+        if not self._client_initialized:
+            with self._lazy_lock:
+                if not self._client_initialized:
+                    if self.api_key:
+                        try:
+                            from google import genai
+                            self._client = genai.Client(api_key=self.api_key)
+                        except Exception as e:
+                            print(f"Warning: Failed to initialize Gemini client: {e}")
+                            self._client = None
+                    self._client_initialized = True
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+        self._client_initialized = True
+
+    @property
+    def exchange_rate(self):
+        """匯率查詢工具 (TaiwanExchangeRate)"""
+        if self._exchange_rate is None:
+            with self._lazy_lock:
+                if self._exchange_rate is None:
+                    from tool.ExchangeRate import TaiwanExchangeRate
+                    self._exchange_rate = TaiwanExchangeRate()
+        return self._exchange_rate
+
+    @exchange_rate.setter
+    def exchange_rate(self, value):
+        self._exchange_rate = value
+
     def get_exchange_rate(self, currency: str, rate_type: str = "cash_sell"):
         """
         取得指定貨幣的匯率
@@ -58,34 +139,40 @@ class AI_Agent:
         Returns:
             dict: 包含匯率資訊的字典
         """
-        try:
-            rate = self.exchange_rate.get_latest_rate(currency)
-
-            if not rate:
+        with TRACER.span("agent.get_exchange_rate", attributes={"currency": currency.upper()}) as span:
+            try:
+                rate = self.rate_cache.get_or_load(currency.upper(), self.exchange_rate.get_latest_rate)
+                return self._rate_response(currency, rate, rate_type)
+            except Exception as e:
+                span.record_error(str(e))
                 return {
                     "success": False,
-                    "error": f"無法取得 {currency} 的匯率資訊",
+                    "error": str(e),
                     "currency": currency
                 }
 
-            return {
-                "success": True,
-                "currency": currency,
-                "date": rate.get("date"),
-                "cash_buy": float(rate.get("cash_buy", 0)),
-                "cash_sell": float(rate.get("cash_sell", 0)),
-                "spot_buy": float(rate.get("spot_buy", 0)),
-                "spot_sell": float(rate.get("spot_sell", 0)),
-                "selected_rate": float(rate.get(rate_type, 0)),
-                "rate_type": rate_type
-            }
-        except Exception as e:
+    @staticmethod
+    def _rate_response(currency: str, rate: dict, rate_type: str):
+        """將最新匯率資料轉為 get_exchange_rate 的回應格式"""
+        if not rate:
             return {
                 "success": False,
-                "error": str(e),
+                "error": f"無法取得 {currency} 的匯率資訊",
                 "currency": currency
             }
 
+        return {
+            "success": True,
+            "currency": currency,
+            "date": rate.get("date"),
+            "cash_buy": float(rate.get("cash_buy", 0)),
+            "cash_sell": float(rate.get("cash_sell", 0)),
+            "spot_buy": float(rate.get("spot_buy", 0)),
+            "spot_sell": float(rate.get("spot_sell", 0)),
+            "selected_rate": float(rate.get(rate_type, 0)),
+            "rate_type": rate_type
+        }
+
     def calculate_exchange(self, currency: str, twd_amount: float, is_buying: bool = True):
         """
         計算換匯金額
@@ -102,11 +189,22 @@ class AI_Agent:
             # 買入外幣用銀行的賣出價，賣出外幣用銀行的買入價
             rate_type = "cash_sell" if is_buying else "cash_buy"
             rate_info = self.get_exchange_rate(currency, rate_type)
+            return self._calculate_response(currency, twd_amount, is_buying, rate_info)
 
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    def _calculate_response(self, currency: str, twd_amount: float, is_buying: bool, rate_info: dict):
+        """以 get_exchange_rate 的結果計算換匯金額 (calculate_exchange 的回應格式)"""
+        try:
             if not rate_info["success"]:
                 return rate_info
 
             rate = rate_info["selected_rate"]
+            rate_type = rate_info["rate_type"]
 
             # 計算外幣金額
             if is_buying:
@@ -142,19 +240,125 @@ class AI_Agent:
                 "error": str(e)
             }
 
-    def get_multiple_rates(self, currencies: list):
+    def calculate_exchange_batch(self, currencies: list, amounts: list, is_buying=True, timeout: float = 20.0):
         """
-        取得多種貨幣的匯率
+        批次計算換匯金額 (例如一次核對大量帳目)
+
+        每種貨幣的匯率只查詢一次 (平行查詢)，金額、四捨五入與限額檢查以 numpy 向量運算一次完成
+        (未安裝 numpy 時逐列計算)，結果與逐筆呼叫 calculate_exchange 相同。
+
+        Args:
+            currencies: 每一列的貨幣代碼
+            amounts: 每一列的台幣金額
+            is_buying: 每一列是否為買入外幣 (列表)，或套用到所有列的單一值
+            timeout: 匯率查詢的期限秒數
+
+        Returns:
+            dict: 依輸入順序的欄位陣列 (foreign_amounts、rates、rate_types)，
+                  使用的匯率 (rates_used)，超過限額的警告 (warnings) 與無法計算的列 (errors)
+        """
+        count = len(currencies)
+        if len(amounts) != count:
+            return {"success": False, "error": "currencies 與 amounts 的長度不同"}
+        if isinstance(is_buying, (list, tuple)):
+            if len(is_buying) != count:
+                return {"success": False, "error": "is_buying 的長度與 currencies 不同"}
+            directions = [bool(value) for value in is_buying]
+        else:
+            directions = [bool(is_buying)] * count
+
+        # 先檢查輸入，格式錯誤或不支援的貨幣不需要查詢匯率
+        try:
+            values = [float(amount) for amount in amounts]
+        except (TypeError, ValueError) as e:
+            return {"success": False, "error": f"金額格式錯誤: {e}"}
+
+        codes = [str(currency).upper() for currency in currencies]
+        unique = list(dict.fromkeys(codes))
+        position = {code: i for i, code in enumerate(unique)}
+
+        # 每種支援的貨幣只查詢一次匯率
+        supported = [code for code in unique if code in SUPPORTED_CURRENCIES]
+        rate_infos = self.get_multiple_rates(supported, timeout=timeout)["rates"] if supported else {}
+        for code in unique:
+            if code not in rate_infos:
+                rate_infos[code] = {"success": False, "error": f"不支援的貨幣: {code}", "currency": code}
+        nan = float('nan')
+        sell_rates, buy_rates, max_amounts = [], [], []
+        for code in unique:
+            info = rate_infos[code]
+            sell_rates.append(info["cash_sell"] if info["success"] else nan)
+            buy_rates.append(info["cash_buy"] if info["success"] else nan)
+            max_amounts.append(self.bank_rules.get(code, {}).get("max_amount", float('inf')))
+
+        result = BatchConversion.convert(
+            [position[code] for code in codes], values, directions, sell_rates, buy_rates, max_amounts
+        )
+
+        warnings = []
+        errors = []
+        for i, (code, over) in enumerate(zip(codes, result["over_limit"])):
+            info = rate_infos[code]
+            if not info["success"]:
+                errors.append({"index": i, "currency": code, "error": info.get("error")})
+            elif math.isnan(result["foreign_amounts"][i]):
+                # 與 calculate_exchange 相同，匯率為 0 或缺少時視為錯誤
+                rate_type = "cash_sell" if directions[i] else "cash_buy"
+                errors.append({"index": i, "currency": code, "error": f"{rate_type} 匯率無法使用: {info.get(rate_type)}"})
+            elif over:
+                max_amount = max_amounts[position[code]]
+                warnings.append({
+                    "index": i,
+                    "message": f"注意：買入金額 {result['foreign_amounts'][i]:.2f} {code} 超過單日限額 {max_amount} {code}"
+                })
+
+        return {
+            "success": True,
+            "count": count,
+            "currencies": codes,
+            "twd_amounts": values,
+            "is_buying": directions,
+            "foreign_amounts": BatchConversion.nan_to_none(result["foreign_amounts"]),
+            "rates": BatchConversion.nan_to_none(result["rates"]),
+            "rate_types": ["cash_sell" if buying else "cash_buy" for buying in directions],
+            "rates_used": {
+                code: {
+                    "cash_sell": info["cash_sell"],
+                    "cash_buy": info["cash_buy"],
+                    "date": info["date"]
+                } for code, info in rate_infos.items() if info["success"]
+            },
+            "warnings": warnings,
+            "errors": errors
+        }
+
+    def get_multiple_rates(self, currencies: list, max_workers: int = 8, timeout: float = 20.0):
+        """
+        取得多種貨幣的匯率 (平行查詢)
 
         Args:
             currencies: 貨幣代碼列表
+            max_workers: 同時查詢的最大數量
+            timeout: 整批查詢的期限秒數，逾時的貨幣會回傳失敗結果
 
         Returns:
-            dict: 匯率資訊字典
+            dict: 匯率資訊字典 (依輸入順序)
         """
         results = {}
-        for currency in currencies:
-            results[currency] = self.get_exchange_rate(currency)
+        for currency, result in map_with_deadline(self.get_exchange_rate, currencies, max_workers, timeout):
+            if result is TIMED_OUT:
+                result = {
+                    "success": False,
+                    "error": f"查詢 {currency} 匯率逾時",
+                    "currency": currency
+                }
+            elif isinstance(result, Exception):
+                result = {
+                    "success": False,
+                    "error": str(result),
+                    "currency": currency
+                }
+            results[currency] = result
 
         return {
             "success": True,
@@ -162,6 +366,92 @@ class AI_Agent:
             "timestamp": self.exchange_rate.get_now().isoformat()
         }
 
+    def refresh_all_rates(self, currencies: list = None):
+        """
+        以單一 API 請求更新所有貨幣的最新匯率快取
+
+        Args:
+            currencies: 貨幣代碼列表 (可選，預設為所有支援的貨幣)
+
+        Returns:
+            dict: 已更新的貨幣列表 (refreshed) 與各貨幣最新匯率的日期 (dates)
+        """
+        try:
+            end_date = self.exchange_rate.get_now()
+            start_date = end_date - timedelta(days=7)
+            series = self.exchange_rate.fetch_all_series(
+                start_date.strftime("%Y-%m-%d"),
+                end_date.strftime("%Y-%m-%d"),
+                currencies
+            )
+
+            dates = {}
+            for currency, item in series.items():
+                latest = item.latest()
+                if latest is None:
+                    continue
+                self.rate_cache.put(currency, latest)
+                self.analytics.update(item)
+                dates[currency] = latest["date"]
+
+            return {
+                "success": True,
+                "refreshed": list(dates),
+                "dates": dates,
+                "timestamp": end_date.isoformat()
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    def get_rate_stats(self, currency: str):
+        """
+        取得匯率統計 (平均、最小/最大、波動度、買賣價差)
+
+        統計在快取 TTL 內更新過時直接回傳，否則查詢一次最近 7 天的匯率並增量更新。
+
+        Args:
+            currency: 貨幣代碼
+
+        Returns:
+            dict: RateAnalytics.stats() 的結果
+        """
+        currency = currency.upper()
+        with TRACER.span("agent.get_rate_stats", attributes={"currency": currency}) as span:
+            try:
+                fresh = self.analytics.is_fresh(currency, self.rate_cache.ttl)
+                span.set_attribute("analytics.fresh", fresh)
+                if not fresh:
+                    self._update_analytics(self.exchange_rate.get_historical_series(currency, days=7))
+                return self._stats_response(currency)
+            except Exception as e:
+                span.record_error(str(e))
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "currency": currency
+                }
+
+    def _stats_response(self, currency: str):
+        """讀取已算好的統計 (get_rate_stats 的回應格式)"""
+        stats = self.analytics.stats(currency)
+        if stats is None:
+            return {
+                "success": False,
+                "error": f"無法取得 {currency} 的匯率資訊",
+                "currency": currency
+            }
+        return {"success": True, **stats}
+
+    def _update_analytics(self, series):
+        """以歷史序列更新統計，並順便更新最新匯率快取"""
+        self.analytics.update(series)
+        latest = series.latest()
+        if latest is not None:
+            self.rate_cache.put(series.currency, latest)
+
     def get_bank_rules(self, currency: str = None):
         """
         取得銀行換匯規則
@@ -184,6 +474,21 @@ class AI_Agent:
             "all_rules": self.bank_rules
         }
 
+    def get_cache_stats(self):
+        """
+        取得匯率快取與 AI 意圖快取的統計資料
+
+        Returns:
+            dict: 快取命中、未命中與淘汰次數
+        """
+        return {
+            "success": True,
+            "rate_cache": self.rate_cache.stats(),
+            "intent_cache": self.intent_cache.stats() if self.intent_cache is not None else None,
+            # 匯率查詢工具尚未初始化時不為了統計而建立
+            "single_flight": self._exchange_rate.inflight.stats() if self._exchange_rate is not None else None
+        }
+
     def roles(self):
         """
         返回銀行員角色資訊和換匯規則
@@ -194,7 +499,7 @@ class AI_Agent:
         return {
             "role": self.role,
             "description": "專業的銀行外匯櫃員，提供匯率查詢和換匯服務",
-            "supported_currencies": list(TaiwanExchangeRate.SUPPORTED_CURRENCIES.keys()),
+            "supported_currencies": list(SUPPORTED_CURRENCIES.keys()),
             "bank_rules": self.bank_rules,
             "services": [
                 "即時匯率查詢",
@@ -204,70 +509,99 @@ class AI_Agent:
             ]
         }
 
-    def process_query(self, query: str):
+    def process_query(self, query: str, history: Optional[dict] = None):
         """
-        處理用戶查詢 (使用 AI 理解自然語言)
+        處理用戶查詢
+
+        先以規則解析器解析，可信度達到 route_threshold 時直接處理；
+        詢問趨勢/建議或規則無法確定的查詢才交給 Gemini 理解自然語言。
 
         Args:
             query: 用戶查詢內容
+            history: advice 回應中歷史匯率的輸出選項 (可選，RateSeries.to_columns 的 max_points、delta)
 
         Returns:
             dict: 查詢結果
         """
-        try:
-            # 如果沒有 Gemini client，使用簡單的關鍵字匹配
-            if not self.client:
-                return self._simple_query_processing(query)
+        # 追蹤紀錄不包含查詢內容，只記錄解析結果
+        with TRACER.span("agent.process_query") as span:
+            try:
+                parsed = self.query_parser.parse(query)
+                span.set_attribute("query.currency", parsed.currency)
+                span.set_attribute("query.confidence", parsed.confidence)
 
-            # 使用 Gemini AI 理解用戶意圖
-            return self._ai_query_processing(query)
+                # 如果沒有 Gemini client，使用簡單的關鍵字匹配
+                if not self.client:
+                    self._count_route("offline")
+                    return self._simple_query_processing(query, parsed)
 
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "message": "抱歉，處理您的問題時發生錯誤。"
-            }
+                # 規則解析已足夠明確 (一般匯率查詢與換匯計算)，不需要等待 Gemini
+                if parsed.confidence >= self.route_threshold:
+                    self._count_route("rules")
+                    return self._rule_query_processing(query, parsed)
+
+                # 使用 Gemini AI 理解用戶意圖
+                return self._ai_query_processing(query, history)
+
+            except Exception as e:
+                span.record_error(str(e))
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "message": "抱歉，處理您的問題時發生錯誤。"
+                }
+
+    def _count_route(self, route: str):
+        with self._route_lock:
+            self._route_counts[route] += 1
+        span = TRACER.current()
+        if span is not None:
+            span.set_attribute("agent.route", route)
 
-    def _simple_query_processing(self, query: str):
-        """簡單的關鍵字匹配處理"""
-        query_lower = query.lower()
-        import re
+    def get_routing_stats(self):
+        """
+        取得查詢路由的統計資料
+
+        Returns:
+            dict: 各路徑的處理次數 (rules: 規則解析, llm: 呼叫 Gemini, intent_cache: 命中意圖快取,
+                  llm_fallback: Gemini 失敗改用規則解析, offline: 沒有 Gemini client)
+        """
+        with self._route_lock:
+            counts = dict(self._route_counts)
+        total = sum(counts.values())
+        return {
+            "success": True,
+            "threshold": self.route_threshold,
+            "routes": counts,
+            "total": total,
+            "llm_ratio": counts["llm"] / total if total else 0.0
+        }
+
+    def _rule_query_processing(self, query: str, parsed):
+        """
+        以規則解析結果處理查詢 (有 Gemini client 但不需要呼叫時)
+
+        匯率與限額查詢轉為與 AI 相同的 action，回應格式 (含 message) 與 Gemini 路徑一致；
+        換匯計算沿用 _simple_query_processing (支援反向計算)。
+        """
+        if parsed.is_rate_query and parsed.currency:
+            return self._execute_action({"action": "get_rate", "currency": parsed.currency}, query)
+        if parsed.is_rules_query and not parsed.is_exchange_query:
+            return self._execute_action({"action": "get_rules", "currency": parsed.currency}, query)
+        return self._simple_query_processing(query, parsed)
+
+    def _simple_query_processing(self, query: str, parsed=None):
+        """簡單的關鍵字匹配處理 (使用預先編譯的 QueryParser，一次掃描取得貨幣與金額)"""
+        if parsed is None:
+            parsed = self.query_parser.parse(query)
 
         # 匯率查詢
-        if "匯率" in query or "rate" in query_lower:
-            for currency in TaiwanExchangeRate.SUPPORTED_CURRENCIES.keys():
-                if currency.lower() in query_lower or TaiwanExchangeRate.SUPPORTED_CURRENCIES[currency] in query:
-                    return self.get_exchange_rate(currency)
+        if parsed.is_rate_query and parsed.currency:
+            return self.get_exchange_rate(parsed.currency)
 
         # 換匯計算 - 改進版，支援更多格式
-        if "換" in query or "兌換" in query or "exchange" in query_lower:
-            # 查找貨幣（增加常見別名）
-            currency_aliases = {
-                'JPY': ['日圓', '日幣', '日元'],
-                'USD': ['美金', '美元', '美刀'],
-                'EUR': ['歐元'],
-                'CNY': ['人民幣', '人民币', '陸幣'],
-                'GBP': ['英鎊', '英镑'],
-                'HKD': ['港幣', '港币', '港元'],
-                'AUD': ['澳洲', '澳幣', '澳元'],
-                'SGD': ['新加坡', '新幣', '星幣'],
-            }
-
-            found_currency = None
-            for currency, name in TaiwanExchangeRate.SUPPORTED_CURRENCIES.items():
-                # 檢查標準名稱
-                if currency.lower() in query_lower or name in query:
-                    found_currency = currency
-                    break
-                # 檢查別名
-                if currency in currency_aliases:
-                    for alias in currency_aliases[currency]:
-                        if alias in query:
-                            found_currency = currency
-                            break
-                if found_currency:
-                    break
+        if parsed.is_exchange_query:
+            found_currency = parsed.currency
 
             if not found_currency:
                 return {
@@ -275,72 +609,26 @@ class AI_Agent:
                     "message": "請指定要換的貨幣\n例如：「10000台幣換美金」或「我要換15萬日圓」"
                 }
 
+            currency_name = SUPPORTED_CURRENCIES[found_currency]
+
             # 判斷用戶的意圖並提取數字
             # 1. 如果明確提到"台幣"在數字前後 → 用台幣換外幣（正向）
             # 2. 如果數字+萬+外幣名稱（如"15萬日圓"、"100萬美金"）→ 想得到該外幣（反向）
             # 3. 如果數字+外幣名稱（如"15日圓"、"100美金"）→ 想得到該外幣（反向）
             # 4. 如果提到"多少"、"可以換" → 用台幣換外幣（正向）
-
-            has_twd_keyword = '台幣' in query or 'TWD' in query or 'NT' in query
-            currency_name = TaiwanExchangeRate.SUPPORTED_CURRENCIES[found_currency]
-
-            # 構建所有可能的貨幣名稱列表
-            if found_currency in currency_aliases:
-                all_currency_names = [currency_name] + currency_aliases[found_currency]
-            else:
-                all_currency_names = [currency_name]
-
-            # 檢查是否有"數字+萬+貨幣名稱"的模式（如"15萬日幣"）
-            has_wan_currency_pattern = False
-            wan_match = None
-            for name in all_currency_names:
-                pattern = rf'(\d+(?:\.\d+)?)\s*萬\s*{re.escape(name)}'
-                match = re.search(pattern, query)
-                if match:
-                    wan_match = match
-                    has_wan_currency_pattern = True
-                    break
-
-            # 檢查是否有"數字+貨幣名稱"的模式（如"15日圓"、"100美金"）
-            has_direct_currency_pattern = False
-            direct_match = None
-            if not has_wan_currency_pattern:
-                for name in all_currency_names:
-                    pattern = rf'(\d+(?:\.\d+)?)\s*{re.escape(name)}'
-                    match = re.search(pattern, query)
-                    if match:
-                        direct_match = match
-                        has_direct_currency_pattern = True
-                        break
-
-            # 提取金額
-            if wan_match:
-                # "15萬日幣" → 150000
-                amount = float(wan_match.group(1)) * 10000
-            elif direct_match:
-                # "15日幣" → 15
-                amount = float(direct_match.group(1))
-            elif re.search(r'(\d+(?:\.\d+)?)\s*萬', query):
-                # "15萬台幣" → 150000
-                match = re.search(r'(\d+(?:\.\d+)?)\s*萬', query)
-                amount = float(match.group(1)) * 10000
-            else:
-                # 提取連續數字
-                numbers = re.findall(r'\d+(?:\.\d+)?', query)
-                if numbers:
-                    amount = float(numbers[0])
-                else:
-                    return {
-                        "success": True,
-                        "message": f"請提供金額\n例如：「10000台幣換{currency_name}」"
-                    }
+            if parsed.amount is None:
+                return {
+                    "success": True,
+                    "message": f"請提供金額\n例如：「10000台幣換{currency_name}」"
+                }
+            amount = parsed.amount
 
             # 判斷是正向（台幣→外幣）還是反向（外幣→台幣）計算
             # 反向條件（優先）：數字緊鄰外幣名稱（表示想要那麼多外幣）
             # 正向條件：明確提到台幣 OR 有"可以換"/"能換"/"多少"等關鍵字
 
-            is_reverse = (has_wan_currency_pattern or has_direct_currency_pattern) and not has_twd_keyword
-            is_forward = has_twd_keyword or '可以換' in query or '能換' in query or '多少' in query
+            is_reverse = (parsed.has_wan_currency or parsed.has_direct_currency) and not parsed.has_twd_keyword
+            is_forward = parsed.has_twd_keyword or parsed.is_forward_query
 
             if is_forward and not is_reverse:
                 # 正向：用台幣換外幣
@@ -386,7 +674,7 @@ class AI_Agent:
                     return rate_info
 
         # 規則查詢
-        if "規則" in query or "限額" in query or "rule" in query_lower:
+        if parsed.is_rules_query:
             return self.get_bank_rules()
 
         # 默認返回角色資訊
@@ -395,13 +683,11 @@ class AI_Agent:
             "message": "您好！我是銀行外匯櫃員助手。\n\n您可以問我：\n• 「美金匯率多少？」\n• 「10000台幣可以換多少日圓？」\n• 「我要換15萬日圓」\n• 「換匯有什麼限額？」"
         }
 
-    def _ai_query_processing(self, query: str):
-        """使用 Gemini AI 處理自然語言查詢"""
-        try:
-            # 構建系統提示
-            system_prompt = f"""你是一位專業的銀行外匯櫃員助手。
+    def _build_system_prompt(self) -> str:
+        """構建 Gemini 的系統提示"""
+        return f"""你是一位專業的銀行外匯櫃員助手。
 
-支援的貨幣：{', '.join([f"{code}({name})" for code, name in TaiwanExchangeRate.SUPPORTED_CURRENCIES.items()])}
+支援的貨幣：{', '.join([f"{code}({name})" for code, name in SUPPORTED_CURRENCIES.items()])}
 
 你的任務是理解用戶的問題並返回 JSON 格式的回應：
 
@@ -422,47 +708,167 @@ class AI_Agent:
 
 只返回 JSON，不要其他文字。"""
 
-            # 調用 Gemini API
-            response = self.client.models.generate_content(
-                model='gemini-2.0-flash-exp',
-                contents=f"{system_prompt}\n\n用戶問題：{query}"
-            )
+    def _ai_query_processing(self, query: str, history: Optional[dict] = None):
+        """使用 Gemini AI 處理自然語言查詢"""
+        try:
+            # 相同句型已解析過時直接執行，不呼叫 Gemini
+            if self.intent_cache is not None:
+                cached = self.intent_cache.get(query)
+                if cached is not None:
+                    self._count_route("intent_cache")
+                    return self._execute_action(cached, query, history)
 
-            # 解析 AI 回應
-            import json
-            ai_response = response.text.strip()
+            self._count_route("llm")
 
-            # 移除可能的 markdown 代碼塊標記
-            if ai_response.startswith('```'):
-                ai_response = ai_response.split('```')[1]
-                if ai_response.startswith('json'):
-                    ai_response = ai_response[4:]
-                ai_response = ai_response.strip()
+            # 調用 Gemini API
+            with METRICS.track("upstream", "gemini"), \
+                    TRACER.span("gemini.generate_content", kind=KIND_CLIENT,
+                                attributes={"gen_ai.request.model": self.AI_MODEL}):
+                response = self.client.models.generate_content(
+                    model=self.AI_MODEL,
+                    contents=f"{self._system_prompt}\n\n用戶問題：{query}"
+                )
 
-            action_data = json.loads(ai_response)
+            # 解析 AI 回應
+            action_data = self._parse_ai_response(response.text)
+            if self.intent_cache is not None:
+                self.intent_cache.put(query, action_data)
 
             # 根據 AI 的理解執行相應操作
-            return self._execute_action(action_data, query)
+            return self._execute_action(action_data, query, history)
 
         except Exception as e:
             print(f"AI processing error: {e}")
             # 降級到簡單處理
+            self._count_route("llm_fallback")
             return self._simple_query_processing(query)
 
-    def _execute_action(self, action_data: dict, original_query: str):
+    @staticmethod
+    def _parse_ai_response(text: str) -> dict:
+        """將 Gemini 的回應文字解析為 action_data"""
+        ai_response = text.strip()
+
+        # 移除可能的 markdown 代碼塊標記
+        if ai_response.startswith('```'):
+            ai_response = ai_response.split('```')[1]
+            if ai_response.startswith('json'):
+                ai_response = ai_response[4:]
+            ai_response = ai_response.strip()
+
+        return json.loads(ai_response)
+
+    def stream_query(self, query: str, history: Optional[dict] = None):
+        """
+        以串流方式處理用戶查詢
+
+        路由規則與 process_query 相同。需要呼叫 Gemini 時使用串流 API，
+        每收到一段文字就產生 chunk 事件，並在回應中出現貨幣代碼時先在背景預取匯率；
+        不需要呼叫 Gemini 的查詢只會產生最後的 result 事件。
+
+        Args:
+            query: 用戶查詢內容
+            history: advice 回應中歷史匯率的輸出選項 (見 process_query)
+
+        Yields:
+            dict: {"event": "chunk", "text": 新增的文字} 或 {"event": "result", "result": 與 process_query 相同的結果}
+        """
+        try:
+            parsed = self.query_parser.parse(query)
+            if not self.client or parsed.confidence >= self.route_threshold:
+                yield {"event": "result", "result": self.process_query(query, history)}
+                return
+
+            yield from self._ai_query_stream(query, history)
+
+        except Exception as e:
+            yield {"event": "result", "result": {
+                "success": False,
+                "error": str(e),
+                "message": "抱歉，處理您的問題時發生錯誤。"
+            }}
+
+    def _ai_query_stream(self, query: str, history: Optional[dict] = None):
+        """使用 Gemini 串流 API 處理查詢 (見 stream_query)"""
+        if self.intent_cache is not None:
+            cached = self.intent_cache.get(query)
+            if cached is not None:
+                self._count_route("intent_cache")
+                yield {"event": "result", "result": self._execute_action(cached, query, history)}
+                return
+
+        self._count_route("llm")
+        text = ""
+        chunks = 0
+        prefetched = False
+        started = time.perf_counter()
+        # 串流會跨越 yield，不能用 TRACER.span() 設定目前的 span
+        span = TRACER.start_span("gemini.generate_content_stream", kind=KIND_CLIENT,
+                                 attributes={"gen_ai.request.model": self.AI_MODEL})
+        try:
+            try:
+                stream = self.client.models.generate_content_stream(
+                    model=self.AI_MODEL,
+                    contents=f"{self._system_prompt}\n\n用戶問題：{query}"
+                )
+                for chunk in stream:
+                    delta = chunk.text or ""
+                    if not delta:
+                        continue
+                    if not text:
+                        # 第一段文字的等待時間 (使用者看到回應前的延遲)
+                        METRICS.observe("upstream", "gemini_first_chunk", time.perf_counter() - started)
+                        span.set_attribute("gemini.first_chunk_ms", round((time.perf_counter() - started) * 1000, 1))
+                    text += delta
+                    chunks += 1
+                    yield {"event": "chunk", "text": delta}
+
+                    # 與 Gemini 剩餘的輸出重疊查詢匯率
+                    if not prefetched:
+                        match = _CURRENCY_FIELD.search(text)
+                        if match and match.group(1).upper() in SUPPORTED_CURRENCIES:
+                            prefetched = True
+                            threading.Thread(target=run_in_context(self.get_exchange_rate),
+                                             args=(match.group(1).upper(),), daemon=True).start()
+            except GeneratorExit:
+                # 呼叫端提前關閉串流 (例如用戶中斷)
+                span.set_attribute("gemini.closed_early", True)
+                raise
+            except Exception as e:
+                span.record_error(str(e))
+                raise
+            finally:
+                span.set_attribute("gemini.chunks", chunks)
+                TRACER.end_span(span)
+
+            METRICS.observe("upstream", "gemini_stream", time.perf_counter() - started)
+            action_data = self._parse_ai_response(text)
+            if self.intent_cache is not None:
+                self.intent_cache.put(query, action_data)
+            result = self._execute_action(action_data, query, history)
+
+        except Exception as e:
+            print(f"AI processing error: {e}")
+            if not text:
+                METRICS.observe("upstream", "gemini_stream", time.perf_counter() - started, error=True)
+            self._count_route("llm_fallback")
+            result = self._simple_query_processing(query)
+
+        yield {"event": "result", "result": result}
+
+    def _execute_action(self, action_data: dict, original_query: str, history: Optional[dict] = None):
         """根據 AI 解析的動作執行相應操作"""
         action = action_data.get("action")
 
         if action == "get_rate":
             currency = action_data.get("currency", "").upper()
-            if currency in TaiwanExchangeRate.SUPPORTED_CURRENCIES:
+            if currency in SUPPORTED_CURRENCIES:
                 result = self.get_exchange_rate(currency)
                 if result["success"]:
                     return {
                         "success": True,
                         "type": "rate_info",
                         "data": result,
-                        "message": f"📊 {TaiwanExchangeRate.SUPPORTED_CURRENCIES[currency]}（{currency}）最新匯率\n\n"
+                        "message": f"📊 {SUPPORTED_CURRENCIES[currency]}（{currency}）最新匯率\n\n"
                                  f"💰 現金買入：{result['cash_buy']} TWD\n"
                                  f"💵 現金賣出：{result['cash_sell']} TWD\n"
                                  f"📅 日期：{result['date']}\n\n"
@@ -474,7 +880,7 @@ class AI_Agent:
             currency = action_data.get("currency", "").upper()
             amount = action_data.get("amount")
 
-            if currency in TaiwanExchangeRate.SUPPORTED_CURRENCIES and amount:
+            if currency in SUPPORTED_CURRENCIES and amount:
                 result = self.calculate_exchange(currency, float(amount), True)
                 if result["success"]:
                     warning_msg = f"\n\n⚠️ {result['warning']}" if result.get('warning') else ""
@@ -520,32 +926,12 @@ class AI_Agent:
             currency = action_data.get("currency", "").upper()
             context = action_data.get("context", "")
 
-            if currency in TaiwanExchangeRate.SUPPORTED_CURRENCIES:
-                # 獲取歷史匯率
-                historical = self.exchange_rate.get_historical_rates(currency, days=7)
-                current = self.get_exchange_rate(currency)
-
-                if current["success"] and not historical.empty:
-                    # 計算趨勢
-                    recent_avg = historical['cash_sell'].tail(3).mean()
-                    current_rate = current['cash_sell']
-                    trend = "上升" if current_rate > recent_avg else "下降" if current_rate < recent_avg else "持平"
-
-                    return {
-                        "success": True,
-                        "type": "advice",
-                        "data": {
-                            "currency": currency,
-                            "current_rate": current_rate,
-                            "trend": trend,
-                            "historical": historical.to_dict()
-                        },
-                        "message": f"💡 {TaiwanExchangeRate.SUPPORTED_CURRENCIES[currency]} 匯率分析\n\n"
-                                 f"目前匯率：{current_rate}\n"
-                                 f"近期趨勢：{trend}\n"
-                                 f"3日平均：{recent_avg:.3f}\n\n"
-                                 f"{'📈 匯率較高，可考慮觀望' if trend == '上升' else '📉 匯率較低，適合換匯' if trend == '下降' else '➡️ 匯率平穩'}"
-                    }
+            if currency in SUPPORTED_CURRENCIES:
+                # 讀取已算好的統計 (過期時只查詢一次最近 7 天的匯率)
+                stats = self.get_rate_stats(currency)
+                advice = self._advice_response(currency, stats, self._advice_history(currency), history)
+                if advice is not None:
+                    return advice
 
         elif action == "clarify":
             return {
@@ -560,7 +946,42 @@ class AI_Agent:
             "message": "抱歉，我無法理解您的問題。請試試：\n• 「美金匯率多少？」\n• 「10000台幣換日圓」\n• 「日幣限額多少？」"
         }
 
+    def _advice_history(self, currency: str):
+        """advice 回應附帶的最近 7 天匯率"""
+        start_date = (self.exchange_rate.get_now() - timedelta(days=7)).strftime("%Y-%m-%d")
+        return self.analytics.series(currency, start_date)
 
+    @staticmethod
+    def _advice_response(currency: str, stats: dict, historical, history: Optional[dict] = None):
+        """
+        以匯率統計產生趨勢建議
 
+        Args:
+            history: historical 的輸出選項 (RateSeries.to_columns 的 max_points、delta，可選)
 
+        Returns:
+            dict: advice 回應，資料不足時返回 None
+        """
+        if stats["success"] and stats["cash_sell"] is not None and stats["windows"]["3"]["mean"] is not None:
+            # 計算趨勢
+            recent_avg = stats["windows"]["3"]["mean"]
+            current_rate = stats["cash_sell"]
+            trend = "上升" if current_rate > recent_avg else "下降" if current_rate < recent_avg else "持平"
 
+            return {
+                "success": True,
+                "type": "advice",
+                "data": {
+                    "currency": currency,
+                    "current_rate": current_rate,
+                    "trend": trend,
+                    "stats": stats["windows"],
+                    "historical": historical.to_columns(**(history or {}))
+                },
+                "message": f"💡 {SUPPORTED_CURRENCIES[currency]} 匯率分析\n\n"
+                         f"目前匯率：{current_rate}\n"
+                         f"近期趨勢：{trend}\n"
+                         f"3日平均：{recent_avg:.3f}\n\n"
+                         f"{'📈 匯率較高，可考慮觀望' if trend == '上升' else '📉 匯率較低，適合換匯' if trend == '下降' else '➡️ 匯率平穩'}"
+            }
+        return None
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import sys
+from typing import Optional
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tool.Currency import SUPPORTED_CURRENCIES
+from tool.Metrics import METRICS
+from tool.Tracing import TRACER, KIND_CLIENT
+from agent.agent import AI_Agent
+
+
+class AsyncAI_Agent:
+    """
+    AI_Agent 的 async 版本
+
+    匯率查詢使用 httpx (TaiwanExchangeRate.*_async)，Gemini 使用 client.aio，
+    大量同時查詢可以在同一個 event loop 上執行，不需要每個請求佔用一個執行緒。
+
+    同步的 AI_Agent 維持原本的行為 (IPC Server 仍使用同步版)，兩者共用匯率快取、
+    意圖快取與查詢解析器；回應格式由 AI_Agent 的純函式產生，確保兩種 API 的結果一致。
+
+    Example:
+        >>> agent = AsyncAI_Agent()
+        >>> result = await agent.process_query("美金匯率多少？")
+    """
+
+    def __init__(self, agent: AI_Agent = None, **kwargs):
+        """
+        Args:
+            agent: 共用狀態的同步 AI_Agent (可選，預設以 kwargs 建立新的 AI_Agent)
+            **kwargs: 建立 AI_Agent 時的參數
+        """
+        self.agent = agent or AI_Agent(**kwargs)
+
+    @property
+    def exchange_rate(self):
+        return self.agent.exchange_rate
+
+    @property
+    def rate_cache(self):
+        return self.agent.rate_cache
+
+    async def get_exchange_rate(self, currency: str, rate_type: str = "cash_sell"):
+        """get_exchange_rate 的 async 版本 (同一貨幣同時查詢只會發出一次請求)"""
+        try:
+            rate = await self.rate_cache.get_or_load_async(currency.upper(), self.exchange_rate.get_latest_rate_async)
+            return self.agent._rate_response(currency, rate, rate_type)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "currency": currency
+            }
+
+    async def calculate_exchange(self, currency: str, twd_amount: float, is_buying: bool = True):
+        """calculate_exchange 的 async 版本"""
+        rate_type = "cash_sell" if is_buying else "cash_buy"
+        rate_info = await self.get_exchange_rate(currency, rate_type)
+        return self.agent._calculate_response(currency, twd_amount, is_buying, rate_info)
+
+    async def get_multiple_rates(self, currencies: list, timeout: float = 20.0):
+        """
+        get_multiple_rates 的 async 版本
+
+        Args:
+            currencies: 貨幣代碼列表
+            timeout: 整批查詢的期限秒數，逾時的貨幣會回傳失敗結果
+        """
+        tasks = {currency: asyncio.ensure_future(self.get_exchange_rate(currency)) for currency in dict.fromkeys(currencies)}
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=timeout)
+
+        results = {}
+        for currency, task in tasks.items():
+            if not task.done():
+                task.cancel()
+                results[currency] = {
+                    "success": False,
+                    "error": f"查詢 {currency} 匯率逾時",
+                    "currency": currency
+                }
+            else:
+                results[currency] = task.result()
+
+        return {
+            "success": True,
+            "rates": results,
+            "timestamp": self.exchange_rate.get_now().isoformat()
+        }
+
+    async def get_rate_stats(self, currency: str):
+        """get_rate_stats 的 async 版本"""
+        currency = currency.upper()
+        try:
+            if not self.agent.analytics.is_fresh(currency, self.rate_cache.ttl):
+                self.agent._update_analytics(await self.exchange_rate.get_historical_series_async(currency, days=7))
+            return self.agent._stats_response(currency)
+        except Exception as e:
+            return {"success": False, "error": str(e), "currency": currency}
+
+    def get_bank_rules(self, currency: str = None):
+        return self.agent.get_bank_rules(currency)
+
+    async def process_query(self, query: str, history: Optional[dict] = None):
+        """
+        process_query 的 async 版本 (路由規則與 history 參數相同)
+
+        規則解析路徑先以 async 查詢需要的匯率，之後由 AI_Agent 以已更新的快取產生回應。
+        """
+        try:
+            parsed = self.agent.query_parser.parse(query)
+
+            if not self.agent.client:
+                self.agent._count_route("offline")
+                return await self._rule_query_processing(query, parsed, simple=True)
+
+            if parsed.confidence >= self.agent.route_threshold:
+                self.agent._count_route("rules")
+                return await self._rule_query_processing(query, parsed)
+
+            return await self._ai_query_processing(query, parsed, history)
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "message": "抱歉，處理您的問題時發生錯誤。"
+            }
+
+    async def _rule_query_processing(self, query: str, parsed, simple: bool = False):
+        """先查詢規則解析需要的匯率，再交給 AI_Agent 產生回應 (之後的匯率查詢直接命中快取)"""
+        needs_rate = parsed.currency and (
+            parsed.is_rate_query or (parsed.is_exchange_query and parsed.amount is not None)
+        )
+        if needs_rate:
+            rate_info = await self.get_exchange_rate(parsed.currency)
+            if not rate_info["success"]:
+                return rate_info
+
+        if simple:
+            return self.agent._simple_query_processing(query, parsed)
+        return self.agent._rule_query_processing(query, parsed)
+
+    async def _ai_query_processing(self, query: str, parsed, history: Optional[dict] = None):
+        """使用 Gemini async API 處理查詢"""
+        agent = self.agent
+        try:
+            if agent.intent_cache is not None:
+                cached = agent.intent_cache.get(query)
+                if cached is not None:
+                    agent._count_route("intent_cache")
+                    return await self._execute_action(cached, query, history)
+
+            agent._count_route("llm")
+            with METRICS.track("upstream", "gemini"), \
+                    TRACER.span("gemini.generate_content", kind=KIND_CLIENT,
+                                attributes={"gen_ai.request.model": agent.AI_MODEL}):
+                response = await agent.client.aio.models.generate_content(
+                    model=agent.AI_MODEL,
+                    contents=f"{agent._system_prompt}\n\n用戶問題：{query}"
+                )
+
+            action_data = agent._parse_ai_response(response.text)
+            if agent.intent_cache is not None:
+                agent.intent_cache.put(query, action_data)
+
+            return await self._execute_action(action_data, query, history)
+
+        except Exception as e:
+            print(f"AI processing error: {e}")
+            agent._count_route("llm_fallback")
+            return await self._rule_query_processing(query, parsed, simple=True)
+
+    async def _execute_action(self, action_data: dict, original_query: str, history: Optional[dict] = None):
+        """_execute_action 的 async 版本：先以 async 取得需要的資料，再由 AI_Agent 產生回應"""
+        action = action_data.get("action")
+        currency = (action_data.get("currency") or "").upper()
+
+        if action in ("get_rate", "calculate") and currency in SUPPORTED_CURRENCIES:
+            rate_info = await self.get_exchange_rate(currency)
+            if not rate_info["success"]:
+                return rate_info
+
+        elif action == "advice" and currency in SUPPORTED_CURRENCIES:
+            stats = await self.get_rate_stats(currency)
+            advice = self.agent._advice_response(currency, stats, self.agent._advice_history(currency), history)
+            if advice is not None:
+                return advice
+            action_data = {**action_data, "action": None}
+
+        return self.agent._execute_action(action_data, original_query, history)
+
+    async def aclose(self):
+        """關閉 async 連線池"""
+        if self.agent._exchange_rate is not None:
+            await self.agent._exchange_rate.aclose()
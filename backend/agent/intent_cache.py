@@ -0,0 +1,244 @@
+import atexit
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from agent.query_parser import QueryParser
+
+
+# 模板中代表查詢欄位的佔位值
+CURRENCY_SLOT = "$currency"
+AMOUNT_SLOT = "$amount"
+
+# 可以快取的 AI 動作 (clarify 的內容是針對該次查詢的自由文字，不快取)
+CACHEABLE_ACTIONS = ("get_rate", "calculate", "get_rules", "advice")
+
+# 快取只保存可對應到欄位的結構化欄位；自由文字 (例如 advice 的 context) 常包含原查詢的貨幣或金額，
+# 套用到相同模板的其他查詢會得到錯誤的內容
+CACHED_FIELDS = ("action", "currency", "amount")
+
+# 新增模板後延遲寫入檔案的秒數 (期間新增的模板合併為一次寫入)
+SAVE_DELAY = 2.0
+
+
+def default_cache_path() -> str:
+    """取得預設的意圖快取檔案路徑 (可由環境變數 INTENT_CACHE_PATH 覆寫)"""
+    path = os.environ.get("INTENT_CACHE_PATH")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "nkust-calculater", "intent_cache.json")
+
+
+class IntentCache:
+    """
+    Gemini 意圖解析結果的快取
+
+    查詢先經 QueryParser.normalize() 轉為模板 (數字與貨幣改為欄位)，
+    例如「10000台幣換日圓」與「20000台幣換日幣」共用模板 "<amount>台幣換<currency>"。
+    AI 回傳的 action_data 中與查詢欄位相同的值會改存為 $currency / $amount，
+    命中時再以新查詢的欄位值填回，不需再呼叫 LLM。
+
+    - 提到多種貨幣或多個金額的查詢無法對應欄位，不快取
+    - AI 回傳的貨幣或金額無法對應到查詢欄位時 (例如自行換算過)，不快取
+    - 只保存 action、currency、amount，不保存 clarify 與其他自由文字欄位
+    - 以 LRU 限制模板數量，新增模板後由背景計時器延遲寫入檔案 (不在請求執行緒寫檔)，
+      下次啟動時載入 (version 不同時捨棄)
+    """
+
+    def __init__(self, parser: QueryParser, maxsize: int = 512, path: Optional[str] = None,
+                 persist: bool = True, version: str = "", save_delay: float = SAVE_DELAY):
+        """
+        Args:
+            parser: 用來正規化查詢的 QueryParser
+            maxsize: 最多保存的模板數量
+            path: 快取檔案路徑，預設為 default_cache_path()
+            persist: 是否寫入檔案
+            version: 提示詞或模型版本，與檔案中的版本不同時不載入舊資料
+            save_delay: 新增模板後延遲寫入檔案的秒數
+        """
+        self.parser = parser
+        self.maxsize = maxsize
+        self.path = (path or default_cache_path()) if persist else None
+        self.version = version
+        self.save_delay = save_delay
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        self._dirty = False
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._skipped = 0
+
+        self._load()
+        if self.path:
+            # 結束前寫入尚未保存的模板
+            atexit.register(self.flush)
+
+    def _slots(self, query: str):
+        """取得模板與欄位值，無法快取時返回 None"""
+        template, currencies, amounts = self.parser.normalize(query)
+        if len(set(currencies)) > 1 or len(amounts) > 1 or not template:
+            return None
+        currency = currencies[0] if currencies else None
+        amount = amounts[0] if amounts else None
+        return template, currency, amount
+
+    def get(self, query: str) -> Optional[dict]:
+        """
+        查詢快取
+
+        Returns:
+            dict: 已填入欄位值的 action_data，未命中時返回 None
+        """
+        slots = self._slots(query)
+        if slots is None:
+            with self._lock:
+                self._skipped += 1
+            return None
+
+        template, currency, amount = slots
+        with self._lock:
+            entry = self._entries.get(template)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(template)
+            self._hits += 1
+
+        action_data = {}
+        for key, value in entry.items():
+            if value == CURRENCY_SLOT:
+                value = currency
+            elif value == AMOUNT_SLOT:
+                value = amount
+            action_data[key] = value
+        return action_data
+
+    def put(self, query: str, action_data: dict) -> bool:
+        """
+        保存 AI 的解析結果
+
+        Returns:
+            bool: 是否已快取
+        """
+        if not isinstance(action_data, dict) or action_data.get("action") not in CACHEABLE_ACTIONS:
+            return False
+
+        slots = self._slots(query)
+        if slots is None:
+            return False
+        template, currency, amount = slots
+
+        entry = {}
+        for key, value in action_data.items():
+            if key not in CACHED_FIELDS:
+                continue
+            if key == "currency" and currency is not None and isinstance(value, str) and value.upper() == currency:
+                value = CURRENCY_SLOT
+            elif key == "amount" and amount is not None and _same_number(value, amount):
+                value = AMOUNT_SLOT
+            elif key == "currency" and currency is not None and value:
+                # 貨幣與查詢欄位不一致，套用到其他貨幣會出錯
+                return False
+            elif key == "amount" and amount is not None and value is not None:
+                return False
+            entry[key] = value
+
+        with self._lock:
+            is_new = template not in self._entries
+            self._entries[template] = entry
+            self._entries.move_to_end(template)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        if is_new and self.path:
+            self._schedule_save()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+        self.flush()
+
+    def _schedule_save(self):
+        """標記需要寫入，並在沒有等待中的計時器時啟動一個"""
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            timer = self._save_timer = threading.Timer(self.save_delay, self.flush)
+            timer.daemon = True
+        timer.start()
+
+    def flush(self):
+        """立即寫入尚未保存的模板 (由計時器、clear() 或程序結束時呼叫)"""
+        if not self.path:
+            return
+        # 依序寫入，避免較舊的內容覆蓋較新的檔案
+        with self._save_lock:
+            with self._lock:
+                timer, self._save_timer = self._save_timer, None
+                if timer is not None and timer is not threading.current_thread():
+                    timer.cancel()
+                if not self._dirty:
+                    return
+                self._dirty = False
+                snapshot = dict(self._entries)
+            self._save(snapshot)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "skipped": self._skipped,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "path": self.path
+            }
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 無法讀取意圖快取，將重新建立: {e}")
+            return
+        # 內容格式不符 (例如不是物件) 時與無法讀取相同，視為空的快取
+        if not isinstance(data, dict) or data.get("version") != self.version:
+            return
+        entries = data.get("entries")
+        if not isinstance(entries, dict):
+            return
+        for template, entry in list(entries.items())[-self.maxsize:]:
+            # 略過舊版本保存的 clarify 與自由文字欄位
+            if isinstance(entry, dict) and entry.get("action") in CACHEABLE_ACTIONS:
+                self._entries[template] = {key: value for key, value in entry.items() if key in CACHED_FIELDS}
+
+    def _save(self, entries: dict):
+        """寫入暫存檔後再取代，避免寫到一半的檔案被下次啟動讀到"""
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.version, "entries": entries}, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ 無法寫入意圖快取: {e}")
+
+
+def _same_number(value, expected: float) -> bool:
+    try:
+        return abs(float(value) - expected) < 1e-9
+    except (TypeError, ValueError):
+        return False
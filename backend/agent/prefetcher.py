@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+class RatePrefetcher:
+    """
+    背景匯率預取排程
+
+    定期以 AI_Agent.refresh_all_rates (單一 API 請求) 更新熱門貨幣的最新匯率快取，
+    讓前景查詢幾乎都命中新鮮的快取。更新頻率依台灣銀行每日公告的資料調整：
+
+    - 今天的匯率尚未出現 (平日)：每 interval 秒查詢一次，等待當日資料公告
+    - 今天的匯率已經出現：當日資料不會再新增，改為每 settled_interval 秒更新一次 (只為保持快取可用)
+    - 週末，或連續查詢都沒有新資料 (國定假日)：間隔逐次加倍，最長 settled_interval
+    - 查詢失敗或沒有資料：間隔逐次加倍，最長 max_backoff
+    """
+
+    def __init__(self, agent, currencies: Optional[List[str]] = None, interval: float = None,
+                 settled_interval: float = 3600.0, max_backoff: float = 1800.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            agent: AI_Agent
+            currencies: 預取的貨幣 (可選，預設讀取環境變數 PREFETCH_CURRENCIES，或 agent.bank_rules 的貨幣)
+            interval: 等待當日資料時的查詢間隔秒數 (可選，預設讀取環境變數 PREFETCH_INTERVAL 或快取 TTL)
+            settled_interval: 當日資料已出現或假日時的最長間隔秒數
+            max_backoff: 查詢失敗時的最長間隔秒數
+            clock: 取得目前時間的函式 (測試用)
+        """
+        self.agent = agent
+
+        if currencies is None:
+            configured = os.environ.get("PREFETCH_CURRENCIES")
+            currencies = configured.split(",") if configured else list(agent.bank_rules)
+        self.currencies = [currency.strip().upper() for currency in currencies if currency.strip()]
+
+        if interval is None:
+            interval = float(os.environ.get("PREFETCH_INTERVAL", agent.rate_cache.ttl))
+        self.interval = interval
+        # 不超過快取可回傳舊值的期限，避免兩次更新之間快取完全過期
+        self.settled_interval = min(settled_interval, agent.rate_cache.ttl + agent.rate_cache.max_stale * 0.9)
+        self.max_backoff = max_backoff
+        self._clock = clock
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.idle_polls = 0
+        self.latest_date = None
+        self.last_refresh_at = None
+        self.last_success_at = None
+        self.next_delay = 0.0
+
+    def start(self):
+        """啟動背景執行緒 (重複呼叫不會建立多個執行緒)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rate-prefetcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            delay = self.run_once()
+            self._stop.wait(delay)
+
+    def run_once(self) -> float:
+        """
+        更新一次並計算下次更新前的等待秒數
+
+        Returns:
+            float: 下次更新前的等待秒數
+        """
+        started = self._clock()
+        try:
+            result = self.agent.refresh_all_rates(self.currencies)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        dates = result.get("dates") or {}
+        latest = max(dates.values()) if dates else None
+        now = self.agent.exchange_rate.get_now()
+        today = now.strftime("%Y-%m-%d")
+
+        with self._lock:
+            self.runs += 1
+            self.last_refresh_at = started
+
+            if not result.get("success") or latest is None:
+                # 上游失敗或完全沒有資料：指數退避
+                self.failures += 1
+                self.consecutive_failures += 1
+                delay = min(self.max_backoff, self.interval * 2 ** self.consecutive_failures)
+            else:
+                self.consecutive_failures = 0
+                self.last_success_at = started
+
+                if latest != self.latest_date:
+                    self.idle_polls = 0
+                else:
+                    self.idle_polls += 1
+                self.latest_date = latest
+
+                if latest >= today:
+                    # 今天的匯率已公告，之後只需保持快取可用
+                    delay = self.settled_interval
+                elif now.weekday() >= 5:
+                    # 週末不會有新資料
+                    delay = self.settled_interval
+                else:
+                    # 等待當日資料；連續沒有新資料 (可能是假日) 時逐次拉長間隔
+                    delay = min(self.settled_interval, self.interval * 2 ** self.idle_polls)
+
+            self.next_delay = delay
+        return delay
+
+    def stats(self) -> dict:
+        """
+        取得預取排程的狀態
+
+        Returns:
+            dict: last_refresh_age (距上次更新的秒數)、last_success_age、latest_date (快取中最新的匯率日期)、
+                  next_delay、runs、failures、consecutive_failures、currencies
+        """
+        now = self._clock()
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "currencies": list(self.currencies),
+                "runs": self.runs,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "latest_date": self.latest_date,
+                "last_refresh_age": now - self.last_refresh_at if self.last_refresh_at is not None else None,
+                "last_success_age": now - self.last_success_at if self.last_success_at is not None else None,
+                "next_delay": self.next_delay
+            }
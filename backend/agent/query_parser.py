@@ -0,0 +1,230 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# 常見貨幣別名 (標準名稱見 SUPPORTED_CURRENCIES)
+CURRENCY_ALIASES = {
+    'JPY': ['日圓', '日幣', '日元'],
+    'USD': ['美金', '美元', '美刀'],
+    'EUR': ['歐元'],
+    'CNY': ['人民幣', '人民币', '陸幣'],
+    'GBP': ['英鎊', '英镑'],
+    'HKD': ['港幣', '港币', '港元'],
+    'AUD': ['澳洲', '澳幣', '澳元'],
+    'SGD': ['新加坡', '新幣', '星幣'],
+}
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """
+    將字詞列表轉為前綴合併的正規表示式 (例如 日圓|日幣 → 日(?:圓|幣))
+
+    每個位置只需比對少數分支，比對成本不會隨別名數量線性增加，且優先比對最長的字詞。
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: dict) -> str:
+        is_end = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        body = '(?:' + '|'.join(branches) + ')'
+        return body + '?' if is_end else body
+
+    return build(trie)
+
+
+# 詢問趨勢或建議的關鍵字 (需要 AI 判斷，規則解析無法處理)
+ADVICE_KEYWORDS = ('趨勢', '走勢', '建議', '預測', '漲', '跌', '適合', '時機', '划算', '值得', 'trend', 'advice', 'forecast')
+
+# 正規化時移除的空白與標點
+_NOISE = re.compile(r'[\s?？!！。，,、~～]+')
+
+
+class ParsedQuery:
+    """QueryParser 的解析結果"""
+
+    __slots__ = (
+        'currency', 'amount', 'has_wan_currency', 'has_direct_currency',
+        'has_twd_keyword', 'is_rate_query', 'is_exchange_query', 'is_rules_query', 'is_forward_query',
+        'is_advice_query', 'confidence'
+    )
+
+    def __init__(self):
+        self.currency: Optional[str] = None
+        self.amount: Optional[float] = None
+        self.has_wan_currency = False
+        self.has_direct_currency = False
+        self.has_twd_keyword = False
+        self.is_rate_query = False
+        self.is_exchange_query = False
+        self.is_rules_query = False
+        self.is_forward_query = False
+        self.is_advice_query = False
+        # 規則解析結果可信的程度 (0 ~ 1)，見 QueryParser._confidence()
+        self.confidence = 0.0
+
+
+class QueryParser:
+    """
+    離線模式的查詢解析器
+
+    建立時把所有貨幣代碼、名稱與別名編譯為單一正規表示式，每次查詢只需掃描一次，
+    即可同時取得提到的貨幣、金額，以及「萬」倍數與數字是否緊鄰貨幣名稱。
+
+    貨幣的優先順序與 SUPPORTED_CURRENCIES 的順序相同 (同時提到多種貨幣時取順序最前者)。
+    """
+
+    def __init__(self, supported_currencies: Dict[str, str], aliases: Optional[Dict[str, List[str]]] = None):
+        """
+        Args:
+            supported_currencies: {貨幣代碼: 標準名稱}
+            aliases: {貨幣代碼: [別名, ...]}，預設為 CURRENCY_ALIASES
+        """
+        aliases = CURRENCY_ALIASES if aliases is None else aliases
+
+        # 字詞 → (貨幣代碼, 優先順序, 是否為貨幣代碼)
+        self._lookup = {}
+        for order, (code, name) in enumerate(supported_currencies.items()):
+            self._lookup.setdefault(code.lower(), (code, order, True))
+            for word in [name] + aliases.get(code, []):
+                self._lookup.setdefault(word, (code, order, False))
+
+        words = sorted(self._lookup, key=len, reverse=True)
+        currency = _trie_pattern(words)
+        self._pattern = re.compile(
+            rf'(?P<number>\d+(?:\.\d+)?)\s*(?P<wan>萬)?\s*(?P<adjacent>{currency})?'
+            rf'|(?P<mention>{currency})'
+        )
+
+    def parse(self, query: str) -> ParsedQuery:
+        """
+        解析查詢
+
+        金額的決定順序與原本的關鍵字匹配相同：
+        1. 「數字 + 萬 + 貨幣名稱」(如 15萬日圓 → 150000)
+        2. 「數字 + 貨幣名稱」(如 100美金 → 100)
+        3. 「數字 + 萬」(如 15萬台幣 → 150000)
+        4. 第一個數字
+        """
+        result = ParsedQuery()
+        query_lower = query.lower()
+
+        result.is_rate_query = "匯率" in query or "rate" in query_lower
+        result.is_exchange_query = "換" in query or "兌換" in query or "exchange" in query_lower
+        result.is_rules_query = "規則" in query or "限額" in query or "rule" in query_lower
+        result.has_twd_keyword = '台幣' in query or 'TWD' in query or 'NT' in query
+        result.is_forward_query = '可以換' in query or '能換' in query or '多少' in query
+        result.is_advice_query = any(keyword in query_lower for keyword in ADVICE_KEYWORDS)
+
+        best_order = None
+        mentioned = set()
+        numbers = []
+        for match in self._pattern.finditer(query_lower):
+            word = match.group('adjacent') or match.group('mention')
+            adjacent = None
+            if word:
+                code, order, is_code = self._lookup[word]
+                mentioned.add(code)
+                if best_order is None or order < best_order:
+                    best_order = order
+                    result.currency = code
+                # 與原本規則相同，只有名稱或別名 (不含貨幣代碼) 緊鄰數字才算
+                if match.group('adjacent') and not is_code:
+                    adjacent = code
+            if match.group('number'):
+                numbers.append((float(match.group('number')), bool(match.group('wan')), adjacent))
+
+        if not numbers:
+            result.confidence = self._confidence(result, mentioned, numbers)
+            return result
+
+        wan_currency = next((value for value, wan, adj in numbers if wan and adj == result.currency and adj), None)
+        direct_currency = next((value for value, wan, adj in numbers if not wan and adj == result.currency and adj), None)
+        wan_any = next((value for value, wan, _ in numbers if wan), None)
+
+        if wan_currency is not None:
+            result.amount = wan_currency * 10000
+            result.has_wan_currency = True
+        elif direct_currency is not None:
+            result.amount = direct_currency
+            result.has_direct_currency = True
+        elif wan_any is not None:
+            result.amount = wan_any * 10000
+        else:
+            result.amount = numbers[0][0]
+
+        result.confidence = self._confidence(result, mentioned, numbers)
+        return result
+
+    @staticmethod
+    def _confidence(result: ParsedQuery, mentioned: set, numbers: list) -> float:
+        """
+        估計規則解析的可信度 (判斷順序與 AI_Agent._simple_query_processing 相同)
+
+        - 詢問趨勢或建議：0 (一定交給 AI)
+        - 匯率查詢且有貨幣、換匯且貨幣/金額/方向都明確：0.95
+        - 換匯但方向不明確：0.6；缺少貨幣或金額：0.5
+        - 限額查詢：0.9 (指定貨幣時 0.7，規則解析只會列出全部貨幣)
+        - 只提到貨幣：0.3；沒有任何線索：0.1
+        - 同時提到多種貨幣或多個數字時再扣 0.4
+        """
+        if result.is_advice_query:
+            return 0.0
+
+        if result.is_rate_query and result.currency:
+            score = 0.95
+        elif result.is_exchange_query:
+            if not result.currency or result.amount is None:
+                score = 0.5
+            elif (result.has_wan_currency or result.has_direct_currency
+                  or result.has_twd_keyword or result.is_forward_query):
+                score = 0.95
+            else:
+                score = 0.6
+        elif result.is_rules_query:
+            score = 0.7 if result.currency else 0.9
+        elif result.currency:
+            score = 0.3
+        else:
+            score = 0.1
+
+        if len(mentioned) > 1 or len(numbers) > 1:
+            score -= 0.4
+        return max(0.0, score)
+
+    def normalize(self, query: str) -> Tuple[str, List[str], List[float]]:
+        """
+        將查詢正規化為模板，數字與貨幣改為欄位
+
+        例如「10000台幣換日圓」與「2萬 台幣換日幣？」都會變成 "<amount>台幣換<currency>"。
+        「萬」會併入金額 (2萬 → 20000)。
+
+        Returns:
+            tuple: (模板, 依出現順序的貨幣代碼, 依出現順序的金額)
+        """
+        compact = _NOISE.sub('', query.lower())
+        currencies = []
+        amounts = []
+
+        def replace(match) -> str:
+            parts = []
+            if match.group('number'):
+                value = float(match.group('number'))
+                amounts.append(value * 10000 if match.group('wan') else value)
+                parts.append('<amount>')
+            word = match.group('adjacent') or match.group('mention')
+            if word:
+                currencies.append(self._lookup[word][0])
+                parts.append('<currency>')
+            return ''.join(parts)
+
+        template = self._pattern.sub(replace, compact)
+        return template, currencies, amounts
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+本機 FinMind API 替身
+
+以 TaiwanExchangeRate 的格式回傳固定可重現的匯率資料 (平日才有資料)，
+可設定每次回應的延遲與抖動，讓效能測試不需要網路與 API token。
+
+使用方法:
+    python3 bench/fake_finmind.py --port 8765 --latency 0.05 --jitter 0.02
+    FINMIND_API_URL=http://127.0.0.1:8765/api/v4/data python3 ipc_server.py
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tool.Currency import SUPPORTED_CURRENCIES
+
+# 各貨幣的基準現金賣出價 (約略值，只用來產生合理的數字)
+BASE_RATES = {
+    'AUD': 21.0, 'CAD': 23.5, 'CHF': 36.0, 'CNY': 4.5, 'EUR': 35.0, 'GBP': 41.0, 'HKD': 4.1,
+    'IDR': 0.0023, 'JPY': 0.22, 'KRW': 0.025, 'MYR': 7.2, 'NZD': 19.5, 'PHP': 0.6, 'SEK': 3.1,
+    'SGD': 24.0, 'THB': 0.95, 'USD': 32.0, 'VND': 0.0014, 'ZAR': 1.8
+}
+
+
+def make_row(currency: str, day: date) -> dict:
+    """產生某一天的匯率資料列 (相同輸入一定得到相同結果)"""
+    base = BASE_RATES.get(currency, 1.0)
+    # 以日期產生緩慢波動，讓趨勢與統計有變化
+    cash_sell = base * (1 + 0.01 * math.sin(day.toordinal() / 5 + len(currency)))
+    cash_buy = cash_sell * 0.985
+    return {
+        "date": day.isoformat(),
+        "currency": currency,
+        "cash_buy": round(cash_buy, 4),
+        "cash_sell": round(cash_sell, 4),
+        "spot_buy": round(cash_sell * 0.992, 4),
+        "spot_sell": round(cash_sell * 0.996, 4)
+    }
+
+
+def make_rows(currency: str, start_date: str, end_date: str) -> list:
+    """產生日期區間內 (含頭尾) 平日的資料列，currency 為空時回傳所有貨幣"""
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date or date.today().isoformat())
+    currencies = [currency] if currency else list(SUPPORTED_CURRENCIES)
+
+    rows = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            rows.extend(make_row(code, day) for code in currencies)
+        day += timedelta(days=1)
+    return rows
+
+
+class FakeFinMind:
+    """
+    在背景執行緒啟動的 FinMind 替身
+
+    Example:
+        >>> with FakeFinMind(latency=0.05, jitter=0.02) as server:
+        ...     os.environ["FINMIND_API_URL"] = server.url
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        """
+        Args:
+            host: 監聽位址
+            port: 監聽埠 (0 表示自動選擇)
+            latency: 每次回應的平均延遲秒數
+            jitter: 延遲的抖動範圍 (latency ± jitter，均勻分布)
+            error_rate: 回傳 503 的比例 (測試重試與斷路器)
+            seed: 亂數種子
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v4/data"
+
+    def _delay(self) -> tuple:
+        """取得此次回應的延遲與是否回傳錯誤"""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return delay, failed
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                delay, failed = fake._delay()
+                time.sleep(delay)
+
+                if failed:
+                    self._send(503, {"msg": "service unavailable", "status": 503, "data": []})
+                    return
+
+                query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                if query.get("dataset") != "TaiwanExchangeRate" or "start_date" not in query:
+                    self._send(400, {"msg": "invalid parameter", "status": 400, "data": []})
+                    return
+
+                rows = make_rows(query.get("data_id"), query["start_date"], query.get("end_date"))
+                self._send(200, {"msg": "success", "status": 200, "data": rows})
+
+            def _send(self, status: int, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeFinMind":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-finmind", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機 FinMind API 替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="平均延遲秒數")
+    parser.add_argument("--jitter", type=float, default=0.02, help="延遲抖動秒數")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回傳 503 的比例")
+    args = parser.parse_args()
+
+    server = FakeFinMind(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print(f"FinMind 替身: {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
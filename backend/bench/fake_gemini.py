@@ -0,0 +1,115 @@
+"""
+Gemini 客戶端替身
+
+提供與 google.genai.Client 相同的 models.generate_content、models.generate_content_stream
+與 aio.models.generate_content，以規則解析產生 AI_Agent 提示詞要求的 JSON 動作，
+並模擬 Gemini 的延遲。
+
+Example:
+    >>> agent = AI_Agent()
+    >>> agent.client = FakeGemini(latency=0.3)
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tool.Currency import SUPPORTED_CURRENCIES
+from agent.query_parser import QueryParser
+
+
+class _Response:
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Models:
+    def __init__(self, fake: "FakeGemini"):
+        self._fake = fake
+
+    def generate_content(self, model: str, contents: str) -> _Response:
+        text = self._fake._answer(contents)
+        time.sleep(self._fake._delay())
+        return _Response(text)
+
+    def generate_content_stream(self, model: str, contents: str):
+        text = self._fake._answer(contents)
+        chunks = [text[i:i + self._fake.chunk_size] for i in range(0, len(text), self._fake.chunk_size)]
+        delay = self._fake._delay()
+        # 第一段約佔一半的延遲，其餘平均分配到後續的片段
+        time.sleep(delay / 2)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(delay / 2 / max(1, len(chunks) - 1))
+            yield _Response(chunk)
+
+
+class _AsyncModels:
+    def __init__(self, fake: "FakeGemini"):
+        self._fake = fake
+
+    async def generate_content(self, model: str, contents: str) -> _Response:
+        text = self._fake._answer(contents)
+        await asyncio.sleep(self._fake._delay())
+        return _Response(text)
+
+
+class _Aio:
+    def __init__(self, fake: "FakeGemini"):
+        self.models = _AsyncModels(fake)
+
+
+class FakeGemini:
+    """
+    Gemini 客戶端替身
+
+    以 QueryParser 判斷用戶問題並回傳對應的 JSON 動作 (advice / calculate / get_rate / get_rules / clarify)。
+    """
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.0, chunk_size: int = 16, seed: int = 0):
+        """
+        Args:
+            latency: 每次呼叫的平均延遲秒數 (串流時為完整回應的時間)
+            jitter: 延遲的抖動範圍 (latency ± jitter，均勻分布)
+            chunk_size: 串流時每段文字的長度
+            seed: 亂數種子
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_size = chunk_size
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._parser = QueryParser(SUPPORTED_CURRENCIES)
+        self.calls = 0
+
+        self.models = _Models(self)
+        self.aio = _Aio(self)
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _answer(self, contents: str) -> str:
+        """依提示詞最後的用戶問題產生 JSON 動作"""
+        query = contents.rsplit("用戶問題：", 1)[-1]
+        parsed = self._parser.parse(query)
+
+        if parsed.currency and parsed.is_advice_query:
+            action = {"action": "advice", "currency": parsed.currency, "context": query}
+        elif parsed.currency and parsed.amount is not None:
+            action = {"action": "calculate", "currency": parsed.currency, "amount": parsed.amount}
+        elif parsed.currency and parsed.is_rules_query:
+            action = {"action": "get_rules", "currency": parsed.currency}
+        elif parsed.currency:
+            action = {"action": "get_rate", "currency": parsed.currency}
+        else:
+            action = {"action": "clarify", "message": "請問您想查詢哪一種貨幣？"}
+        return json.dumps(action, ensure_ascii=False)
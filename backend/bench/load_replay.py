@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+IPC Server 負載測試 (記錄/重播)
+
+以與 frontend/electron/main.ts 相同的方式啟動 ipc_server.py (stdin/stdout、hello 協商協定 2 與長度前綴格式)，
+重播 JSONL 格式的請求紀錄，量測單一後端程序在 Electron 30 秒逾時之前能承受的請求量。
+
+請求紀錄每行為 {"t": 相對秒數, "request": {...}} 或直接為請求本身，可用 IPC_RECORD=檔案路徑 啟動
+ipc_server.py 記錄實際使用時的請求 (bench/traces/ 有範例)。
+
+模式:
+- 開放迴路 (--rates)：依指定的到達率送出請求，不等待回應 (模擬多個視窗/使用者同時操作)
+- 封閉迴路 (--concurrency)：維持固定數量的處理中請求
+- 依紀錄時間 (--speed)：依紀錄中的 t 重播 (可加速)
+
+每一階段回報吞吐量、p50/p95/p99 延遲、逾時與最多同時處理中的請求數；開放迴路會找出仍可負荷的最高到達率，
+超過負荷的階段會估計佇列持續增長多久後開始逾時。
+
+使用方法:
+    python3 bench/load_replay.py bench/traces/mixed.jsonl --fake-finmind --rates 5,10,20,50,100
+    python3 bench/load_replay.py bench/traces/mixed.jsonl --concurrency 1,4,16 --duration 20
+    python3 bench/load_replay.py recorded.jsonl --speed 2 --backend ../dist/ipc_server/ipc_server
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(BACKEND_DIR)
+sys.path.append(BENCH_DIR)
+
+from run_bench import percentile
+
+# Electron (main.ts) 的請求逾時
+ELECTRON_TIMEOUT = 30.0
+
+HEADER = struct.Struct(">I")
+
+
+def load_trace(path: str) -> list:
+    """
+    讀取請求紀錄
+
+    Returns:
+        list: (t, request) 列表，沒有時間的紀錄 t 為 None
+    """
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            if "request" in entry:
+                entries.append((entry.get("t"), entry["request"]))
+            else:
+                entries.append((None, entry))
+    if not entries:
+        raise ValueError(f"{path} 沒有請求")
+    return entries
+
+
+class IPCClient:
+    """
+    與 Electron 相同方式啟動並與 ipc_server 通訊的客戶端
+
+    每個請求帶遞增的 id，回應依 id 對應；串流 chunk 只計數不結束請求。
+    """
+
+    def __init__(self, command: list = None, env: dict = None, timeout: float = ELECTRON_TIMEOUT):
+        """
+        Args:
+            command: 啟動指令 (預設為目前的 Python 執行 ipc_server.py)
+            env: 環境變數 (預設繼承目前的環境)
+            timeout: 請求逾時秒數
+        """
+        self.command = command or [sys.executable, os.path.join(BACKEND_DIR, "ipc_server.py")]
+        self.env = env
+        self.timeout = timeout
+        self.process = None
+        self.framing = "line"
+        self.chunks = 0
+
+        self._next_id = 1
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def start(self) -> dict:
+        """啟動後端並協商協定，回傳 hello 回應"""
+        self.process = subprocess.Popen(
+            self.command, cwd=BACKEND_DIR, env=self.env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        threading.Thread(target=self._read, name="ipc-reader", daemon=True).start()
+        # 與 main.ts 相同，stderr 只是日誌，必須持續讀取避免管線塞滿
+        threading.Thread(target=self._drain_stderr, name="ipc-stderr", daemon=True).start()
+
+        done = threading.Event()
+        hello = {}
+
+        def on_hello(latency, response):
+            hello.update(response)
+            done.set()
+
+        self.send({"action": "hello", "protocol": 2, "framing": "length-prefixed", "codec": "json"}, on_hello)
+        if not done.wait(self.timeout):
+            raise RuntimeError("ipc_server did not answer hello")
+        return hello
+
+    def send(self, request: dict, callback) -> int:
+        """
+        送出請求，收到回應時呼叫 callback(latency 秒數, response)
+
+        Returns:
+            int: 請求 id
+        """
+        with self._lock:
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = (time.perf_counter(), callback)
+        data = (json.dumps({**request, "id": request_id}, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._write_lock:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        return request_id
+
+    @property
+    def outstanding(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _read(self):
+        stdout = self.process.stdout
+        while True:
+            if self.framing == "line":
+                line = stdout.readline()
+                if not line:
+                    break
+                if not line.startswith(b"{"):
+                    continue
+                response = json.loads(line)
+            else:
+                header = stdout.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                response = json.loads(stdout.read(HEADER.unpack(header)[0]))
+
+            # hello 回應之後才切換格式 (與 main.ts 的 handlePythonResponse 相同)
+            if response.get("framing") == "length-prefixed" and response.get("protocol"):
+                self.framing = "length-prefixed"
+
+            if response.get("event") == "chunk":
+                self.chunks += 1
+                continue
+
+            with self._lock:
+                pending = self._pending.pop(response.get("id"), None)
+            if pending is not None:
+                sent_at, callback = pending
+                callback(time.perf_counter() - sent_at, response)
+
+    def _drain_stderr(self):
+        for _ in self.process.stderr:
+            pass
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class StepRecorder:
+    """收集單一階段的回應延遲"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.completed = 0
+        self.errors = 0
+        self.max_outstanding = 0
+        self.latencies = []
+        self.by_action = {}
+        self.last_completion = None
+        self.all_done = threading.Event()
+
+    def on_send(self, outstanding: int):
+        with self._lock:
+            self.sent += 1
+            self.max_outstanding = max(self.max_outstanding, outstanding)
+            self.all_done.clear()
+
+    def callback(self, action: str, on_done=None):
+        def done(latency, response):
+            with self._lock:
+                self.completed += 1
+                self.latencies.append(latency)
+                self.by_action.setdefault(action, []).append(latency)
+                if not response.get("success"):
+                    self.errors += 1
+                self.last_completion = time.perf_counter()
+                if self.completed >= self.sent:
+                    self.all_done.set()
+            if on_done is not None:
+                on_done()
+        return done
+
+    def wait(self, deadline: float):
+        """等待所有請求完成 (最多到 deadline)"""
+        while time.perf_counter() < deadline:
+            with self._lock:
+                if self.completed >= self.sent:
+                    return
+            self.all_done.wait(min(0.5, max(0.0, deadline - time.perf_counter())))
+
+    def summary(self, started: float, ended: float) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            in_time = [latency for latency in latencies if latency <= self.timeout]
+            # 逾時：超過 timeout 才回應，或到階段結束都沒有回應
+            timeouts = len(latencies) - len(in_time) + (self.sent - self.completed)
+            elapsed = max(1e-9, (self.last_completion or ended) - started)
+            return {
+                "sent": self.sent,
+                "completed": self.completed,
+                "errors": self.errors,
+                "timeouts": timeouts,
+                "throughput_rps": round(len(in_time) / elapsed, 2),
+                "max_outstanding": self.max_outstanding,
+                **_latency_summary(latencies),
+                "by_action": {
+                    action: {"count": len(values), **_latency_summary(sorted(values))}
+                    for action, values in sorted(self.by_action.items())
+                }
+            }
+
+
+def _latency_summary(latencies: list) -> dict:
+    def ms(q):
+        value = percentile(latencies, q)
+        return round(value * 1000, 2) if value is not None else None
+    return {"p50_ms": ms(0.50), "p95_ms": ms(0.95), "p99_ms": ms(0.99), "max_ms": ms(1.0)}
+
+
+def run_open_loop(client: IPCClient, requests, rate: float, duration: float, poisson: bool, rng) -> dict:
+    """以固定到達率送出 duration 秒的請求 (不等待回應)"""
+    recorder = StepRecorder(client.timeout)
+    started = time.perf_counter()
+    next_at = started
+    while next_at < started + duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        request = next(requests)
+        recorder.on_send(client.outstanding + 1)
+        client.send(request, recorder.callback(request.get("action")))
+        next_at += rng.expovariate(rate) if poisson else 1.0 / rate
+
+    sent_until = time.perf_counter()
+    recorder.wait(sent_until + client.timeout)
+    return {"mode": "open", "offered_rps": rate, **recorder.summary(started, sent_until)}
+
+
+def run_closed_loop(client: IPCClient, requests, concurrency: int, duration: float) -> dict:
+    """維持 concurrency 個處理中的請求 duration 秒"""
+    recorder = StepRecorder(client.timeout)
+    slots = threading.Semaphore(concurrency)
+    started = time.perf_counter()
+    while time.perf_counter() < started + duration:
+        if not slots.acquire(timeout=client.timeout):
+            break
+        request = next(requests)
+        recorder.on_send(client.outstanding + 1)
+        client.send(request, recorder.callback(request.get("action"), slots.release))
+
+    sent_until = time.perf_counter()
+    recorder.wait(sent_until + client.timeout)
+    return {"mode": "closed", "concurrency": concurrency, **recorder.summary(started, sent_until)}
+
+
+def run_timed(client: IPCClient, entries: list, speed: float) -> dict:
+    """依紀錄中的 t 重播 (speed 為加速倍數)"""
+    recorder = StepRecorder(client.timeout)
+    started = time.perf_counter()
+    base = entries[0][0] or 0.0
+    for i, (t, request) in enumerate(entries):
+        at = started + ((t if t is not None else base + i) - base) / speed
+        delay = at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        recorder.on_send(client.outstanding + 1)
+        client.send(request, recorder.callback(request.get("action")))
+
+    sent_until = time.perf_counter()
+    recorder.wait(sent_until + client.timeout)
+    return {"mode": "trace", "speed": speed, **recorder.summary(started, sent_until)}
+
+
+def saturated(step: dict, slo_ms: float) -> bool:
+    """吞吐量跟不上到達率、有逾時或 p99 超過 slo_ms 時視為超過負荷"""
+    return (step["timeouts"] > 0
+            or (step["p99_ms"] is not None and step["p99_ms"] > slo_ms)
+            or ("offered_rps" in step and step["throughput_rps"] < 0.9 * step["offered_rps"]))
+
+
+def projected_timeout(step: dict, timeout: float) -> float:
+    """
+    超過負荷時，估計佇列增長到等待時間超過 timeout 所需的秒數
+
+    到達率 λ 大於處理率 μ 時，等待時間約以 (λ - μ) / μ 秒/秒 增加。
+    """
+    offered, served = step.get("offered_rps"), step["throughput_rps"]
+    if not offered or served <= 0 or served >= offered:
+        return None
+    return round(timeout * served / (offered - served), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IPC Server 負載測試 (記錄/重播)")
+    parser.add_argument("trace", help="JSONL 請求紀錄")
+    parser.add_argument("--rates", help="開放迴路的到達率 (每秒請求數，逗號分隔，例如 5,10,20)")
+    parser.add_argument("--concurrency", help="封閉迴路的並行數 (逗號分隔)")
+    parser.add_argument("--speed", type=float, help="依紀錄時間重播，並加速指定倍數")
+    parser.add_argument("--duration", type=float, default=10.0, help="每階段送出請求的秒數")
+    parser.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson", help="開放迴路的到達分布")
+    parser.add_argument("--warmup", type=int, default=20, help="開始量測前先送出的請求數 (填滿快取)")
+    parser.add_argument("--timeout", type=float, default=ELECTRON_TIMEOUT, help="請求逾時秒數 (Electron 為 30)")
+    parser.add_argument("--slo-ms", type=float, help="p99 延遲上限 (預設為 timeout)")
+    parser.add_argument("--keep-going", action="store_true", help="超過負荷後仍繼續較高的到達率")
+    parser.add_argument("--backend", help="後端執行檔 (例如 PyInstaller 打包的 ipc_server)，預設執行 ipc_server.py")
+    parser.add_argument("--env", action="append", default=[], help="額外的環境變數 KEY=VALUE (例如 IPC_WORKERS=8)")
+    parser.add_argument("--fake-finmind", action="store_true", help="使用本機 FinMind 替身 (不需要網路)")
+    parser.add_argument("--finmind-latency", type=float, default=0.05, help="FinMind 替身的延遲秒數")
+    parser.add_argument("--finmind-jitter", type=float, default=0.02, help="FinMind 替身的延遲抖動秒數")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--output", help="結果 JSON 檔案路徑")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+
+    entries = load_trace(args.trace)
+    slo_ms = args.slo_ms or args.timeout * 1000
+    rng = random.Random(args.seed)
+
+    env = dict(os.environ)
+    env.update(item.split("=", 1) for item in args.env)
+
+    fake = None
+    workdir = None
+    if args.fake_finmind:
+        from fake_finmind import FakeFinMind
+        fake = FakeFinMind(latency=args.finmind_latency, jitter=args.finmind_jitter, seed=args.seed).start()
+        workdir = tempfile.TemporaryDirectory(prefix="load-")
+        env.update({
+            "FINMIND_API_URL": fake.url,
+            "EXCHANGE_RATE_STORE": os.path.join(workdir.name, "rates.sqlite3"),
+            "INTENT_CACHE_PATH": os.path.join(workdir.name, "intent_cache.json")
+        })
+
+    client = IPCClient([args.backend] if args.backend else None, env=env, timeout=args.timeout)
+    steps = []
+    try:
+        hello = client.start()
+        requests = itertools.cycle([request for _, request in entries])
+
+        if args.warmup:
+            _warmup(client, requests, args.warmup)
+
+        if args.speed:
+            steps.append(run_timed(client, entries, args.speed))
+        for concurrency in _numbers(args.concurrency, int):
+            steps.append(run_closed_loop(client, requests, concurrency, args.duration))
+        for rate in _numbers(args.rates, float):
+            step = run_open_loop(client, requests, rate, args.duration, args.arrival == "poisson", rng)
+            step["saturated"] = saturated(step, slo_ms)
+            step["projected_timeout_s"] = projected_timeout(step, args.timeout) if step["saturated"] else None
+            steps.append(step)
+            if step["saturated"] and not args.keep_going:
+                break
+        if not steps:
+            steps.append(run_closed_loop(client, requests, hello.get("max_workers", 1), args.duration))
+    finally:
+        client.close()
+        if fake is not None:
+            fake.stop()
+            workdir.cleanup()
+
+    open_steps = [step for step in steps if step["mode"] == "open"]
+    report = {
+        "trace": args.trace,
+        "backend": client.command,
+        "protocol": hello.get("protocol"),
+        "max_workers": hello.get("max_workers"),
+        "framing": hello.get("framing"),
+        "timeout_s": args.timeout,
+        "slo_ms": slo_ms,
+        "steps": steps,
+        "max_sustained_rps": max((step["offered_rps"] for step in open_steps if not step["saturated"]), default=None),
+        "peak_throughput_rps": max((step["throughput_rps"] for step in steps), default=None)
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+def _warmup(client: IPCClient, requests, count: int):
+    """依序送出 count 個請求並等待完成"""
+    recorder = StepRecorder(client.timeout)
+    for request in itertools.islice(requests, count):
+        recorder.on_send(client.outstanding + 1)
+        client.send(request, recorder.callback(request.get("action")))
+    recorder.wait(time.perf_counter() + client.timeout)
+
+
+def _numbers(value: str, kind) -> list:
+    return [kind(item) for item in value.split(",") if item.strip()] if value else []
+
+
+def print_report(report: dict):
+    print(f"protocol {report['protocol']}，workers {report['max_workers']}，framing {report['framing']}")
+    print(f"{'step':<14}{'sent':>7}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+          f"{'timeouts':>10}{'queue':>7}")
+    for step in report["steps"]:
+        if step["mode"] == "open":
+            label = f"{step['offered_rps']:g} rps"
+        elif step["mode"] == "closed":
+            label = f"c={step['concurrency']}"
+        else:
+            label = f"trace x{step['speed']:g}"
+        flag = " ⚠️ 超過負荷" if step.get("saturated") else ""
+        if step.get("projected_timeout_s"):
+            flag += f" (約 {step['projected_timeout_s']} 秒後開始逾時)"
+        print(f"{label:<14}{step['sent']:>7}{step['throughput_rps']:>9}{_fmt(step['p50_ms'])}{_fmt(step['p95_ms'])}"
+              f"{_fmt(step['p99_ms'])}{_fmt(step['max_ms'])}{step['timeouts']:>10}{step['max_outstanding']:>7}{flag}")
+    if report["max_sustained_rps"] is not None:
+        print(f"可負荷的最高到達率: {report['max_sustained_rps']:g} rps")
+    print(f"最高吞吐量: {report['peak_throughput_rps']} rps")
+
+
+def _fmt(value) -> str:
+    return f"{value:>10.1f}" if value is not None else f"{'-':>10}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+IPC Server 離線效能測試
+
+以本機 FinMind 替身 (fake_finmind.py) 與 Gemini 替身 (fake_gemini.py) 取代外部服務，量測：
+
+1. 冷啟動：spawn ipc_server.py 到 hello 回應、第一個 exchange_rate 回應的時間，以及程序記憶體
+2. 各動作：以固定並行數執行 handle_request 的吞吐量與 p50/p95/p99 延遲，
+   以及第一個請求 (快取為空) 的延遲與上游請求次數
+
+結果輸出為 JSON (預設 bench/results/bench-<commit>.json)，可用 --compare 與其他 commit 的結果比較，
+有退步時結束碼為 1。
+
+使用方法:
+    python3 bench/run_bench.py
+    python3 bench/run_bench.py --requests 500 --concurrency 8 --finmind-latency 0.1
+    python3 bench/run_bench.py --compare bench/results/bench-abc1234.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(BACKEND_DIR)
+sys.path.append(BENCH_DIR)
+
+from fake_finmind import FakeFinMind
+from fake_gemini import FakeGemini
+
+CURRENCIES = ["USD", "JPY", "EUR", "CNY", "GBP", "AUD", "HKD", "SGD"]
+
+# ai_chat 的查詢組合：規則解析可直接處理的查詢、需要 Gemini 的趨勢查詢與低可信度查詢
+CHAT_QUERIES = [
+    "美金匯率多少？",
+    "10000台幣換日圓",
+    "日幣限額多少",
+    "美金最近趨勢如何？適合現在換嗎",
+    "我下個月要去東京玩，預算三萬塊",
+    "歐元匯率",
+    "50000台幣可以換多少港幣",
+    "英鎊會漲嗎",
+]
+
+
+def _request(action: str, i: int) -> dict:
+    """產生第 i 個 action 請求"""
+    currency = CURRENCIES[i % len(CURRENCIES)]
+    if action == "exchange_rate":
+        return {"action": action, "currency": currency}
+    if action == "calculate_exchange":
+        return {"action": action, "currency": currency, "twd_amount": 1000 + i, "is_buying": i % 2 == 0}
+    if action == "get_multiple_rates":
+        return {"action": action, "currencies": CURRENCIES}
+    if action == "calculate_exchange_batch":
+        return {
+            "action": action,
+            "currencies": [CURRENCIES[j % len(CURRENCIES)] for j in range(100)],
+            "twd_amounts": [1000 + j for j in range(100)],
+            "is_buying": True
+        }
+    if action == "rate_stats":
+        return {"action": action, "currency": currency}
+    if action == "batch":
+        return {"action": action, "requests": [_request("exchange_rate", i + j) for j in range(4)]
+                + [_request("calculate_exchange", i + j) for j in range(4)]}
+    if action == "ai_chat":
+        return {"action": action, "query": CHAT_QUERIES[i % len(CHAT_QUERIES)]}
+    raise ValueError(f"Unknown action: {action}")
+
+
+ACTIONS = ("exchange_rate", "calculate_exchange", "get_multiple_rates", "calculate_exchange_batch",
+           "rate_stats", "batch", "ai_chat")
+
+
+def percentile(values: list, q: float) -> float:
+    """已排序列表的第 q 分位數 (nearest-rank)"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(latencies: list) -> dict:
+    """延遲 (秒) 的統計，單位為毫秒"""
+    values = sorted(latencies)
+    return {
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else None,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3) if values else None,
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3) if values else None,
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3) if values else None,
+        "max_ms": round(values[-1] * 1000, 3) if values else None
+    }
+
+
+def make_server(workdir: str, gemini: FakeGemini):
+    """建立使用獨立快取檔案與 Gemini 替身的 IPCServer"""
+    from ipc_server import IPCServer
+    from agent.agent import AI_Agent
+
+    os.environ["EXCHANGE_RATE_STORE"] = os.path.join(workdir, "rates.sqlite3")
+    agent = AI_Agent(intent_cache_path=os.path.join(workdir, "intent_cache.json"))
+    agent.client = gemini
+
+    server = IPCServer()
+    server.bank_agent = agent
+    return server
+
+
+def bench_action(action: str, requests: int, concurrency: int, finmind: FakeFinMind, args) -> dict:
+    """
+    量測單一動作 (每個動作使用新的 IPCServer 與空的快取)
+
+    Returns:
+        dict: requests, concurrency, errors, throughput_rps, first_ms, mean/p50/p95/p99/max_ms,
+              upstream_requests (FinMind 請求次數)、llm_calls (Gemini 呼叫次數)
+    """
+    gemini = FakeGemini(latency=args.gemini_latency, jitter=args.gemini_jitter, seed=args.seed)
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        server = make_server(workdir, gemini)
+        upstream_before = finmind.requests
+
+        started = time.perf_counter()
+        first = server.handle_request(_request(action, 0))
+        first_ms = (time.perf_counter() - started) * 1000
+
+        def run_one(i):
+            request_started = time.perf_counter()
+            response = server.handle_request(_request(action, i))
+            return time.perf_counter() - request_started, bool(response.get("success"))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(run_one, range(1, requests + 1)))
+        elapsed = time.perf_counter() - started
+
+        if server.bank_agent._exchange_rate is not None:
+            server.bank_agent._exchange_rate.session.close()
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for _, success in outcomes if not success) + (0 if first.get("success") else 1),
+        "throughput_rps": round(requests / elapsed, 1),
+        "first_ms": round(first_ms, 3),
+        **summarize([latency for latency, _ in outcomes]),
+        "upstream_requests": finmind.requests - upstream_before,
+        "llm_calls": gemini.calls
+    }
+
+
+def _process_memory(pid: int) -> dict:
+    """讀取程序的記憶體用量 (KB，只支援 Linux 的 /proc)"""
+    result = {}
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    result[key.lower() + "_kb"] = int(value.split()[0])
+    except OSError:
+        pass
+    return result
+
+
+def bench_cold_start(finmind: FakeFinMind, timeout: float = 30.0) -> dict:
+    """
+    與 Electron 相同的方式啟動 ipc_server.py (stdin/stdout 一行一則 JSON)
+
+    Returns:
+        dict: ready_ms (spawn 到 hello 回應)、first_rate_ms (hello 之後第一個 exchange_rate 的回應時間，
+              包含延遲載入 Bank Agent)、idle/loaded 的記憶體用量
+    """
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        env = {key: value for key, value in os.environ.items() if key != "GEMINI_API_KEY"}
+        env.update({
+            "FINMIND_API_URL": finmind.url,
+            "EXCHANGE_RATE_STORE": os.path.join(workdir, "rates.sqlite3"),
+            "INTENT_CACHE_PATH": os.path.join(workdir, "intent_cache.json"),
+            "PYTHONUNBUFFERED": "1"
+        })
+
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(BACKEND_DIR, "ipc_server.py")],
+            cwd=BACKEND_DIR, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding="utf-8"
+        )
+
+        def call(request: dict) -> dict:
+            process.stdin.write(json.dumps(request) + "\n")
+            process.stdin.flush()
+            deadline = time.perf_counter() + timeout
+            while time.perf_counter() < deadline:
+                line = process.stdout.readline()
+                if not line:
+                    break
+                if line.startswith("{"):
+                    response = json.loads(line)
+                    if response.get("id") == request["id"]:
+                        return response
+            raise RuntimeError(f"ipc_server did not answer {request['action']}")
+
+        try:
+            hello = call({"id": 1, "action": "hello", "protocol": 2})
+            ready_ms = (time.perf_counter() - started) * 1000
+            idle = _process_memory(process.pid)
+
+            rate_started = time.perf_counter()
+            rate = call({"id": 2, "action": "exchange_rate", "currency": "USD"})
+            first_rate_ms = (time.perf_counter() - rate_started) * 1000
+            loaded = _process_memory(process.pid)
+        finally:
+            process.stdin.close()
+            process.wait(timeout=timeout)
+
+    return {
+        "ready_ms": round(ready_ms, 1),
+        "startup_ms": hello.get("startup_ms"),
+        "first_rate_ms": round(first_rate_ms, 1),
+        "first_rate_success": bool(rate.get("success")),
+        "idle_rss_kb": idle.get("vmrss_kb"),
+        "loaded_rss_kb": loaded.get("vmrss_kb"),
+        "peak_rss_kb": loaded.get("vmhwm_kb")
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_bench(args) -> dict:
+    actions = args.actions.split(",") if args.actions else list(ACTIONS)
+
+    with FakeFinMind(latency=args.finmind_latency, jitter=args.finmind_jitter, seed=args.seed) as finmind:
+        os.environ["FINMIND_API_URL"] = finmind.url
+        # 不使用 Gemini API key，避免 AI_Agent 建立真正的客戶端
+        os.environ.pop("GEMINI_API_KEY", None)
+
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count()
+            },
+            "config": {
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "finmind_latency": args.finmind_latency,
+                "finmind_jitter": args.finmind_jitter,
+                "gemini_latency": args.gemini_latency,
+                "gemini_jitter": args.gemini_jitter,
+                "seed": args.seed
+            },
+            "cold_start": None if args.skip_cold_start else bench_cold_start(finmind),
+            "actions": {}
+        }
+
+        for action in actions:
+            report["actions"][action] = bench_action(action, args.requests, args.concurrency, finmind, args)
+
+    try:
+        import resource
+        # Linux 為 KB，macOS 為 bytes
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        report["meta"]["bench_peak_rss_kb"] = maxrss // 1024 if sys.platform == "darwin" else maxrss
+    except ImportError:
+        pass
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float, min_delta_ms: float = 1.0) -> list:
+    """
+    與基準結果比較
+
+    延遲 (p50/p99) 增加超過 threshold 比例且超過 min_delta_ms，或吞吐量下降超過 threshold 比例時視為退步。
+
+    Returns:
+        list: 退步項目的說明
+    """
+    regressions = []
+    for action, current in report["actions"].items():
+        base = baseline.get("actions", {}).get(action)
+        if not base:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if current[key] is None or base[key] is None:
+                continue
+            if current[key] > base[key] * (1 + threshold) and current[key] - base[key] > min_delta_ms:
+                regressions.append(f"{action} {key}: {base[key]} → {current[key]}")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{action} throughput_rps: {base['throughput_rps']} → {current['throughput_rps']}")
+        if current["upstream_requests"] > base["upstream_requests"]:
+            regressions.append(f"{action} upstream_requests: {base['upstream_requests']} → {current['upstream_requests']}")
+
+    base_cold, cold = baseline.get("cold_start"), report.get("cold_start")
+    if base_cold and cold:
+        for key in ("ready_ms", "first_rate_ms"):
+            if cold[key] > base_cold[key] * (1 + threshold) and cold[key] - base_cold[key] > min_delta_ms:
+                regressions.append(f"cold_start {key}: {base_cold[key]} → {cold[key]}")
+    return regressions
+
+
+def print_report(report: dict):
+    cold = report["cold_start"]
+    if cold:
+        print(f"冷啟動: hello {cold['ready_ms']} ms，第一個匯率 {cold['first_rate_ms']} ms，"
+              f"RSS {cold['idle_rss_kb']} → {cold['loaded_rss_kb']} KB")
+    print(f"{'action':<26}{'rps':>9}{'first':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}{'upstream':>10}{'llm':>6}")
+    for action, result in report["actions"].items():
+        print(f"{action:<26}{result['throughput_rps']:>9}{result['first_ms']:>10.1f}{result['p50_ms']:>9.2f}"
+              f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['errors']:>8}"
+              f"{result['upstream_requests']:>10}{result['llm_calls']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IPC Server 離線效能測試")
+    parser.add_argument("--requests", type=int, default=200, help="每個動作的請求數")
+    parser.add_argument("--concurrency", type=int, default=4, help="並行數 (對應 IPC_WORKERS)")
+    parser.add_argument("--actions", help=f"要量測的動作 (逗號分隔，預設: {','.join(ACTIONS)})")
+    parser.add_argument("--finmind-latency", type=float, default=0.05, help="FinMind 替身的延遲秒數")
+    parser.add_argument("--finmind-jitter", type=float, default=0.02, help="FinMind 替身的延遲抖動秒數")
+    parser.add_argument("--gemini-latency", type=float, default=0.3, help="Gemini 替身的延遲秒數")
+    parser.add_argument("--gemini-jitter", type=float, default=0.1, help="Gemini 替身的延遲抖動秒數")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--skip-cold-start", action="store_true", help="不量測冷啟動")
+    parser.add_argument("--output", help="結果檔案路徑 (預設 bench/results/bench-<commit>.json，- 表示不寫檔)")
+    parser.add_argument("--compare", help="比較的基準結果檔案")
+    parser.add_argument("--threshold", type=float, default=0.25, help="視為退步的變化比例")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+
+    report = run_bench(args)
+
+    output = args.output or os.path.join(BENCH_DIR, "results", f"bench-{report['meta']['commit']}.json")
+    if output != "-":
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report["regressions"] = regressions
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+        if output != "-":
+            print(f"結果: {output}")
+        if args.compare:
+            print("\n".join(f"❌ {item}" for item in regressions) if regressions else "✅ 沒有退步")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+IPC 輸出格式 (framing) 與序列化
+
+預設每則回應為一行 JSON (line)。透過 hello 協商後可改用長度前綴格式 (length-prefixed)：
+每則回應為 4 bytes big-endian 長度 + payload，payload 由協商的 codec 編碼。
+
+- json: 有安裝 orjson 時使用 orjson，否則使用標準函式庫 json (輸出皆為 UTF-8 JSON)
+- msgpack: 需安裝 msgpack
+"""
+
+import json
+import queue
+import struct
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+FRAMING_LINE = "line"
+FRAMING_LENGTH_PREFIXED = "length-prefixed"
+
+HEADER = struct.Struct(">I")
+
+
+def available_codecs() -> list:
+    """取得目前環境可用的 codec"""
+    codecs = ["json"]
+    if msgpack is not None:
+        codecs.append("msgpack")
+    return codecs
+
+
+def encode(response: dict, codec: str = "json") -> bytes:
+    """將回應編碼為 bytes"""
+    if codec == "msgpack":
+        return msgpack.packb(response, use_bin_type=True, default=_to_builtin)
+
+    if orjson is not None:
+        try:
+            return orjson.dumps(response, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass
+    return json.dumps(response, ensure_ascii=False, default=_to_builtin).encode("utf-8")
+
+
+def _to_builtin(value):
+    """將 numpy/pandas 純量等型別轉為內建型別"""
+    if hasattr(value, "item"):
+        return value.item()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class FrameWriter:
+    """
+    長度前綴格式的輸出執行緒
+
+    回應先放入佇列，由單一執行緒取出；一次取出佇列中所有待送的 frame 再 flush，
+    減少高流量時的系統呼叫次數。
+    """
+
+    def __init__(self, stream, codec: str = "json"):
+        """
+        Args:
+            stream: 二進位輸出串流 (例如 sys.stdout.buffer)
+            codec: payload 編碼方式
+        """
+        self.stream = stream
+        self.codec = codec
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="ipc-frame-writer", daemon=True)
+        self._thread.start()
+
+    def send(self, response: dict):
+        payload = encode(response, self.codec)
+        self._queue.put(HEADER.pack(len(payload)) + payload)
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+
+            frames = [frame]
+            stop = False
+            while True:
+                try:
+                    pending = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if pending is None:
+                    stop = True
+                    break
+                frames.append(pending)
+
+            self.stream.write(b"".join(frames))
+            self.stream.flush()
+            if stop:
+                break
+
+    def close(self):
+        """送出所有待送的 frame 後結束"""
+        self._queue.put(None)
+        self._thread.join()
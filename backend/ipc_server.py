@@ -1,16 +1,37 @@
 #!/usr/bin/env python3
 
+import time
+_PROCESS_START = time.perf_counter()
 
 import sys
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 
 sys.stdout.reconfigure(encoding='utf-8')
 sys.stderr.reconfigure(encoding='utf-8')
 
-from agent.agent import AI_Agent
-import requests
+# AI_Agent (google.genai、pandas、requests) 延遲到第一個需要的動作才載入，加快啟動
+from tool.Parallel import map_with_deadline, TIMED_OUT
+from tool.Metrics import METRICS
+from tool.Tracing import TRACER, KIND_SERVER
+import ipc_framing
+
+# IPC 協定版本
+# 1: 依序處理，回應順序與請求順序相同 (FIFO)
+# 2: 平行處理，回應可能不依順序送出，以請求的 id 對應
+PROTOCOL_VERSION = 2
+
+# 需要查詢最新匯率的動作 (batch 中會先合併查詢)
+RATE_ACTIONS = ("exchange_rate", "calculate_exchange")
+
+# 不能放在 batch 中的動作：協定協商會切換 stdout 與傳輸格式，只能由主迴圈處理；
+# 效能分析的開始/結束與巢狀 batch 也不應在工作執行緒中執行
+BATCH_EXCLUDED_ACTIONS = ("batch", "hello", "profile_start", "profile_stop")
+
 
 class IPCServer:
 
@@ -35,6 +56,8 @@ class IPCServer:
             "Content-Type": "application/json"
         }
 
+        import requests
+
         print(f"正在驗證 API 金鑰...")
 
         try:
@@ -57,24 +80,101 @@ class IPCServer:
             print(f"驗證 API 金鑰時發生網路錯誤: {e}")
             return False
 
-    def __init__(self):
-        # Initialize Bank Agent (Exchange Rate) - always available
+    def __init__(self, max_workers: int = None):
+        # 協定版本預設為 1 (相容舊版 Electron)，由 hello 動作協商升級
+        self.protocol = 1
+        self.max_workers = max_workers or int(os.environ.get("IPC_WORKERS", 4))
+        self._executor = None
+        self._write_lock = threading.Lock()
+        self._stdout = sys.stdout
+
+        # 輸出格式預設為一行一則 JSON，可由 hello 協商改為長度前綴格式
+        self.framing = ipc_framing.FRAMING_LINE
+        self.codec = "json"
+        self._pending_framing = None
+        self._frame_writer = None
+
+        # Bank Agent (Exchange Rate) 在第一次使用時才初始化
+        self._bank_agent = None
+        self._agent_lock = threading.Lock()
+
+        # 背景匯率預取 (RATE_PREFETCH=1 時啟用)
+        self.prefetcher = None
+
+        # 請求追蹤 (TRACE_SAMPLE_RATE、TRACE_FILE)，請求帶 "trace": true 時一定記錄
+        TRACER.configure()
+
+        # 效能分析 (profile_start / profile_stop)
+        self.profiler = None
+        self._profile_lock = threading.Lock()
+        self._profile_timer = None
+        self._last_profile = None
+
+        # 記錄收到的請求 (IPC_RECORD=檔案路徑 時啟用)，可由 bench/load_replay.py 重播
+        self._record_file = None
+        self._record_start = time.perf_counter()
+        if os.environ.get("IPC_RECORD"):
+            self._record_file = open(os.environ["IPC_RECORD"], "a", encoding="utf-8")
+
+        if os.environ.get("IPC_PRELOAD") == "1" or os.environ.get("RATE_PREFETCH") == "1":
+            # 先回應 hello，再於背景載入 Bank Agent
+            threading.Thread(target=self._preload, name="ipc-preload", daemon=True).start()
+
+    @property
+    def bank_agent(self):
+        if self._bank_agent is None:
+            with self._agent_lock:
+                if self._bank_agent is None:
+                    try:
+                        from agent.agent import AI_Agent
+                        self._bank_agent = AI_Agent()
+                        sys.stderr.write("Bank Agent initialized successfully\n")
+                        sys.stderr.flush()
+                    except Exception as e:
+                        sys.stderr.write(f"Error: Failed to initialize Bank Agent: {e}\n")
+                        sys.stderr.flush()
+                        raise
+        return self._bank_agent
+
+    @bank_agent.setter
+    def bank_agent(self, value):
+        self._bank_agent = value
+
+    def _preload(self):
+        """背景初始化 Bank Agent 與匯率查詢工具"""
         try:
-            self.bank_agent = AI_Agent()
-            sys.stderr.write("Bank Agent initialized successfully\n")
-            sys.stderr.flush()
-        except Exception as e:
-            sys.stderr.write(f"Error: Failed to initialize Bank Agent: {e}\n")
-            sys.stderr.flush()
-            self.bank_agent = None
+            self.bank_agent.exchange_rate
+        except Exception:
+            return
 
-    def handle_request(self, request: dict) -> dict:
+        if os.environ.get("RATE_PREFETCH") == "1":
+            from agent.prefetcher import RatePrefetcher
+            self.prefetcher = RatePrefetcher(self.bank_agent)
+            self.prefetcher.start()
 
+    def handle_request(self, request: dict) -> dict:
+        """處理單一請求，並記錄該動作的延遲、處理中數量與失敗次數"""
         action = request.get("action")
+        with METRICS.track("action", action) as outcome, TRACER.span(f"ipc.{action}") as span:
+            profiler = self.profiler
+            if profiler is not None:
+                result = profiler.call(self._handle_action, action, request)
+            else:
+                result = self._handle_action(action, request)
+            outcome.error = not result.get("success", True)
+            if outcome.error:
+                span.record_error(str(result.get("error")))
+        return result
+
+    def _handle_action(self, action, request: dict) -> dict:
 
         try:
+            # Protocol - Negotiate protocol version
+            if action == "hello":
+                return self._negotiate(request)
+
             # Exchange Rate - Get Rate
-            if action == "exchange_rate":
+            elif action == "exchange_rate":
                 currency = request.get("currency")
                 if not currency:
                     return {"success": False, "error": "Missing currency"}
@@ -95,13 +195,48 @@ class IPCServer:
                 result = self.bank_agent.calculate_exchange(currency, float(twd_amount), is_buying)
                 return result
 
+            # Exchange Rate - Batch conversion (columnar arrays or a list of items)
+            elif action == "calculate_exchange_batch":
+                items = request.get("items")
+                if isinstance(items, list):
+                    currencies = [item.get("currency") for item in items]
+                    twd_amounts = [item.get("twd_amount") for item in items]
+                    is_buying = [item.get("is_buying", True) for item in items]
+                else:
+                    currencies = request.get("currencies")
+                    twd_amounts = request.get("twd_amounts")
+                    is_buying = request.get("is_buying", True)
+
+                if not isinstance(currencies, list) or not isinstance(twd_amounts, list):
+                    return {"success": False, "error": "Missing currencies or twd_amounts"}
+
+                result = self.bank_agent.calculate_exchange_batch(
+                    currencies, twd_amounts, is_buying, timeout=float(request.get("timeout", 20))
+                )
+                return result
+
+            # Exchange Rate - Rolling statistics (mean, min/max, volatility, spread)
+            elif action == "rate_stats":
+                currency = request.get("currency")
+                if not currency:
+                    return {"success": False, "error": "Missing currency"}
+
+                result = self.bank_agent.get_rate_stats(currency)
+                return result
+
             # Exchange Rate - Get Multiple Rates
             elif action == "get_multiple_rates":
                 currencies = request.get("currencies")
                 if not currencies:
                     return {"success": False, "error": "Missing currencies"}
 
-                result = self.bank_agent.get_multiple_rates(currencies)
+                timeout = request.get("timeout", 20.0)
+                result = self.bank_agent.get_multiple_rates(currencies, timeout=float(timeout))
+                return result
+
+            # Exchange Rate - Refresh All Rates (single upstream request)
+            elif action == "refresh_all_rates":
+                result = self.bank_agent.refresh_all_rates(request.get("currencies"))
                 return result
 
             # Exchange Rate - Get Bank Rules
@@ -115,13 +250,59 @@ class IPCServer:
                 result = self.bank_agent.roles()
                 return {"success": True, "info": result}
 
+            # Exchange Rate - Cache Statistics
+            elif action == "cache_stats":
+                result = self.bank_agent.get_cache_stats()
+                return result
+
+            # Background prefetch status (last refresh age etc.)
+            elif action == "prefetch_stats":
+                if self.prefetcher is None:
+                    return {"success": True, "enabled": False}
+                return {"success": True, "enabled": True, **self.prefetcher.stats()}
+
+            # Metrics - Latency histograms, error counters and cache hit ratios
+            elif action == "metrics":
+                return self._metrics(request.get("format", "json"))
+
+            # Profiling - Start a sampling / cProfile session in the live server
+            elif action == "profile_start":
+                return self._profile_start(request)
+
+            # Profiling - Stop and write pstats / collapsed stacks / tracemalloc files
+            elif action == "profile_stop":
+                return self._profile_stop()
+
+            # Query routing stats (rules vs Gemini)
+            elif action == "routing_stats":
+                result = self.bank_agent.get_routing_stats()
+                return result
+
+            # Batch - Execute multiple sub-requests
+            elif action == "batch":
+                sub_requests = request.get("requests")
+                if not isinstance(sub_requests, list):
+                    return {"success": False, "error": "Missing requests"}
+
+                timeout = request.get("timeout", 25.0)
+                return self._handle_batch(sub_requests, float(timeout))
+
             # AI Chat - Process natural language query
             elif action == "ai_chat":
                 query = request.get("query")
                 if not query:
                     return {"success": False, "error": "Missing query"}
 
-                result = self.bank_agent.process_query(query)
+                # 先檢查參數，避免格式錯誤的請求仍呼叫 Gemini
+                history, error = self._history_options(request)
+                if error:
+                    return {"success": False, "error": error}
+
+                # 串流模式需要以 id 對應 chunk，只在協定 2 以上啟用
+                if request.get("stream") and "id" in request and self.protocol >= 2:
+                    return self._stream_chat(request["id"], query, history)
+
+                result = self.bank_agent.process_query(query, history)
                 return result
 
             # Unknown action
@@ -131,9 +312,181 @@ class IPCServer:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def _metrics(self, output_format: str = "json") -> dict:
+        """
+        取得執行統計
+
+        包含各動作與上游服務 (FinMind、Gemini) 的延遲分布、錯誤次數、處理中數量，
+        以及快取、查詢路由、預取排程的統計。Bank Agent 尚未初始化時不為了統計而建立。
+
+        Args:
+            output_format: "json" 或 "prometheus" (以 text 欄位回傳 Prometheus 文字格式)
+        """
+        stats = {}
+        if self._bank_agent is not None:
+            stats.update(self._bank_agent.get_cache_stats())
+            stats["routing"] = self._bank_agent.get_routing_stats()
+            for value in (stats, stats["routing"]):
+                value.pop("success", None)
+        if self.prefetcher is not None:
+            stats["prefetch"] = self.prefetcher.stats()
+
+        if output_format == "prometheus":
+            return {"success": True, "format": "prometheus", "text": METRICS.to_prometheus(stats)}
+        return {"success": True, **METRICS.snapshot(), **stats}
+
+    def _profile_start(self, request: dict) -> dict:
+        """
+        開始效能分析
+
+        Args (request):
+            mode: sample (預設，取樣呼叫堆疊)、cprofile 或 both
+            interval: 取樣間隔秒數 (預設 0.005)
+            tracemalloc: 是否記錄記憶體配置 (true 或堆疊深度)
+            duration: 自動停止的秒數 (可選，結果可之後以 profile_stop 取得)
+            output_dir: 輸出目錄 (可選，預設讀取環境變數 PROFILE_DIR)
+        """
+        from tool.Profiler import ProfileSession
+
+        tracemalloc_frames = request.get("tracemalloc", 0)
+        if tracemalloc_frames is True:
+            tracemalloc_frames = 10
+
+        with self._profile_lock:
+            if self.profiler is not None:
+                return {"success": False, "error": "Profiler is already running"}
+
+            session = ProfileSession(
+                mode=request.get("mode", "sample"),
+                interval=float(request.get("interval", 0.005)),
+                tracemalloc_frames=int(tracemalloc_frames or 0),
+                output_dir=request.get("output_dir")
+            )
+            session.start()
+            self.profiler = session
+            self._last_profile = None
+
+            duration = request.get("duration")
+            if duration:
+                self._profile_timer = threading.Timer(float(duration), self._profile_stop)
+                self._profile_timer.daemon = True
+                self._profile_timer.start()
+
+        return {"success": True, "mode": session.mode, "output_dir": session.output_dir}
+
+    def _profile_stop(self) -> dict:
+        """結束效能分析並寫出結果 (已因 duration 自動停止時回傳該次結果)"""
+        with self._profile_lock:
+            session = self.profiler
+            if session is None:
+                if self._last_profile is not None:
+                    return self._last_profile
+                return {"success": False, "error": "Profiler is not running"}
+
+            if self._profile_timer is not None:
+                self._profile_timer.cancel()
+                self._profile_timer = None
+            self.profiler = None
+            self._last_profile = {"success": True, **session.stop()}
+            return self._last_profile
+
+    @staticmethod
+    def _history_options(request: dict):
+        """
+        讀取 ai_chat 的 history_points (最多筆數，正整數) 與 history_delta (差值編碼)
+
+        Returns:
+            tuple: (to_columns 的參數 dict，未指定時為 None；格式錯誤時的錯誤訊息)
+        """
+        points = request.get("history_points")
+        delta = request.get("history_delta", False)
+        options = {}
+        if points is not None:
+            if isinstance(points, bool) or not isinstance(points, int) or points <= 0:
+                return None, f"history_points must be a positive integer: {points!r}"
+            options["max_points"] = points
+        if not isinstance(delta, bool):
+            return None, f"history_delta must be a boolean: {delta!r}"
+        if delta:
+            options["delta"] = True
+        return options or None, None
+
+    def _stream_chat(self, request_id, query: str, history: Optional[dict] = None) -> dict:
+        """
+        串流處理 ai_chat
+
+        Gemini 每輸出一段文字就送出 {"id", "event": "chunk", "text"}，
+        最後的結果由 _dispatch 以一般回應送出 (帶 "streamed": true)。
+        """
+        result = None
+        for event in self.bank_agent.stream_query(query, history):
+            if event["event"] == "chunk":
+                self._send_response({"id": request_id, "event": "chunk", "text": event["text"]})
+            else:
+                result = event["result"]
+        return {**(result or {"success": False, "error": "No result"}), "streamed": True}
+
+    def _handle_batch(self, sub_requests: list, timeout: float) -> dict:
+        """
+        平行執行 batch 中的子請求
+
+        - 內容相同的子請求 (忽略 id) 只執行一次並共用結果
+        - 需要匯率的子請求會先依貨幣合併查詢一次，之後直接命中快取
+        - 結果依輸入順序排列，並帶回子請求的 id
+        """
+        keys = []
+        unique = {}
+        for sub in sub_requests:
+            if not isinstance(sub, dict):
+                keys.append(None)
+                continue
+            body = {k: v for k, v in sub.items() if k != "id"}
+            key = json.dumps(body, sort_keys=True, ensure_ascii=False)
+            keys.append(key)
+            unique.setdefault(key, body)
+
+        currencies = list(dict.fromkeys(
+            str(body["currency"]).upper() for body in unique.values()
+            if body.get("action") in RATE_ACTIONS and body.get("currency")
+        ))
+        if currencies:
+            self.bank_agent.get_multiple_rates(currencies, max_workers=self.max_workers, timeout=timeout)
+
+        def run_one(key):
+            body = unique[key]
+            action = body.get("action")
+            if action == "batch":
+                return {"success": False, "error": "Nested batch is not supported"}
+            if action in BATCH_EXCLUDED_ACTIONS:
+                return {"success": False, "error": f"Action not allowed in batch: {action}"}
+            return self.handle_request(body)
+
+        outcomes = dict(map_with_deadline(run_one, unique.keys(), max_workers=self.max_workers, timeout=timeout))
+
+        results = []
+        for sub, key in zip(sub_requests, keys):
+            if key is None:
+                result = {"success": False, "error": "Invalid sub-request"}
+            elif outcomes[key] is TIMED_OUT:
+                result = {"success": False, "error": "Batch timeout"}
+            elif isinstance(outcomes[key], Exception):
+                result = {"success": False, "error": str(outcomes[key])}
+            else:
+                result = outcomes[key]
+
+            if isinstance(sub, dict) and "id" in sub:
+                result = {"id": sub["id"], **result}
+            results.append(result)
+
+        return {
+            "success": True,
+            "results": results,
+            "deduplicated": len(sub_requests) - len(unique)
+        }
+
     def run(self):
         """;�� - �� stdin &�e stdout"""
-        sys.stderr.write("IPC Server started\n")
+        sys.stderr.write(f"IPC Server started ({(time.perf_counter() - _PROCESS_START) * 1000:.0f} ms)\n")
         sys.stderr.flush()
 
         while True:
@@ -159,10 +512,16 @@ class IPCServer:
                     continue
 
 
-                response = self.handle_request(request)
-
+                if self._record_file is not None:
+                    self._record(request)
 
-                self._send_response(response)
+                # 協定 2 以上交給工作執行緒處理，不阻塞下一個請求
+                if self._executor is not None and request.get("action") != "hello":
+                    self._executor.submit(self._dispatch, request)
+                else:
+                    self._dispatch(request)
+                    # hello 的回應仍以原格式送出，之後才切換輸出格式
+                    self._apply_framing()
 
             except KeyboardInterrupt:
                 sys.stderr.write("Interrupted\n")
@@ -174,12 +533,108 @@ class IPCServer:
                 response = {"success": False, "error": str(e)}
                 self._send_response(response)
 
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        if self.profiler is not None:
+            self._profile_stop()
+
+        # 等待處理中的請求送出回應後再結束
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._frame_writer is not None:
+            self._frame_writer.close()
+        if self._record_file is not None:
+            self._record_file.close()
+
+    def _record(self, request: dict):
+        """以 JSONL 記錄請求與相對時間 (不含 id 與 hello)"""
+        if request.get("action") == "hello":
+            return
+        entry = {
+            "t": round(time.perf_counter() - self._record_start, 3),
+            "request": {k: v for k, v in request.items() if k != "id"}
+        }
+        self._record_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._record_file.flush()
+
+    def _negotiate(self, request: dict) -> dict:
+        """協商協定版本，版本 2 以上啟用平行處理"""
+        try:
+            requested = int(request.get("protocol", 1))
+        except (TypeError, ValueError):
+            requested = 1
+
+        self.protocol = max(1, min(requested, PROTOCOL_VERSION))
+        if self.protocol >= 2 and self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ipc-worker")
+            # 平行處理時其他執行緒的 print 可能與回應交錯，改導向 stderr
+            sys.stdout = sys.stderr
+
+        framing = request.get("framing", self.framing)
+        codec = request.get("codec", "json")
+        if framing != ipc_framing.FRAMING_LENGTH_PREFIXED or codec not in ipc_framing.available_codecs():
+            framing, codec = self.framing, self.codec
+        self._pending_framing = (framing, codec)
+
+        return {
+            "success": True,
+            "ready": True,
+            "startup_ms": round((time.perf_counter() - _PROCESS_START) * 1000, 1),
+            "protocol": self.protocol,
+            "max_workers": self.max_workers if self.protocol >= 2 else 1,
+            "framing": framing,
+            "codec": codec,
+            "codecs": ipc_framing.available_codecs()
+        }
+
+    def _apply_framing(self):
+        """套用 hello 協商的輸出格式"""
+        if self._pending_framing is None:
+            return
+        framing, codec = self._pending_framing
+        self._pending_framing = None
+
+        if framing == ipc_framing.FRAMING_LENGTH_PREFIXED and self._frame_writer is None:
+            self._frame_writer = ipc_framing.FrameWriter(self._stdout.buffer, codec)
+            self.framing, self.codec = framing, codec
+            # 長度前綴格式下 stdout 不可混入其他輸出
+            sys.stdout = sys.stderr
+
+    def _dispatch(self, request: dict):
+        """
+        處理單一請求並送出回應，回應會帶回請求的 id
+
+        記錄追蹤時 (依 TRACE_SAMPLE_RATE 取樣，或請求帶 "trace": true)，回應會加上 trace_id；
+        請求可帶 "trace_id" 沿用呼叫端的 trace。
+        """
+        attributes = {"ipc.action": request.get("action"), "ipc.id": request.get("id"), "ipc.protocol": self.protocol}
+        with TRACER.span("ipc.request", kind=KIND_SERVER, attributes=attributes, trace_id=request.get("trace_id"),
+                         sampled=True if request.get("trace") else None) as span:
+            try:
+                response = self.handle_request(request)
+            except Exception as e:
+                response = {"success": False, "error": str(e)}
+
+            if "id" in request:
+                response = {"id": request["id"], **response}
+            if span.recording:
+                response = {**response, "trace_id": span.trace_id}
+
+            with TRACER.span("ipc.send_response"):
+                self._send_response(response)
+
     def _send_response(self, response: dict):
 
         try:
+            if self._frame_writer is not None:
+                self._frame_writer.send(response)
+                return
+
             json_str = json.dumps(response, ensure_ascii=False)
-            sys.stdout.write(json_str + "\n")
-            sys.stdout.flush()
+            # 多個工作執行緒共用 stdout，需確保每行完整寫出
+            with self._write_lock:
+                self._stdout.write(json_str + "\n")
+                self._stdout.flush()
         except Exception as e:
             sys.stderr.write(f"Failed to send response: {str(e)}\n")
             sys.stderr.flush()
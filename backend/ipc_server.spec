@@ -8,17 +8,15 @@ a = Analysis(
     binaries=[],
     datas=[],
     hiddenimports=[
-        'anthropic',
         'google.genai',
         'google.auth',
-        'fastapi',
-        'uvicorn',
         'pydantic',
     ],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # IPC server 不使用這些套件 (FastAPI 版本見 main.py；匯率查詢路徑使用 RateSeries，不需要 pandas)
+    excludes=['anthropic', 'fastapi', 'uvicorn', 'starlette', 'tkinter', 'pandas'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
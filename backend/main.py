@@ -1,6 +1,10 @@
+import json
+
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from typing import Optional
 
 from core.engine import CalculatorEngine
@@ -8,6 +12,9 @@ from core.units import UnitConverter
 from core.commercial import CommercialCalculator
 from agent.tools import AgentToolkit
 from agent.llm_client import SmartCalculatorAgent
+from agent.agent import AI_Agent
+from agent.async_agent import AsyncAI_Agent
+from tool.Metrics import METRICS
 
 app = FastAPI(title="Smart Commercial Calculator")
 
@@ -19,12 +26,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_latency(request, call_next):
+    """記錄每個 HTTP 路徑的延遲與 5xx 次數 (見 /metrics)"""
+    with METRICS.track("http", request.url.path) as outcome:
+        response = await call_next(request)
+        outcome.error = response.status_code >= 500
+    return response
+
+
 # 初始化元件
 engine = CalculatorEngine()
 units = UnitConverter()
 commercial = CommercialCalculator()
 toolkit = AgentToolkit(engine, units, commercial)
 agent = SmartCalculatorAgent(toolkit)
+bank_agent = AI_Agent()
+# 與 bank_agent 共用快取，在 event loop 上直接處理查詢 (不佔用執行緒池)
+async_bank_agent = AsyncAI_Agent(bank_agent)
 
 
 # ====== API Models ======
@@ -65,16 +84,68 @@ def agent_query(req: NaturalLanguageRequest):
     return {"response": result}
 
 
+@app.post("/api/bank-agent/query")
+async def bank_agent_query(req: NaturalLanguageRequest):
+    """銀行員 AI 查詢 (async)"""
+    result = await async_bank_agent.process_query(req.query)
+    return {"response": result}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus 文字格式的延遲分布、錯誤次數與快取命中率"""
+    stats = bank_agent.get_cache_stats()
+    stats["routing"] = bank_agent.get_routing_stats()
+    for value in (stats, stats["routing"]):
+        value.pop("success", None)
+    return PlainTextResponse(METRICS.to_prometheus(stats), media_type="text/plain; version=0.0.4")
+
+
+@app.on_event("shutdown")
+async def close_bank_agent():
+    await async_bank_agent.aclose()
+
+
 # ====== WebSocket for real-time ======
 @app.websocket("/ws/agent")
 async def websocket_agent(websocket: WebSocket):
     await websocket.accept()
     while True:
         data = await websocket.receive_text()
-        result = agent.process_query(data)
+        # process_query 是同步呼叫，放到執行緒池避免阻塞其他連線
+        result = await run_in_threadpool(agent.process_query, data)
         await websocket.send_text(result)
 
 
+@app.websocket("/ws/bank-agent")
+async def websocket_bank_agent(websocket: WebSocket):
+    """
+    銀行員 AI 對話 (串流)
+
+    收到 {"id": ..., "query": "..."} 後，依序送出
+    {"id": ..., "event": "chunk", "text": "..."} 與 {"id": ..., "event": "result", "result": {...}}
+    """
+    await websocket.accept()
+    while True:
+        data = await websocket.receive_text()
+        try:
+            request = json.loads(data)
+        except json.JSONDecodeError:
+            request = {"query": data}
+        if not isinstance(request, dict):
+            # 合法的 JSON 但不是物件 (例如 [] 或 "hi")，回傳錯誤而不中斷連線
+            await websocket.send_json({"id": None, "event": "result", "result": {
+                "success": False,
+                "error": "Request must be a JSON object"
+            }})
+            continue
+        request_id = request.get("id")
+
+        # 每次取下一個事件都在執行緒池中進行，Gemini 串流不會阻塞 event loop
+        async for event in iterate_in_threadpool(bank_agent.stream_query(request.get("query", ""))):
+            await websocket.send_json({"id": request_id, **event})
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+IPC Server 啟動時間檢查
+
+1. 以 `python -X importtime` 量測 `import ipc_server` 的累計載入時間，並確認沒有提前載入重量級模組
+2. 啟動 ipc_server.py，量測從 spawn 到 hello 回應 (可接受請求) 的時間
+
+使用方法: python3 startup_check.py [--runs N]
+預算可用環境變數 STARTUP_IMPORT_BUDGET_MS、STARTUP_READY_BUDGET_MS 調整，超過預算時結束碼為 1
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 啟動時不應載入的模組 (應延遲到第一個需要的動作)
+HEAVY_MODULES = ("pandas", "numpy", "google.genai", "requests")
+
+IMPORT_BUDGET_MS = float(os.environ.get("STARTUP_IMPORT_BUDGET_MS", 150))
+READY_BUDGET_MS = float(os.environ.get("STARTUP_READY_BUDGET_MS", 1000))
+
+
+def measure_import(module: str = "ipc_server") -> dict:
+    """
+    以 -X importtime 量測模組載入時間
+
+    Returns:
+        dict: cumulative_ms (該模組的累計載入時間)、heavy (已載入的重量級模組)、top (自身耗時最高的模組)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, encoding="utf-8"
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        rows.append((name, int(self_us), int(cumulative_us)))
+
+    cumulative = next((cum for name, _, cum in rows if name == module), 0)
+    loaded = {name for name, _, _ in rows}
+    heavy = [name for name in HEAVY_MODULES if name in loaded]
+    top = sorted(rows, key=lambda row: row[1], reverse=True)[:10]
+
+    return {
+        "module": module,
+        "cumulative_ms": cumulative / 1000,
+        "heavy": heavy,
+        "top": [{"module": name, "self_ms": self_us / 1000} for name, self_us, _ in top],
+        "returncode": result.returncode
+    }
+
+
+def measure_ready(timeout: float = 30.0) -> dict:
+    """
+    啟動 ipc_server.py 並量測到 hello 回應的時間
+
+    Returns:
+        dict: ready_ms (spawn 到收到 hello 回應)、startup_ms (伺服器自行回報的啟動時間)
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "ipc_server.py")],
+        cwd=BACKEND_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        text=True, encoding="utf-8"
+    )
+    try:
+        process.stdin.write(json.dumps({"id": 1, "action": "hello", "protocol": 2}) + "\n")
+        process.stdin.flush()
+
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            line = process.stdout.readline()
+            if not line:
+                break
+            if not line.startswith("{"):
+                continue
+            response = json.loads(line)
+            if response.get("id") == 1:
+                return {
+                    "ready_ms": (time.perf_counter() - started) * 1000,
+                    "startup_ms": response.get("startup_ms")
+                }
+        raise RuntimeError("ipc_server did not answer hello")
+    finally:
+        process.stdin.close()
+        process.wait(timeout=timeout)
+
+
+def run_check(runs: int = 3) -> dict:
+    """執行多次量測並取中位數，回傳結果與是否通過預算"""
+    imports = [measure_import() for _ in range(runs)]
+    readies = [measure_ready() for _ in range(runs)]
+
+    import_ms = sorted(item["cumulative_ms"] for item in imports)[runs // 2]
+    ready_ms = sorted(item["ready_ms"] for item in readies)[runs // 2]
+    heavy = imports[-1]["heavy"]
+
+    return {
+        "import_ms": round(import_ms, 1),
+        "ready_ms": round(ready_ms, 1),
+        "import_budget_ms": IMPORT_BUDGET_MS,
+        "ready_budget_ms": READY_BUDGET_MS,
+        "heavy_modules": heavy,
+        "top_imports": imports[-1]["top"],
+        "passed": import_ms <= IMPORT_BUDGET_MS and ready_ms <= READY_BUDGET_MS and not heavy
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IPC Server 啟動時間檢查")
+    parser.add_argument("--runs", type=int, default=3, help="量測次數 (取中位數)")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+
+    report = run_check(args.runs)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"import ipc_server: {report['import_ms']} ms (預算 {report['import_budget_ms']} ms)")
+        print(f"spawn → hello:     {report['ready_ms']} ms (預算 {report['ready_budget_ms']} ms)")
+        print(f"提前載入的重量級模組: {', '.join(report['heavy_modules']) or '無'}")
+        print("自身載入時間最長的模組:")
+        for item in report["top_imports"]:
+            print(f"  {item['self_ms']:8.2f} ms  {item['module']}")
+        print("✅ 通過" if report["passed"] else "❌ 超過啟動時間預算")
+
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
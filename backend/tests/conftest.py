@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 與其他模組相同，以 backend 目錄為根目錄匯入 (from tool.X import Y)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
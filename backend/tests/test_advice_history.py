@@ -0,0 +1,53 @@
+import pytest
+
+from ipc_server import IPCServer
+from agent.agent import AI_Agent
+from tool.RateSeries import RateSeries
+
+
+class RecordingAgent:
+    def __init__(self):
+        self.calls = []
+
+    def process_query(self, query, history=None):
+        self.calls.append((query, history))
+        return {"success": True}
+
+
+def make_server():
+    server = IPCServer()
+    server.bank_agent = RecordingAgent()
+    return server
+
+
+@pytest.mark.parametrize("points", [0, -1, 2.5, "3", True])
+def test_invalid_history_points_rejected_before_query(points):
+    server = make_server()
+    response = server.handle_request({"action": "ai_chat", "query": "美金會漲嗎", "history_points": points})
+
+    assert not response["success"]
+    assert "history_points" in response["error"]
+    assert server.bank_agent.calls == []
+
+
+def test_history_options_passed_to_agent():
+    server = make_server()
+    server.handle_request({"action": "ai_chat", "query": "q1"})
+    server.handle_request({"action": "ai_chat", "query": "q2", "history_points": 3, "history_delta": True})
+
+    assert server.bank_agent.calls == [("q1", None), ("q2", {"max_points": 3, "delta": True})]
+
+
+def test_advice_response_applies_history_options():
+    rows = [{"date": f"2024-01-{day:02d}", "cash_buy": 30 + day / 10, "cash_sell": 31 + day / 10,
+             "spot_buy": 30.5, "spot_sell": 30.6} for day in range(1, 11)]
+    series = RateSeries.from_rows(rows, "USD")
+    stats = {"success": True, "cash_sell": 32.0, "windows": {"3": {"mean": 31.9}}}
+
+    plain = AI_Agent._advice_response("USD", stats, series)["data"]["historical"]
+    compact = AI_Agent._advice_response("USD", stats, series, {"max_points": 4, "delta": True})["data"]["historical"]
+
+    assert plain == series.to_columns()
+    assert compact == series.to_columns(max_points=4, delta=True)
+    assert compact["encoding"] == "delta" and len(compact["dates"]) == 4
+    assert compact["dates"][-1] == "2024-01-10"
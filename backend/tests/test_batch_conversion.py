@@ -0,0 +1,83 @@
+import math
+import random
+
+import pytest
+
+from tool import BatchConversion
+from agent.agent import AI_Agent
+
+RULES = {"USD": {"max_amount": 10000}, "JPY": {"max_amount": 1000000}}
+
+
+def make_agent():
+    """只用來呼叫 _calculate_response，不需要初始化 Gemini 與匯率查詢"""
+    agent = AI_Agent.__new__(AI_Agent)
+    agent.bank_rules = RULES
+    return agent
+
+
+def random_rows(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        rows.append((
+            rng.choice(["USD", "JPY"]),
+            round(rng.uniform(1, 100000), rng.choice([0, 1, 2])),
+            rng.random() < 0.5,
+            round(rng.uniform(0.1, 40), 4),
+            round(rng.uniform(0.1, 40), 4),
+        ))
+    return rows
+
+
+def convert_rows(rows):
+    """每列使用各自的匯率 (每列視為一種貨幣)"""
+    return BatchConversion.convert(
+        list(range(len(rows))),
+        [amount for _, amount, _, _, _ in rows],
+        [buying for _, _, buying, _, _ in rows],
+        [sell for _, _, _, sell, _ in rows],
+        [buy for _, _, _, _, buy in rows],
+        [RULES[code]["max_amount"] for code, _, _, _, _ in rows],
+    )
+
+
+@pytest.fixture
+def pure_python(monkeypatch):
+    monkeypatch.setattr(BatchConversion, "np", None)
+
+
+def test_numpy_and_pure_python_match_calculate_exchange(monkeypatch):
+    pytest.importorskip("numpy")
+    rows = random_rows(20000)
+    # 已知 np.round 與 round() 結果不同的例子
+    rows += [("USD", 810, False, 31.9, 31.9825), ("USD", 78447.72, False, 30.0, 14.875),
+             ("USD", 39719.8, False, 30.0, 1.075)]
+
+    vectorized = convert_rows(rows)
+    monkeypatch.setattr(BatchConversion, "np", None)
+    plain = convert_rows(rows)
+    assert vectorized == plain
+
+    agent = make_agent()
+    for i, (code, amount, buying, sell, buy) in enumerate(rows):
+        rate_type = "cash_sell" if buying else "cash_buy"
+        rate_info = {"success": True, "selected_rate": sell if buying else buy, "rate_type": rate_type,
+                     "date": "2024-01-02"}
+        expected = agent._calculate_response(code, amount, buying, rate_info)
+        assert vectorized["foreign_amounts"][i] == expected["foreign_amount"], rows[i]
+        assert vectorized["over_limit"][i] == (expected["warning"] is not None), rows[i]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_zero_and_missing_rates_are_nan(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(BatchConversion, "np", None)
+
+    result = BatchConversion.convert([0, 0, 1, 1], [100, 100, 100, 100], [True, False, True, False],
+                                     [0.0, math.nan], [0.0, math.nan], [math.inf, math.inf])
+    assert all(math.isnan(value) for value in result["foreign_amounts"])
+    assert result["over_limit"] == [False] * 4
+    assert BatchConversion.nan_to_none(result["foreign_amounts"]) == [None] * 4
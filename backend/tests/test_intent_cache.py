@@ -0,0 +1,85 @@
+import json
+import time
+
+import pytest
+
+from agent.intent_cache import IntentCache
+from agent.query_parser import QueryParser
+from tool.Currency import SUPPORTED_CURRENCIES
+
+
+@pytest.fixture
+def parser():
+    return QueryParser(SUPPORTED_CURRENCIES)
+
+
+def test_advice_free_text_not_reused_for_other_currency(parser):
+    cache = IntentCache(parser, persist=False)
+    assert cache.put("美金現在適合買嗎", {"action": "advice", "currency": "USD", "context": "美金是否適合買入"})
+
+    assert cache.get("日圓現在適合買嗎") == {"action": "advice", "currency": "JPY"}
+
+
+def test_clarify_not_cached(parser):
+    cache = IntentCache(parser, persist=False)
+
+    assert not cache.put("美金那個怎樣", {"action": "clarify", "message": "請問您想查詢美金的匯率還是換匯？"})
+    assert cache.get("日圓那個怎樣") is None
+
+
+def test_amount_and_currency_slots(parser):
+    cache = IntentCache(parser, persist=False)
+    assert cache.put("10000台幣換日圓", {"action": "calculate", "currency": "JPY", "amount": 10000})
+
+    assert cache.get("20000台幣換美金") == {"action": "calculate", "currency": "USD", "amount": 20000}
+
+
+def test_save_is_debounced_off_the_request_thread(parser, tmp_path):
+    path = tmp_path / "intent_cache.json"
+    cache = IntentCache(parser, path=str(path), version="v1", save_delay=60)
+
+    cache.put("美金匯率多少", {"action": "get_rate", "currency": "USD"})
+    cache.put("10000台幣換日圓", {"action": "calculate", "currency": "JPY", "amount": 10000})
+    # 等待計時器期間不寫入檔案
+    assert not path.exists()
+
+    cache.flush()
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved["version"] == "v1"
+    assert len(saved["entries"]) == 2
+
+    reloaded = IntentCache(parser, path=str(path), version="v1")
+    assert reloaded.get("日圓匯率多少") == {"action": "get_rate", "currency": "JPY"}
+
+
+def test_timer_writes_file(parser, tmp_path):
+    path = tmp_path / "intent_cache.json"
+    cache = IntentCache(parser, path=str(path), save_delay=0.01)
+    cache.put("美金匯率多少", {"action": "get_rate", "currency": "USD"})
+
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert json.loads(path.read_text(encoding="utf-8"))["entries"]
+
+
+def test_load_drops_legacy_free_text(parser, tmp_path):
+    path = tmp_path / "intent_cache.json"
+    template = parser.normalize("美金現在適合買嗎")[0]
+    clarify_template = parser.normalize("美金那個怎樣")[0]
+    path.write_text(json.dumps({"version": "", "entries": {
+        template: {"action": "advice", "currency": "$currency", "context": "美金是否適合買入"},
+        clarify_template: {"action": "clarify", "message": "美金？"},
+    }}, ensure_ascii=False), encoding="utf-8")
+
+    cache = IntentCache(parser, path=str(path))
+    assert cache.get("歐元現在適合買嗎") == {"action": "advice", "currency": "EUR"}
+    assert cache.get("歐元那個怎樣") is None
+
+
+@pytest.mark.parametrize("content", ["[1, 2]", '"text"', "null", '{"version": "", "entries": []}', "{broken"])
+def test_invalid_file_is_empty_cache(parser, tmp_path, content):
+    path = tmp_path / "intent_cache.json"
+    path.write_text(content, encoding="utf-8")
+
+    assert IntentCache(parser, path=str(path)).stats()["size"] == 0
@@ -0,0 +1,27 @@
+import sys
+
+from ipc_server import IPCServer, BATCH_EXCLUDED_ACTIONS
+
+
+def test_batch_rejects_control_actions():
+    server = IPCServer()
+    stdout, protocol = sys.stdout, server.protocol
+    sub_requests = [{"id": i, "action": action, "protocol": 2} for i, action in enumerate(BATCH_EXCLUDED_ACTIONS)]
+
+    response = server.handle_request({"action": "batch", "requests": sub_requests})
+
+    assert response["success"]
+    assert [result["id"] for result in response["results"]] == list(range(len(BATCH_EXCLUDED_ACTIONS)))
+    assert all(not result["success"] for result in response["results"])
+    # 協定、stdout 與效能分析狀態都沒有改變
+    assert server.protocol == protocol
+    assert sys.stdout is stdout
+    assert server.profiler is None
+
+
+def test_batch_runs_allowed_actions():
+    server = IPCServer()
+    response = server.handle_request({"action": "batch", "requests": [{"action": "unknown_action"}, "bad"]})
+
+    assert response["results"][0] == {"success": False, "error": "Unknown action: unknown_action"}
+    assert response["results"][1] == {"success": False, "error": "Invalid sub-request"}
@@ -0,0 +1,113 @@
+import pytest
+
+from agent.agent import AI_Agent
+from agent.query_parser import QueryParser
+from bench.fake_gemini import FakeGemini
+from bench.run_bench import CHAT_QUERIES
+from tool.Currency import SUPPORTED_CURRENCIES
+from tool.RateSeries import RateSeries
+
+
+# bench/run_bench.py 的每個聊天查詢：(貨幣, 金額, 可信度, 有 Gemini client 時的路徑, 回應類型)
+EXPECTED = {
+    "美金匯率多少？": ("USD", None, 0.95, "rules", "rate_info"),
+    "10000台幣換日圓": ("JPY", 10000.0, 0.95, "rules", "calculation"),
+    "日幣限額多少": ("JPY", None, 0.7, "llm", "rules"),
+    "美金最近趨勢如何？適合現在換嗎": ("USD", None, 0.0, "llm", "advice"),
+    "我下個月要去東京玩，預算三萬塊": (None, None, 0.1, "llm", "clarify"),
+    "歐元匯率": ("EUR", None, 0.95, "rules", "rate_info"),
+    "50000台幣可以換多少港幣": ("HKD", 50000.0, 0.95, "rules", "calculation"),
+    "英鎊會漲嗎": ("GBP", None, 0.0, "llm", "advice"),
+}
+
+
+def test_expected_table_covers_bench_queries():
+    assert sorted(EXPECTED) == sorted(CHAT_QUERIES)
+
+
+@pytest.mark.parametrize("query", CHAT_QUERIES)
+def test_parser_confidence(query):
+    currency, amount, confidence, _, _ = EXPECTED[query]
+    parsed = QueryParser(SUPPORTED_CURRENCIES).parse(query)
+
+    assert parsed.currency == currency
+    assert parsed.amount == amount
+    assert parsed.confidence == pytest.approx(confidence)
+
+
+def fake_rate(currency, rate_type="cash_sell"):
+    rate = {"date": "2024-01-10", "cash_buy": 30.0, "cash_sell": 31.0, "spot_buy": 30.5, "spot_sell": 30.6}
+    return AI_Agent._rate_response(currency, rate, rate_type)
+
+
+def fake_stats(currency):
+    return {"success": True, "cash_sell": 31.0, "windows": {"3": {"mean": 30.8}, "7": {"mean": 30.5}}}
+
+
+def fake_history(currency):
+    rows = [{"date": f"2024-01-{day:02d}", "cash_buy": 30.0, "cash_sell": 31.0,
+             "spot_buy": 30.5, "spot_sell": 30.6} for day in range(1, 8)]
+    return RateSeries.from_rows(rows, currency)
+
+
+@pytest.fixture
+def agent(tmp_path):
+    # 以替身取代 FinMind 查詢，測試不需要網路
+    agent = AI_Agent(intent_cache_path=str(tmp_path / "intent_cache.json"), route_threshold=0.8)
+    agent.get_exchange_rate = fake_rate
+    agent.get_rate_stats = fake_stats
+    agent._advice_history = fake_history
+    return agent
+
+
+def routes(agent):
+    return {route: count for route, count in agent.get_routing_stats()["routes"].items() if count}
+
+
+@pytest.mark.parametrize("query", CHAT_QUERIES)
+def test_route_with_gemini_client(agent, query):
+    _, _, _, route, response_type = EXPECTED[query]
+    fake = FakeGemini(latency=0)
+    agent.client = fake
+
+    result = agent.process_query(query)
+
+    assert routes(agent) == {route: 1}
+    assert fake.calls == (1 if route == "llm" else 0)
+    assert result["success"]
+    assert result.get("type") == response_type
+
+
+@pytest.mark.parametrize("query", CHAT_QUERIES)
+def test_route_without_client_is_offline(agent, query):
+    agent.client = None
+
+    agent.process_query(query)
+
+    assert routes(agent) == {"offline": 1}
+
+
+@pytest.mark.parametrize("query", [query for query in CHAT_QUERIES if EXPECTED[query][3] == "llm"])
+def test_repeated_llm_query_hits_intent_cache(agent, query):
+    fake = FakeGemini(latency=0)
+    agent.client = fake
+
+    first = agent.process_query(query)
+    second = agent.process_query(query)
+
+    # 意圖快取不保存 clarify (只保存 action 與貨幣、金額欄位)，這類查詢每次都要呼叫 Gemini
+    cacheable = EXPECTED[query][4] != "clarify"
+    assert routes(agent) == ({"llm": 1, "intent_cache": 1} if cacheable else {"llm": 2})
+    assert fake.calls == (1 if cacheable else 2)
+    assert second == first
+
+
+def test_threshold_sends_confident_queries_to_gemini(agent):
+    agent.route_threshold = 1.0
+    agent.client = FakeGemini(latency=0)
+
+    for query in CHAT_QUERIES:
+        agent.process_query(query)
+
+    assert routes(agent)["llm"] + routes(agent).get("intent_cache", 0) == len(CHAT_QUERIES)
+    assert "rules" not in routes(agent)
@@ -0,0 +1,115 @@
+import math
+import random
+import statistics
+from datetime import date, timedelta
+
+import pytest
+
+from tool.RateAnalytics import RateAnalytics, RollingWindow
+from tool.RateSeries import RateSeries
+
+
+def reference(values):
+    """直接由視窗內的值計算 (忽略 NaN)"""
+    valid = [value for value in values if not math.isnan(value)]
+    return {
+        "count": len(valid),
+        "mean": statistics.fmean(valid) if valid else None,
+        "min": min(valid) if valid else None,
+        "max": max(valid) if valid else None,
+        "std": statistics.stdev(valid) if len(valid) >= 2 else None,
+    }
+
+
+def assert_close(actual, expected):
+    if expected is None:
+        assert actual is None or math.isnan(actual)
+    else:
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 30])
+def test_rolling_window_matches_recomputation(size):
+    rng = random.Random(size)
+    window = RollingWindow(size)
+    pushed = []
+    for _ in range(2000):
+        value = math.nan if rng.random() < 0.1 else rng.choice([rng.uniform(0.1, 50), round(rng.uniform(30, 33), 2)])
+        window.push(value)
+        pushed.append(value)
+
+        expected = reference(pushed[-size:])
+        assert window.count == expected["count"]
+        assert_close(window.mean, expected["mean"])
+        assert_close(window.min, expected["min"])
+        assert_close(window.max, expected["max"])
+        assert_close(window.std, expected["std"])
+
+
+def expected_stats(rows, windows):
+    """以最終的每日資料重新計算 RateAnalytics.stats() 的視窗統計"""
+    sells = [row["cash_sell"] for row in rows]
+    spreads = [row["cash_sell"] - row["cash_buy"] for row in rows]
+    changes = [math.nan] + [
+        (sells[i] / sells[i - 1] - 1) * 100 if sells[i - 1] and not math.isnan(sells[i - 1]) else math.nan
+        for i in range(1, len(sells))
+    ]
+    result = {}
+    for size in windows:
+        rates = reference(sells[-size:])
+        result[str(size)] = {
+            "days": rates["count"],
+            "mean": rates["mean"],
+            "min": rates["min"],
+            "max": rates["max"],
+            "volatility": reference(changes[-size:])["std"],
+            "spread_mean": reference(spreads[-size:])["mean"],
+        }
+    return result
+
+
+def random_row(rng, day: date) -> dict:
+    sell = round(rng.uniform(30, 33), 4)
+    return {"date": day.isoformat(), "currency": "USD", "cash_buy": round(sell - rng.uniform(0.1, 0.5), 4),
+            "cash_sell": math.nan if rng.random() < 0.05 else sell, "spot_buy": sell - 0.1, "spot_sell": sell + 0.1}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_analytics_with_revisions_matches_recomputation(seed):
+    rng = random.Random(seed)
+    windows = (3, 7)
+    analytics = RateAnalytics(windows=windows, max_rows=20)
+    truth = []
+    day = date(2024, 1, 1)
+
+    for _ in range(300):
+        if truth and rng.random() < 0.4:
+            # 當日匯率修正 (有時與原值相同)
+            revised = dict(truth[-1]) if rng.random() < 0.2 else random_row(rng, day)
+            truth[-1] = revised
+            # 查詢結果通常包含前幾天已保存的資料
+            analytics.update(RateSeries.from_rows(truth[-3:], "USD"))
+        else:
+            day += timedelta(days=rng.choice([1, 1, 1, 3]))
+            truth.append(random_row(rng, day))
+            analytics.update(RateSeries.from_rows(truth[-rng.randint(1, 3):], "USD"))
+
+        stats = analytics.stats("USD")
+        assert stats["date"] == truth[-1]["date"]
+        expected = expected_stats(truth, windows)
+        for size, values in expected.items():
+            actual = stats["windows"][size]
+            assert actual["days"] == values["days"]
+            for key in ("mean", "min", "max", "volatility", "spread_mean"):
+                assert_close(actual[key], values[key])
+
+
+def test_unchanged_revision_is_not_counted():
+    analytics = RateAnalytics()
+    rows = [{"date": "2024-01-02", "currency": "USD", "cash_buy": 31.0, "cash_sell": 31.5,
+             "spot_buy": 31.2, "spot_sell": 31.3}]
+
+    assert analytics.update(RateSeries.from_rows(rows, "USD")) == 1
+    assert analytics.update(RateSeries.from_rows(rows, "USD")) == 0
+    assert analytics.update(RateSeries.from_rows([{**rows[0], "cash_sell": 31.6}], "USD")) == 1
+    assert analytics.stats("USD")["cash_sell"] == 31.6
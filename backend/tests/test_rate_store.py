@@ -0,0 +1,100 @@
+from datetime import date, datetime
+
+import pytest
+
+from tool.ExchangeRate import TaiwanExchangeRate
+from tool.RateStore import RateStore
+
+TODAY = date(2024, 1, 15)
+
+
+def row(day: str, currency: str = "USD", rate: float = 31.0) -> dict:
+    return {"date": day, "currency": currency, "cash_buy": rate - 0.3, "cash_sell": rate,
+            "spot_buy": rate - 0.1, "spot_sell": rate + 0.1}
+
+
+@pytest.fixture
+def store():
+    store = RateStore(":memory:", settle_days=3)
+    yield store
+    store.close()
+
+
+def test_empty_store_misses_whole_range(store):
+    assert store.missing_range("USD", "2024-01-01", "2024-01-05") == ("2024-01-01", "2024-01-05")
+    assert store.missing_range("USD", "2024-01-05", "2024-01-01") is None
+
+
+def test_partial_coverage_returns_outer_gap(store):
+    store.put_rows("USD", [row("2024-01-03"), row("2024-01-04")], "2024-01-03", "2024-01-04", today=TODAY)
+
+    assert store.missing_range("USD", "2024-01-03", "2024-01-04") is None
+    # 只回傳包含所有缺少日期的最小連續區間
+    assert store.missing_range("USD", "2024-01-01", "2024-01-06") == ("2024-01-01", "2024-01-06")
+    assert store.missing_range("USD", "2024-01-03", "2024-01-06") == ("2024-01-05", "2024-01-06")
+    # 其他貨幣不受影響
+    assert store.missing_range("JPY", "2024-01-03", "2024-01-04") == ("2024-01-03", "2024-01-04")
+
+
+def test_empty_days_settle_after_settle_days(store):
+    # 1/12 (settle 邊界) 與之前的空白日期視為假日；1/13、1/14 沒有資料但可能延遲公告
+    store.put_rows("USD", [row("2024-01-10")], "2024-01-08", "2024-01-14", today=TODAY)
+
+    assert store.missing_range("USD", "2024-01-08", "2024-01-12") is None
+    assert store.missing_range("USD", "2024-01-08", "2024-01-14") == ("2024-01-13", "2024-01-14")
+
+    # 之後再查詢時，同樣的空白日期已超過 settle_days
+    store.put_rows("USD", [], "2024-01-13", "2024-01-14", today=date(2024, 1, 20))
+    assert store.missing_range("USD", "2024-01-08", "2024-01-14") is None
+
+
+def test_today_is_never_covered(store):
+    store.put_rows("USD", [row("2024-01-14"), row("2024-01-15")], "2024-01-14", "2024-01-15", today=TODAY)
+
+    assert store.missing_range("USD", "2024-01-14", "2024-01-15") == ("2024-01-15", "2024-01-15")
+    # 當日資料仍會保存，重新查詢時以新值取代
+    store.put_rows("USD", [row("2024-01-15", rate=32.0)], "2024-01-15", "2024-01-15", today=TODAY)
+    assert store.get_series("USD", "2024-01-15", "2024-01-15").cash_sell[-1] == 32.0
+
+
+class FixedClockExchanger(TaiwanExchangeRate):
+    """固定時鐘並記錄 API 請求的 TaiwanExchangeRate"""
+
+    def __init__(self, store, responses):
+        super().__init__(store=store)
+        self.responses = responses
+        self.requests = []
+
+    def get_now(self) -> datetime:
+        return datetime(TODAY.year, TODAY.month, TODAY.day, 10, 0)
+
+    def _request_rows(self, currency, start_date, end_date):
+        self.requests.append((currency, start_date, end_date))
+        return [r for r in self.responses if start_date <= r["date"] <= end_date
+                and (currency is None or r["currency"] == currency)]
+
+
+def test_fetch_all_series_requests_union_of_gaps(store):
+    store.put_rows("USD", [row("2024-01-02")], "2024-01-01", "2024-01-05", today=TODAY)
+    store.put_rows("JPY", [row("2024-01-08", "JPY", 0.21)], "2024-01-06", "2024-01-10", today=TODAY)
+    responses = [row("2024-01-09"), row("2024-01-03", "JPY", 0.22), row("2024-01-09", "JPY", 0.21)]
+    exchanger = FixedClockExchanger(store, responses)
+
+    result = exchanger.fetch_all_series("2024-01-01", "2024-01-10", ["USD", "JPY"])
+
+    # USD 缺 1/6~1/10，JPY 缺 1/1~1/5，合併為一次請求
+    assert exchanger.requests == [(None, "2024-01-01", "2024-01-10")]
+    assert result["USD"].dates == ["2024-01-02", "2024-01-09"]
+    assert result["JPY"].dates == ["2024-01-03", "2024-01-08", "2024-01-09"]
+
+    exchanger.fetch_all_series("2024-01-01", "2024-01-10", ["USD", "JPY"])
+    assert len(exchanger.requests) == 1
+
+
+def test_exchanger_settles_with_its_own_clock(store):
+    exchanger = FixedClockExchanger(store, [row("2024-01-10")])
+
+    exchanger.fetch_series("USD", "2024-01-08", "2024-01-15")
+
+    # 依 get_now() (2024-01-15) 判斷，而不是系統日期
+    assert store.missing_range("USD", "2024-01-08", "2024-01-15") == ("2024-01-13", "2024-01-15")
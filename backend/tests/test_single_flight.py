@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from tool.SingleFlight import SingleFlight
+from tool.ExchangeRate import TaiwanExchangeRate
+
+
+class LeaderAbort(BaseException):
+    """不是 Exception 的例外 (類似 KeyboardInterrupt / SystemExit)"""
+
+
+def wait_until(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def run_sync_flight(error: BaseException, waiters: int = 4):
+    """leader 在所有等待者加入後拋出 error，回傳每個呼叫端收到的結果或例外"""
+    flight = SingleFlight()
+    release = threading.Event()
+    outcomes = []
+    lock = threading.Lock()
+
+    def fn():
+        release.wait(5)
+        raise error
+
+    def call():
+        try:
+            outcome = flight.do("key", fn)
+        except BaseException as e:
+            outcome = e
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=call) for _ in range(waiters + 1)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flight.shared == waiters)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive(), "caller hung"
+    return flight, outcomes
+
+
+def test_sync_shares_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "rates"
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", fn))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flight.shared == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["rates"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"executed": 1, "shared": 4, "in_flight": 0}
+
+
+@pytest.mark.parametrize("error", [ValueError("upstream failed"), LeaderAbort()])
+def test_sync_leader_failure_reaches_all_waiters(error):
+    flight, outcomes = run_sync_flight(error)
+
+    assert len(outcomes) == 5
+    assert all(outcome is error for outcome in outcomes)
+    assert flight.stats()["in_flight"] == 0
+    # 失敗後不保留結果，下一次呼叫重新執行
+    assert flight.do("key", lambda: "retry") == "retry"
+
+
+async def run_async_flight(fn, waiters: int = 3):
+    flight = SingleFlight()
+    leader = asyncio.ensure_future(flight.do_async("key", fn))
+    await asyncio.sleep(0)
+    others = [asyncio.ensure_future(flight.do_async("key", fn)) for _ in range(waiters)]
+    await asyncio.sleep(0)
+    return flight, leader, others
+
+
+def test_async_shares_result():
+    async def main():
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "rates"
+
+        flight, leader, others = await run_async_flight(fn)
+        results = await asyncio.wait_for(asyncio.gather(leader, *others), 5)
+        assert results == ["rates"] * 4
+        assert len(calls) == 1
+        assert flight.stats() == {"executed": 1, "shared": 3, "in_flight": 0}
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("error_type", [ValueError, LeaderAbort])
+def test_async_leader_failure_reaches_all_waiters(error_type):
+    async def main():
+        async def fn():
+            await asyncio.sleep(0.01)
+            raise error_type("boom")
+
+        flight, leader, others = await run_async_flight(fn)
+        outcomes = await asyncio.wait_for(asyncio.gather(*others, return_exceptions=True), 5)
+        assert all(isinstance(outcome, error_type) for outcome in outcomes)
+        with pytest.raises(error_type):
+            await leader
+        assert flight.stats()["in_flight"] == 0
+
+    # BaseException 會由 asyncio.run 直接拋出，在 main 內處理完畢即可
+    asyncio.run(main())
+
+
+def test_async_leader_cancelled_releases_waiters():
+    async def main():
+        started = asyncio.Event()
+
+        async def fn():
+            started.set()
+            await asyncio.sleep(10)
+
+        flight, leader, others = await run_async_flight(fn)
+        await started.wait()
+        leader.cancel()
+
+        outcomes = await asyncio.wait_for(asyncio.gather(*others, return_exceptions=True), 5)
+        assert all(isinstance(outcome, asyncio.CancelledError) for outcome in outcomes)
+        assert flight.stats()["in_flight"] == 0
+
+        async def again():
+            return "retry"
+
+        assert await flight.do_async("key", again) == "retry"
+
+    asyncio.run(main())
+
+
+def test_async_waiter_cancel_does_not_cancel_leader():
+    async def main():
+        async def fn():
+            await asyncio.sleep(0.02)
+            return "rates"
+
+        flight, leader, others = await run_async_flight(fn, waiters=1)
+        others[0].cancel()
+        assert await asyncio.wait_for(leader, 5) == "rates"
+
+    asyncio.run(main())
+
+
+def test_aclose_keeps_shared_inflight_map():
+    pytest.importorskip("httpx")
+
+    async def main():
+        exchanger = TaiwanExchangeRate(use_store=False)
+        inflight = exchanger.inflight
+        exchanger.inflight.do("key", lambda: None)
+        from tool.HttpSession import AsyncRetrySession
+        exchanger._async_session = AsyncRetrySession()
+
+        await exchanger.aclose()
+
+        assert exchanger.inflight is inflight
+        assert exchanger.inflight.stats()["executed"] == 1
+
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+import math
+from typing import List, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def convert(indexes: Sequence[int], amounts: Sequence[float], is_buying: Sequence[bool],
+            sell_rates: Sequence[float], buy_rates: Sequence[float], max_amounts: Sequence[float]) -> dict:
+    """
+    批次計算換匯金額 (與 AI_Agent.calculate_exchange 的計算方式相同)
+
+    每一列以 indexes 對應到貨幣 (sell_rates/buy_rates/max_amounts 的位置)，
+    買入外幣以現金賣出價計算 amount / rate，賣出外幣以現金買入價計算 amount * rate。
+    有安裝 numpy 時以向量運算一次計算所有列，否則逐列計算。
+
+    Args:
+        indexes: 每一列的貨幣位置
+        amounts: 每一列的台幣金額
+        is_buying: 每一列是否為買入外幣
+        sell_rates: 各貨幣的現金賣出價 (無法取得時為 NaN)
+        buy_rates: 各貨幣的現金買入價 (無法取得時為 NaN)
+        max_amounts: 各貨幣的單日限額 (沒有限制時為 inf)
+
+    Returns:
+        dict: rates (每列使用的匯率)、foreign_amounts (四捨五入到小數第 2 位)、
+              over_limit (是否超過限額)，無法計算的列為 NaN
+    """
+    if np is not None:
+        return _convert_numpy(indexes, amounts, is_buying, sell_rates, buy_rates, max_amounts)
+
+    rates, foreign_amounts, over_limit = [], [], []
+    for index, amount, buying in zip(indexes, amounts, is_buying):
+        rate = sell_rates[index] if buying else buy_rates[index]
+        if not rate or math.isnan(rate):
+            foreign = math.nan
+        else:
+            foreign = amount / rate if buying else amount * rate
+        rates.append(rate)
+        foreign_amounts.append(round(foreign, 2))
+        over_limit.append(bool(buying and foreign > max_amounts[index]))
+    return {"rates": rates, "foreign_amounts": foreign_amounts, "over_limit": over_limit}
+
+
+def _convert_numpy(indexes, amounts, is_buying, sell_rates, buy_rates, max_amounts) -> dict:
+    indexes = np.asarray(indexes, dtype=np.intp)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    is_buying = np.asarray(is_buying, dtype=bool)
+
+    rates = np.where(is_buying, np.asarray(sell_rates, dtype=np.float64)[indexes],
+                     np.asarray(buy_rates, dtype=np.float64)[indexes])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        foreign = np.where(is_buying, amounts / rates, amounts * rates)
+    # 與逐列計算相同，匯率為 0 或無法取得時為 NaN
+    foreign[~np.isfinite(foreign) | (rates == 0)] = np.nan
+    over_limit = is_buying & (foreign > np.asarray(max_amounts, dtype=np.float64)[indexes])
+
+    return {
+        "rates": rates.tolist(),
+        # np.round 與 round() 的捨入方式不同 (先乘 100 再取整，會受浮點誤差影響)，逐一以 round() 處理
+        "foreign_amounts": [round(value, 2) for value in foreign.tolist()],
+        "over_limit": over_limit.tolist()
+    }
+
+
+def nan_to_none(values: List[float]) -> list:
+    """將 NaN 轉為 None (JSON 不支援 NaN)"""
+    return [None if isinstance(value, float) and math.isnan(value) else value for value in values]
@@ -0,0 +1,8 @@
+# 台灣銀行支援的幣別 (獨立成輕量模組，查詢幣別時不必載入 pandas/requests)
+SUPPORTED_CURRENCIES = {
+    'AUD': '澳洲', 'CAD': '加拿大', 'CHF': '瑞士法郎', 'CNY': '人民幣',
+    'EUR': '歐元', 'GBP': '英鎊', 'HKD': '港幣', 'IDR': '印尼幣',
+    'JPY': '日圓', 'KRW': '韓元', 'MYR': '馬來幣', 'NZD': '紐元',
+    'PHP': '菲國比索', 'SEK': '瑞典幣', 'SGD': '新加坡幣', 'THB': '泰幣',
+    'USD': '美金', 'VND': '越南盾', 'ZAR': '南非幣'
+}
@@ -1,11 +1,24 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 import requests
-import pandas as pd
 from dotenv import load_dotenv
 import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tool.Currency import SUPPORTED_CURRENCIES
+from tool.RateStore import RateStore
+from tool.RateSeries import RateSeries
+from tool.Parallel import map_with_deadline, TIMED_OUT
+from tool.SingleFlight import SingleFlight
+from tool.Metrics import METRICS
+from tool.Tracing import TRACER, KIND_CLIENT
+from tool.HttpSession import RetrySession, AsyncRetrySession, RetryPolicy, CircuitBreaker, CircuitOpenError
 load_dotenv()
 
+if TYPE_CHECKING:
+    # pandas 只在需要 DataFrame 時才載入 (RateSeries.to_pandas)
+    import pandas as pd
+
 
 class TaiwanExchangeRate:
     """
@@ -22,33 +35,54 @@ class TaiwanExchangeRate:
     USD: 美金    VND: 越南盾    ZAR: 南非幣
     """
 
-    SUPPORTED_CURRENCIES = {
-        'AUD': '澳洲', 'CAD': '加拿大', 'CHF': '瑞士法郎', 'CNY': '人民幣',
-        'EUR': '歐元', 'GBP': '英鎊', 'HKD': '港幣', 'IDR': '印尼幣',
-        'JPY': '日圓', 'KRW': '韓元', 'MYR': '馬來幣', 'NZD': '紐元',
-        'PHP': '菲國比索', 'SEK': '瑞典幣', 'SGD': '新加坡幣', 'THB': '泰幣',
-        'USD': '美金', 'VND': '越南盾', 'ZAR': '南非幣'
-    }
+    SUPPORTED_CURRENCIES = SUPPORTED_CURRENCIES
 
-    def __init__(self, token: Optional[str] = None):
+    def __init__(self, token: Optional[str] = None, store: Optional[RateStore] = None, use_store: bool = True,
+                 retry: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None, timeout: float = 10):
         """
         初始化匯率查詢工具
 
         Args:
             token: FinMind API token (可選)，若無 token 則從環境變數 API_KEY 讀取
                    註冊 token: https://finmindtrade.com/analysis/#/membership/register
+            store: 本機匯率資料庫 (可選)，預設使用 RateStore() 的檔案位置
+            use_store: 是否啟用本機資料庫，False 則每次都向 API 查詢
+            retry: 429/5xx 的重試策略 (可選)，預設為 RetryPolicy()
+            breaker: 上游持續失敗時快速失敗的斷路器 (可選)，預設為 CircuitBreaker()
+            timeout: 單次請求的逾時秒數
         """
-        self.url = "https://api.finmindtrade.com/api/v4/data"
+        # 可用環境變數 FINMIND_API_URL 指向其他位置 (例如 bench/fake_finmind.py 的本機替身)
+        self.url = os.environ.get("FINMIND_API_URL", "https://api.finmindtrade.com/api/v4/data")
         self.dataset = "TaiwanExchangeRate"
         self.token = token or os.environ.get("FINMINDTRADE_API_KEY")
+        self.timeout = timeout
+
+        # 共用連線池 (keep-alive)，並處理重試與斷路
+        self.session = RetrySession(retry=retry, breaker=breaker)
+        # async 版本的連線池 (httpx)，第一次呼叫 *_async 方法時才建立，與同步版共用斷路器
+        self._async_session = None
+
+        # 同時查詢相同 (貨幣, 日期區間) 時只發出一次請求，共用結果或錯誤
+        self.inflight = SingleFlight()
+
+        self.store = store
+        if self.store is None and use_store:
+            try:
+                self.store = RateStore()
+            except Exception as e:
+                # 無法建立資料庫時 (例如唯讀目錄) 退回直接查詢 API
+                print(f"Warning: 無法開啟匯率資料庫: {e}")
+                self.store = None
 
     def get_now(self) -> datetime:
         """取得目前時間"""
         return datetime.now()
 
-    def fetch_data(self, currency: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+    def fetch_data(self, currency: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> "pd.DataFrame":
         """
-        查詢台灣銀行匯率資料
+        查詢台灣銀行匯率資料 (DataFrame 格式，需安裝 pandas)
+
+        資料由 fetch_series 取得後再轉為 DataFrame。
 
         Args:
             currency: 貨幣代碼 (如: USD, EUR, JPY, CNY, GBP, AUD, HKD, SGD, CHF, ZAR, SEK, NZD, THB, PHP, IDR, KRW, MYR, VND, CAD)
@@ -69,50 +103,255 @@ class TaiwanExchangeRate:
             >>> df = exchanger.fetch_data("USD", "2024-01-01", "2024-01-07")
             >>> print(df.head())
         """
+        return self.fetch_series(currency, start_date, end_date).to_pandas()
+
+    def fetch_series(self, currency: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> RateSeries:
+        """
+        查詢台灣銀行匯率資料 (RateSeries 格式，不需要 pandas)
+
+        啟用本機資料庫時，已確認的日期直接由資料庫回應，只有缺少的日期區間才會向 API 查詢。
+        多個執行緒同時查詢相同的貨幣與日期區間時只會查詢一次，共用同一個結果。
+
+        Args:
+            currency: 貨幣代碼
+            start_date: 開始日期 (格式: YYYY-MM-DD)，預設為今天
+            end_date: 結束日期 (格式: YYYY-MM-DD)，預設為今天
+
+        Returns:
+            RateSeries: 依日期排序的匯率序列
+        """
+        start_date, end_date = self._default_range(start_date, end_date)
+        currency = currency.upper()
+        attributes = {"currency": currency, "start_date": start_date, "end_date": end_date}
+        with TRACER.span("exchange_rate.fetch_series", attributes=attributes):
+            return self.inflight.do(
+                (currency, start_date, end_date),
+                lambda: self._load_series(currency, start_date, end_date)
+            )
+
+    def _load_series(self, currency: str, start_date: str, end_date: str) -> RateSeries:
+        """實際查詢資料庫與 API (見 fetch_series)"""
+        if self.store is None:
+            series = RateSeries.from_rows(self._request_rows(currency, start_date, end_date) or [], currency)
+        else:
+            # 只向 API 補抓資料庫中尚未確認的日期
+            gap = self.store.missing_range(currency, start_date, end_date)
+            if gap:
+                fetched = self._request_rows(currency, gap[0], gap[1])
+                if fetched is not None:
+                    self.store.put_rows(currency, fetched, gap[0], gap[1], today=self.get_now().date())
+            series = self.store.get_series(currency, start_date, end_date)
+
+        if series.empty:
+            print(f"查無 {currency} 的匯率資料")
+
+        return series
+
+    async def fetch_series_async(self, currency: str, start_date: Optional[str] = None,
+                                 end_date: Optional[str] = None) -> RateSeries:
+        """
+        fetch_series 的 async 版本 (以 httpx 查詢 API，需安裝 httpx)
+
+        本機資料庫的讀寫仍為同步呼叫 (SQLite 本機查詢，耗時遠小於網路請求)。
+        """
+        start_date, end_date = self._default_range(start_date, end_date)
+        currency = currency.upper()
+        return await self.inflight.do_async(
+            (currency, start_date, end_date),
+            lambda: self._load_series_async(currency, start_date, end_date)
+        )
+
+    async def _load_series_async(self, currency: str, start_date: str, end_date: str) -> RateSeries:
+        """實際查詢資料庫與 API (見 fetch_series_async)"""
+        if self.store is None:
+            series = RateSeries.from_rows(await self._request_rows_async(currency, start_date, end_date) or [], currency)
+        else:
+            gap = self.store.missing_range(currency, start_date, end_date)
+            if gap:
+                fetched = await self._request_rows_async(currency, gap[0], gap[1])
+                if fetched is not None:
+                    self.store.put_rows(currency, fetched, gap[0], gap[1], today=self.get_now().date())
+            series = self.store.get_series(currency, start_date, end_date)
+
+        if series.empty:
+            print(f"查無 {currency} 的匯率資料")
+
+        return series
+
+    def _default_range(self, start_date: Optional[str], end_date: Optional[str]) -> tuple:
+        """未指定的日期預設為今天"""
+        today = self.get_now().strftime("%Y-%m-%d")
+        return start_date or today, end_date or today
+
+    def _recent_range(self, days: int) -> tuple:
+        """取得最近 days 天的 (開始日期, 結束日期)"""
+        end_date = self.get_now()
+        start_date = end_date - timedelta(days=days)
+        return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+
+    def fetch_all_currencies(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                             currencies: Optional[list] = None) -> dict:
+        """
+        以單一請求查詢所有貨幣的匯率資料 (DataFrame 格式，需安裝 pandas)
+
+        Args:
+            start_date: 開始日期 (格式: YYYY-MM-DD)，預設為今天
+            end_date: 結束日期 (格式: YYYY-MM-DD)，預設為今天
+            currencies: 要保留的貨幣代碼列表，預設為 SUPPORTED_CURRENCIES
+
+        Returns:
+            dict: 以貨幣代碼為 key，DataFrame 為 value 的字典 (依 currencies 順序，無資料的貨幣不列入)
+
+        Example:
+            >>> exchanger = TaiwanExchangeRate()
+            >>> rates = exchanger.fetch_all_currencies("2024-01-01", "2024-01-07")
+            >>> print(rates["JPY"].head())
+        """
+        series = self.fetch_all_series(start_date, end_date, currencies)
+        return {currency: item.to_pandas() for currency, item in series.items()}
+
+    def fetch_all_series(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                         currencies: Optional[list] = None) -> dict:
+        """
+        以單一請求查詢所有貨幣的匯率資料 (不指定 data_id)
+
+        啟用本機資料庫時，會以所有貨幣缺少日期的聯集區間發出一次請求，
+        再依貨幣拆分並寫入各自的資料庫項目。
+
+        Returns:
+            dict: 以貨幣代碼為 key，RateSeries 為 value 的字典 (依 currencies 順序，無資料的貨幣不列入)
+        """
         if not start_date:
             start_date = self.get_now().strftime("%Y-%m-%d")
 
         if not end_date:
             end_date = self.get_now().strftime("%Y-%m-%d")
 
+        currencies = [currency.upper() for currency in (currencies or self.SUPPORTED_CURRENCIES)]
+
+        if self.store is None:
+            groups = RateSeries.split_by_currency(self._request_rows(None, start_date, end_date) or [])
+            return {currency: groups[currency] for currency in currencies if currency in groups}
+
+        gaps = [self.store.missing_range(currency, start_date, end_date) for currency in currencies]
+        gaps = [gap for gap in gaps if gap]
+        if gaps:
+            gap_start = min(gap[0] for gap in gaps)
+            gap_end = max(gap[1] for gap in gaps)
+            fetched = self._request_rows(None, gap_start, gap_end)
+            if fetched is not None:
+                rows_by_currency = {}
+                for row in fetched:
+                    rows_by_currency.setdefault(row.get('currency'), []).append(row)
+                today = self.get_now().date()
+                for currency in currencies:
+                    self.store.put_rows(currency, rows_by_currency.get(currency, []), gap_start, gap_end, today=today)
+
+        result = {}
+        for currency in currencies:
+            series = self.store.get_series(currency, start_date, end_date)
+            if not series.empty:
+                result[currency] = series
+        return result
+
+    def _request_rows(self, currency: Optional[str], start_date: str, end_date: str) -> Optional[list]:
+        """
+        向 FinMind API 查詢原始資料列
+
+        Args:
+            currency: 貨幣代碼，None 表示查詢所有貨幣
+
+        Returns:
+            list: API 回傳的資料列 (查無資料時為空列表)，請求失敗時返回 None
+        """
+        parameter, headers = self._request_args(currency, start_date, end_date)
+
+        attributes = self._span_attributes(currency, start_date, end_date)
+        with TRACER.span("finmind.request", kind=KIND_CLIENT, attributes=attributes) as span:
+            try:
+                with METRICS.track("upstream", "finmind"):
+                    response = self.session.get(self.url, params=parameter, headers=headers, timeout=self.timeout)
+                    span.set_attribute("http.response.status_code", response.status_code)
+                    response.raise_for_status()
+
+                data = response.json()
+                rows = data.get('data') or []
+                span.set_attribute("finmind.rows", len(rows))
+                return rows
+
+            except CircuitOpenError as e:
+                span.record_error(str(e))
+                print(f"請求失敗: {e}")
+                return None
+            except requests.exceptions.RequestException as e:
+                span.record_error(str(e))
+                print(f"請求失敗: {e}")
+                print("提示: 若遇到 400 錯誤，可能需要 FinMind API token")
+                print("註冊網址: https://finmindtrade.com/analysis/#/membership/register")
+                return None
+            except Exception as e:
+                span.record_error(str(e))
+                print(f"處理資料時發生錯誤: {e}")
+                return None
+
+    async def _request_rows_async(self, currency: Optional[str], start_date: str, end_date: str) -> Optional[list]:
+        """_request_rows 的 async 版本"""
+        if self._async_session is None:
+            self._async_session = AsyncRetrySession(retry=self.session.retry, breaker=self.session.breaker)
+        parameter, headers = self._request_args(currency, start_date, end_date)
+
+        attributes = self._span_attributes(currency, start_date, end_date)
+        with TRACER.span("finmind.request", kind=KIND_CLIENT, attributes=attributes) as span:
+            try:
+                with METRICS.track("upstream", "finmind"):
+                    response = await self._async_session.get(self.url, params=parameter, headers=headers, timeout=self.timeout)
+                    span.set_attribute("http.response.status_code", response.status_code)
+                    response.raise_for_status()
+
+                data = response.json()
+                rows = data.get('data') or []
+                span.set_attribute("finmind.rows", len(rows))
+                return rows
+
+            except CircuitOpenError as e:
+                span.record_error(str(e))
+                print(f"請求失敗: {e}")
+                return None
+            except self._async_session._httpx.HTTPError as e:
+                span.record_error(str(e))
+                print(f"請求失敗: {e}")
+                print("提示: 若遇到 400 錯誤，可能需要 FinMind API token")
+                return None
+            except Exception as e:
+                span.record_error(str(e))
+                print(f"處理資料時發生錯誤: {e}")
+                return None
+
+    @staticmethod
+    def _span_attributes(currency: Optional[str], start_date: str, end_date: str) -> dict:
+        """finmind.request span 的屬性"""
+        return {"currency": currency or "ALL", "start_date": start_date, "end_date": end_date}
+
+    def _request_args(self, currency: Optional[str], start_date: str, end_date: str) -> tuple:
+        """組出 API 查詢參數與標頭"""
         parameter = {
             "dataset": self.dataset,
-            "data_id": currency.upper(),
             "start_date": start_date,
             "end_date": end_date
         }
+        if currency:
+            parameter["data_id"] = currency
 
         headers = {}
         if self.token:
             headers["Authorization"] = f"Bearer {self.token}"
+        return parameter, headers
 
-        try:
-            response = requests.get(self.url, params=parameter, headers=headers, timeout=10)
-            response.raise_for_status()
-
-            data = response.json()
-
-            if 'data' not in data or not data['data']:
-                print(f"查無 {currency} 的匯率資料")
-                return pd.DataFrame(columns=['date', 'currency', 'cash_buy', 'cash_sell', 'spot_buy', 'spot_sell'])
-
-            df = pd.DataFrame(data['data'])
-
-            numeric_columns = ['cash_buy', 'cash_sell', 'spot_buy', 'spot_sell']
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            return df
-
-        except requests.exceptions.RequestException as e:
-            print(f"請求失敗: {e}")
-            print("提示: 若遇到 400 錯誤，可能需要 FinMind API token")
-            print("註冊網址: https://finmindtrade.com/analysis/#/membership/register")
-            return pd.DataFrame(columns=['date', 'currency', 'cash_buy', 'cash_sell', 'spot_buy', 'spot_sell'])
-        except Exception as e:
-            print(f"處理資料時發生錯誤: {e}")
-            return pd.DataFrame(columns=['date', 'currency', 'cash_buy', 'cash_sell', 'spot_buy', 'spot_sell'])
+    async def aclose(self):
+        """關閉 async 連線池"""
+        if self._async_session is not None:
+            await self._async_session.aclose()
+            self._async_session = None
 
     def get_latest_rate(self, currency: str) -> Optional[dict]:
         """
@@ -132,23 +371,38 @@ class TaiwanExchangeRate:
             ...     print(f"美元現金買入價: {rate['cash_buy']}")
         """
         # 查詢最近7天的數據以確保能獲取到最新資料（API可能有延遲）
-        end_date = self.get_now()
-        start_date = end_date - timedelta(days=7)
+        start_date, end_date = self._recent_range(7)
+        series = self.fetch_series(currency, start_date=start_date, end_date=end_date)
 
-        df = self.fetch_data(
-            currency,
-            start_date=start_date.strftime("%Y-%m-%d"),
-            end_date=end_date.strftime("%Y-%m-%d")
-        )
+        # 返回最新的一筆資料 (沒有資料時為 None)
+        return series.latest()
+
+    async def get_latest_rate_async(self, currency: str) -> Optional[dict]:
+        """get_latest_rate 的 async 版本"""
+        start_date, end_date = self._recent_range(7)
+        series = await self.fetch_series_async(currency, start_date=start_date, end_date=end_date)
+        return series.latest()
+
+    def get_historical_series(self, currency: str, days: int = 30) -> RateSeries:
+        """
+        取得指定貨幣的歷史匯率序列 (不需要 pandas)
+
+        Args:
+            currency: 貨幣代碼 (如: USD, EUR, JPY)
+            days: 往前追溯的天數，預設為 30 天
 
-        if df.empty:
-            return None
+        Returns:
+            RateSeries: 歷史匯率序列
+        """
+        start_date, end_date = self._recent_range(days)
+        return self.fetch_series(currency, start_date=start_date, end_date=end_date)
 
-        # 返回最新的一筆資料
-        latest = df.iloc[-1].to_dict()
-        return latest
+    async def get_historical_series_async(self, currency: str, days: int = 30) -> RateSeries:
+        """get_historical_series 的 async 版本"""
+        start_date, end_date = self._recent_range(days)
+        return await self.fetch_series_async(currency, start_date=start_date, end_date=end_date)
 
-    def get_historical_rates(self, currency: str, days: int = 30) -> pd.DataFrame:
+    def get_historical_rates(self, currency: str, days: int = 30) -> "pd.DataFrame":
         """
         取得指定貨幣的歷史匯率資料
 
@@ -164,35 +418,47 @@ class TaiwanExchangeRate:
             >>> df = exchanger.get_historical_rates("USD", days=7)
             >>> print(df)
         """
-        end_date = self.get_now()
-        start_date = end_date - timedelta(days=days)
+        return self.get_historical_series(currency, days).to_pandas()
 
-        return self.fetch_data(
-            currency,
-            start_date=start_date.strftime("%Y-%m-%d"),
-            end_date=end_date.strftime("%Y-%m-%d")
-        )
-
-    def get_multiple_currencies(self, currencies: list, start_date: Optional[str] = None, end_date: Optional[str] = None) -> dict:
+    def get_multiple_currencies(self, currencies: list, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                max_workers: int = 8, timeout: Optional[float] = None, bulk: bool = False) -> dict:
         """
-        同時查詢多種貨幣的匯率
+        同時查詢多種貨幣的匯率 (平行查詢)
 
         Args:
             currencies: 貨幣代碼列表 (如: ["USD", "EUR", "JPY"])
             start_date: 開始日期 (格式: YYYY-MM-DD)
             end_date: 結束日期 (格式: YYYY-MM-DD)
+            max_workers: 同時查詢的最大數量，1 表示依序查詢
+            timeout: 整批查詢的期限秒數，逾時的貨幣不會出現在結果中
+            bulk: 是否改用 fetch_all_currencies 以單一請求查詢
 
         Returns:
-            dict: 以貨幣代碼為 key，DataFrame 為 value 的字典
+            dict: 以貨幣代碼為 key，DataFrame 為 value 的字典 (依輸入順序)
 
         Example:
             >>> exchanger = TaiwanExchangeRate()
             >>> rates = exchanger.get_multiple_currencies(["USD", "EUR", "JPY"])
             >>> print(rates["USD"].head())
         """
+        if bulk:
+            return self.fetch_all_currencies(start_date, end_date, currencies)
+
+        fetched = map_with_deadline(
+            lambda currency: self.fetch_data(currency, start_date, end_date),
+            currencies,
+            max_workers=max_workers,
+            timeout=timeout
+        )
+
         result = {}
-        for currency in currencies:
-            df = self.fetch_data(currency, start_date, end_date)
+        for currency, df in fetched:
+            if df is TIMED_OUT:
+                print(f"查詢 {currency} 逾時")
+                continue
+            if isinstance(df, Exception):
+                print(f"查詢 {currency} 失敗: {df}")
+                continue
             if not df.empty:
                 result[currency] = df
         return result
@@ -0,0 +1,302 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# 每次嘗試至少保留的逾時秒數 (避免以 0 或負數呼叫 requests/httpx)
+MIN_ATTEMPT_TIMEOUT = 0.05
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """斷路器開啟中，請求直接失敗"""
+
+
+class RetryPolicy:
+    """
+    重試策略 (指數退避 + 隨機抖動)
+
+    第 n 次重試前等待 min(max_delay, base_delay * 2 ** (n - 1))，再乘上 [1 - jitter, 1] 的隨機比例。
+    若伺服器回傳 Retry-After 標頭，則以該值 (不超過 max_delay) 為準。
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 4.0,
+                 jitter: float = 0.5, retry_statuses: tuple = (429, 500, 502, 503, 504)):
+        """
+        Args:
+            max_attempts: 最多嘗試次數 (含第一次)
+            base_delay: 第一次重試前的等待秒數
+            max_delay: 單次等待的上限秒數
+            jitter: 隨機抖動比例 (0 表示不抖動)
+            retry_statuses: 需要重試的 HTTP 狀態碼
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """計算第 attempt 次重試前的等待秒數 (attempt 從 1 開始)"""
+        if retry_after:
+            try:
+                return min(self.max_delay, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return backoff * (1 - self.jitter * random.random())
+
+
+class CircuitBreaker:
+    """
+    斷路器
+
+    連續失敗 failure_threshold 次後開啟，reset_timeout 秒內的請求直接失敗；
+    之後放行一個試探請求 (half-open)，成功則關閉，失敗則再次開啟。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """是否允許發出請求"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def release(self):
+        """請求沒有結果就中止 (例如被取消) 時呼叫，試探中的斷路器交由下一個請求重新試探"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+
+def _deadline(timeout, clock: Callable[[], float]) -> Optional[float]:
+    """由整體逾時秒數計算期限 (timeout 不是單一數字時不設期限，例如 (connect, read) tuple)"""
+    if isinstance(timeout, (int, float)) and not isinstance(timeout, bool):
+        return clock() + timeout
+    return None
+
+
+def _has_time(deadline: Optional[float], delay: float, clock: Callable[[], float]) -> bool:
+    """等待 delay 秒後是否還來得及再嘗試一次"""
+    return deadline is None or clock() + delay + MIN_ATTEMPT_TIMEOUT < deadline
+
+
+class RetrySession:
+    """
+    共用連線池的 HTTP 客戶端
+
+    - 使用 requests.Session 保持連線 (keep-alive)，避免每次請求重新進行 TCP/TLS 握手
+    - 429/5xx 與連線錯誤依 RetryPolicy 重試，整個請求 (含重試) 不超過呼叫端的 timeout
+    - 透過 CircuitBreaker 在上游持續失敗時快速失敗
+    """
+
+    def __init__(self, retry: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None,
+                 pool_size: int = 8, sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            retry: 重試策略，預設為 RetryPolicy()
+            breaker: 斷路器，預設為 CircuitBreaker()
+            pool_size: 連線池大小 (建議不小於平行查詢數量)
+            sleep: 等待函式 (測試用)
+            clock: 計算期限的時鐘 (測試用)
+        """
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self._clock = clock
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        發出 GET 請求 (含重試與斷路器)
+
+        timeout 為整個請求 (含重試與等待) 的期限，每次嘗試只使用剩下的時間；
+        剩下的時間不足以等待下一次重試時直接失敗。
+
+        Returns:
+            requests.Response: 最後一次的回應，狀態碼檢查交由呼叫端處理
+
+        Raises:
+            CircuitOpenError: 斷路器開啟中
+            requests.exceptions.RequestException: 重試後仍然連線失敗
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"上游服務暫時無法使用，{self.breaker.reset_timeout:.0f} 秒內不再重試")
+
+        try:
+            response = self._send(url, kwargs)
+        except Exception:
+            # 任何例外 (包含 ChunkedEncodingError 等非連線錯誤) 都視為失敗，試探請求才不會一直停在 half-open
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        if response.status_code in self.retry.retry_statuses:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _send(self, url: str, kwargs: dict) -> requests.Response:
+        """依 RetryPolicy 重試 (見 get)，不更新斷路器"""
+        deadline = _deadline(kwargs.get("timeout"), self._clock)
+        attempt = 0
+        while True:
+            attempt += 1
+            if deadline is not None:
+                kwargs["timeout"] = max(MIN_ATTEMPT_TIMEOUT, deadline - self._clock())
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                delay = self.retry.delay(attempt)
+                if attempt >= self.retry.max_attempts or not _has_time(deadline, delay, self._clock):
+                    raise
+                self._sleep(delay)
+                continue
+
+            if response.status_code in self.retry.retry_statuses:
+                delay = self.retry.delay(attempt, response.headers.get("Retry-After"))
+                if attempt >= self.retry.max_attempts or not _has_time(deadline, delay, self._clock):
+                    return response
+                self._sleep(delay)
+                response.close()
+                continue
+
+            return response
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncRetrySession:
+    """
+    RetrySession 的 async 版本 (使用 httpx.AsyncClient，需安裝 httpx)
+
+    重試策略與斷路器的規則與 RetrySession 相同，可與同步版共用同一個 CircuitBreaker。
+    """
+
+    def __init__(self, retry: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None,
+                 pool_size: int = 8, sleep: Callable[[float], Awaitable] = asyncio.sleep,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            retry: 重試策略，預設為 RetryPolicy()
+            breaker: 斷路器，預設為 CircuitBreaker()
+            pool_size: 連線池大小
+            sleep: 非同步等待函式 (測試用)
+            clock: 計算期限的時鐘 (測試用)
+        """
+        import httpx
+
+        self._httpx = httpx
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self._clock = clock
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    async def get(self, url: str, **kwargs):
+        """
+        發出 GET 請求 (含重試與斷路器，timeout 為整個請求的期限，見 RetrySession.get)
+
+        Returns:
+            httpx.Response: 最後一次的回應，狀態碼檢查交由呼叫端處理
+
+        Raises:
+            CircuitOpenError: 斷路器開啟中
+            httpx.TransportError: 重試後仍然連線失敗
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"上游服務暫時無法使用，{self.breaker.reset_timeout:.0f} 秒內不再重試")
+
+        try:
+            response = await self._send(url, kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # 被取消 (asyncio.CancelledError) 不算上游失敗
+            self.breaker.release()
+            raise
+
+        if response.status_code in self.retry.retry_statuses:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def _send(self, url: str, kwargs: dict):
+        """依 RetryPolicy 重試 (見 get)，不更新斷路器"""
+        deadline = _deadline(kwargs.get("timeout"), self._clock)
+        attempt = 0
+        while True:
+            attempt += 1
+            if deadline is not None:
+                kwargs["timeout"] = max(MIN_ATTEMPT_TIMEOUT, deadline - self._clock())
+            try:
+                response = await self.client.get(url, **kwargs)
+            except self._httpx.TransportError:
+                delay = self.retry.delay(attempt)
+                if attempt >= self.retry.max_attempts or not _has_time(deadline, delay, self._clock):
+                    raise
+                await self._sleep(delay)
+                continue
+
+            if response.status_code in self.retry.retry_statuses:
+                delay = self.retry.delay(attempt, response.headers.get("Retry-After"))
+                if attempt >= self.retry.max_attempts or not _has_time(deadline, delay, self._clock):
+                    return response
+                await self._sleep(delay)
+                continue
+
+            return response
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,245 @@
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# 延遲分布的桶上界 (秒)，涵蓋快取命中 (< 1 ms) 到 Electron 的 30 秒逾時
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 超過此數量的名稱一律記為 OTHER，避免未知的 action 讓統計無限增長
+MAX_SERIES = 256
+OTHER = "_other"
+
+
+class Histogram:
+    """
+    固定桶的延遲分布
+
+    observe 只做一次二分搜尋與加法，百分位數由桶的累計數量以線性內插估計
+    (誤差在所在桶的範圍內，最後一個桶以實際最大值為上界)。
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """估計第 q 分位數 (0 < q <= 1)，沒有資料時為 NaN"""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+
+
+class _Outcome:
+    """track 區塊的結果，呼叫端可將 error 設為 True 表示失敗 (不需拋出例外)"""
+
+    __slots__ = ("error",)
+
+    def __init__(self):
+        self.error = False
+
+
+class Metrics:
+    """
+    輕量的延遲與錯誤統計
+
+    依 (類別, 名稱) 分別記錄延遲分布、錯誤次數與處理中的數量，例如
+    ("action", "exchange_rate") 或 ("upstream", "finmind")。每次記錄只需取得一次鎖，
+    可以在正式環境持續開啟。
+
+    Example:
+        >>> with METRICS.track("upstream", "finmind") as outcome:
+        ...     rows = request()
+        ...     outcome.error = rows is None
+        >>> METRICS.snapshot()["upstream"]["finmind"]["p95_ms"]
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: int = MAX_SERIES,
+                 clock: Callable[[], float] = time.perf_counter):
+        """
+        Args:
+            buckets: 延遲分布的桶上界 (秒)
+            max_series: 每個類別最多記錄的名稱數量
+            clock: 計時函式 (測試用)
+        """
+        self.buckets = tuple(buckets)
+        self.max_series = max_series
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._in_flight: Dict[Tuple[str, str], int] = {}
+        self._started = time.monotonic()
+
+    def _key(self, kind: str, name) -> Tuple[str, str]:
+        """取得統計 key (需在鎖內呼叫)"""
+        key = (kind, str(name))
+        if key not in self._histograms:
+            if sum(1 for k in self._histograms if k[0] == kind) >= self.max_series:
+                key = (kind, OTHER)
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self.buckets)
+                self._errors[key] = 0
+                self._in_flight[key] = 0
+        return key
+
+    def observe(self, kind: str, name, seconds: float, error: bool = False):
+        """記錄一次已完成的操作"""
+        with self._lock:
+            key = self._key(kind, name)
+            self._histograms[key].observe(seconds)
+            if error:
+                self._errors[key] += 1
+
+    @contextmanager
+    def track(self, kind: str, name):
+        """
+        記錄區塊的執行時間，執行期間列入處理中數量
+
+        區塊拋出例外或將 outcome.error 設為 True 時計為錯誤。
+        """
+        with self._lock:
+            key = self._key(kind, name)
+            self._in_flight[key] += 1
+        outcome = _Outcome()
+        started = self._clock()
+        try:
+            yield outcome
+        except BaseException:
+            outcome.error = True
+            raise
+        finally:
+            elapsed = self._clock() - started
+            with self._lock:
+                self._in_flight[key] -= 1
+                self._histograms[key].observe(elapsed)
+                if outcome.error:
+                    self._errors[key] += 1
+
+    def snapshot(self) -> dict:
+        """
+        取得目前的統計
+
+        Returns:
+            dict: uptime (秒) 與各類別 {名稱: count, errors, error_ratio, in_flight,
+                  mean_ms, p50_ms, p95_ms, p99_ms, max_ms}
+        """
+        result = {"uptime": time.monotonic() - self._started}
+        with self._lock:
+            for (kind, name), histogram in sorted(self._histograms.items()):
+                errors = self._errors[(kind, name)]
+                result.setdefault(kind, {})[name] = {
+                    "count": histogram.count,
+                    "errors": errors,
+                    "error_ratio": errors / histogram.count if histogram.count else 0.0,
+                    "in_flight": self._in_flight[(kind, name)],
+                    "mean_ms": _ms(histogram.sum / histogram.count if histogram.count else math.nan),
+                    "p50_ms": _ms(histogram.quantile(0.50)),
+                    "p95_ms": _ms(histogram.quantile(0.95)),
+                    "p99_ms": _ms(histogram.quantile(0.99)),
+                    "max_ms": _ms(histogram.max if histogram.count else math.nan)
+                }
+        return result
+
+    def to_prometheus(self, gauges: Optional[dict] = None, prefix: str = "calculator") -> str:
+        """
+        輸出 Prometheus 文字格式
+
+        Args:
+            gauges: 額外輸出為 gauge 的巢狀 dict (例如快取統計)，只輸出數值欄位，
+                    {"rate_cache": {"hit_ratio": 0.9}} 會輸出為 {prefix}_rate_cache_hit_ratio
+            prefix: 指標名稱前綴
+
+        Returns:
+            str: text/plain; version=0.0.4 格式的內容
+        """
+        lines = []
+        with self._lock:
+            items = sorted(self._histograms.items())
+            errors = dict(self._errors)
+            in_flight = dict(self._in_flight)
+
+            for kind in sorted({kind for kind, _ in self._histograms}):
+                metric = f"{prefix}_{kind}_duration_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for (k, name), histogram in items:
+                    if k != kind:
+                        continue
+                    label = _label(name)
+                    cumulative = 0
+                    for bound, count in zip(histogram.bounds, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{name="{label}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{name="{label}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{name="{label}"}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{name="{label}"}} {histogram.count}')
+
+                for suffix, values, metric_type in (("errors_total", errors, "counter"),
+                                                    ("in_flight", in_flight, "gauge")):
+                    metric = f"{prefix}_{kind}_{suffix}"
+                    lines.append(f"# TYPE {metric} {metric_type}")
+                    for (k, name), histogram in items:
+                        if k == kind:
+                            lines.append(f'{metric}{{name="{_label(name)}"}} {values[(k, name)]}')
+
+        for name, value in _flatten(gauges or {}, prefix):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """清除所有統計"""
+        with self._lock:
+            self._histograms.clear()
+            self._errors.clear()
+            self._in_flight.clear()
+            self._started = time.monotonic()
+
+
+def _ms(seconds: float) -> Optional[float]:
+    """秒轉為毫秒 (NaN 轉為 None)"""
+    return None if math.isnan(seconds) else round(seconds * 1000, 3)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _flatten(values: dict, prefix: str):
+    """將巢狀 dict 的數值欄位展開為 (指標名稱, 值)"""
+    for key, value in values.items():
+        name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{key}")
+        if isinstance(value, dict):
+            yield from _flatten(value, name)
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)) and not (isinstance(value, float) and math.isnan(value)):
+            yield name, value
+
+
+# 整個程序共用的統計 (IPC Server、匯率查詢、Gemini 呼叫都記錄在這裡)
+METRICS = Metrics()
@@ -0,0 +1,45 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+
+TIMED_OUT = object()
+
+
+def map_with_deadline(func: Callable[[Any], Any], items: Iterable, max_workers: int = 8,
+                      timeout: Optional[float] = None) -> List[Tuple[Any, Any]]:
+    """
+    以有上限的執行緒池平行執行 func，並在期限到達時回傳部分結果
+
+    Args:
+        func: 對每個項目呼叫的函式
+        items: 輸入項目 (重複項目只執行一次)
+        max_workers: 同時執行的最大數量
+        timeout: 整批的期限秒數，None 表示等待全部完成
+
+    Returns:
+        list: 依輸入順序排列的 (item, result)；未在期限內完成的項目 result 為 TIMED_OUT，
+              發生例外的項目 result 為該例外物件
+    """
+    unique = list(dict.fromkeys(items))
+    if not unique:
+        return []
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique))))
+    try:
+        # 每個工作在呼叫端 context 的副本中執行 (沿用目前的追蹤 span 等 contextvars)
+        futures = [executor.submit(contextvars.copy_context().run, func, item) for item in unique]
+        wait(futures, timeout=timeout)
+
+        results = []
+        for item, future in zip(unique, futures):
+            if not future.done():
+                results.append((item, TIMED_OUT))
+            elif future.exception() is not None:
+                results.append((item, future.exception()))
+            else:
+                results.append((item, future.result()))
+        return results
+    finally:
+        # 不等待逾時的工作，避免拖住呼叫端
+        executor.shutdown(wait=False, cancel_futures=True)
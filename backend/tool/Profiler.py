@@ -0,0 +1,288 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+# 取樣時視為閒置的最內層函式 (等待工作或輸入)，不列入熱點
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("selectors.py", "select"),
+    ("ipc_server.py", "run"),
+}
+
+PROFILE_MODES = ("sample", "cprofile", "both")
+
+
+def default_profile_dir() -> str:
+    """
+    取得效能分析輸出目錄
+
+    優先使用環境變數 PROFILE_DIR，否則為 ~/.cache/nkust-calculater/profiles
+    """
+    path = os.environ.get("PROFILE_DIR")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "nkust-calculater", "profiles")
+
+
+class ProfileSession:
+    """
+    執行中程序的效能分析
+
+    - sample: 背景執行緒每 interval 秒讀取所有執行緒的呼叫堆疊 (sys._current_frames)，
+      輸出 collapsed-stack 格式 (每行 "frame;frame;frame 次數"，可直接交給 flamegraph.pl / speedscope)，
+      不需修改被分析的程式碼，負擔低
+    - cprofile: 以 cProfile 記錄經過 call() 的請求 (每個執行緒各自一個 Profile，結束時合併)，
+      輸出 pstats 檔案與依累計時間排序的摘要
+    - both: 同時使用以上兩種
+
+    另可選擇以 tracemalloc 比較開始與結束時的記憶體配置。
+
+    Example:
+        >>> session = ProfileSession(mode="sample", tracemalloc_frames=10)
+        >>> session.start()
+        >>> ...
+        >>> session.stop()["files"]
+        {'collapsed': '.../profile-20240101-120000.collapsed', ...}
+    """
+
+    def __init__(self, mode: str = "sample", interval: float = 0.005, tracemalloc_frames: int = 0,
+                 output_dir: Optional[str] = None):
+        """
+        Args:
+            mode: sample、cprofile 或 both
+            interval: 取樣間隔秒數
+            tracemalloc_frames: tracemalloc 保存的堆疊深度 (0 表示不記錄記憶體配置)
+            output_dir: 輸出目錄 (可選，預設為 default_profile_dir())
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.interval = interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self.output_dir = output_dir or default_profile_dir()
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+
+        self._profiles = {}
+        self._global_profile = None
+        self._started_tracemalloc = False
+        self._snapshot = None
+        self.started_at = None
+
+    @property
+    def active(self) -> bool:
+        return self.started_at is not None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+
+        if self.tracemalloc_frames:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.tracemalloc_frames)
+                self._started_tracemalloc = True
+            self._snapshot = tracemalloc.take_snapshot()
+
+        if self.mode in ("cprofile", "both") and sys.version_info >= (3, 12):
+            # 3.12 起 cProfile 使用 sys.monitoring，同時只能有一個 Profile，且會記錄所有執行緒
+            import cProfile
+            self._global_profile = cProfile.Profile()
+            self._global_profile.enable()
+
+        if self.mode in ("sample", "both"):
+            self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+            self._sampler.start()
+
+    def call(self, fn, *args):
+        """
+        執行 fn(*args)；cprofile 模式下以目前執行緒的 Profile 記錄
+
+        同一執行緒巢狀呼叫 (例如 batch 的子請求) 時只由最外層記錄。
+        """
+        if self.mode == "sample" or not self.active or self._global_profile is not None:
+            return fn(*args)
+
+        import cProfile
+
+        thread_id = threading.get_ident()
+        with self._lock:
+            profile = self._profiles.get(thread_id)
+            if profile is None:
+                profile = self._profiles[thread_id] = [cProfile.Profile(), 0]
+        profile[1] += 1
+        if profile[1] > 1:
+            try:
+                return fn(*args)
+            finally:
+                profile[1] -= 1
+
+        profile[0].enable()
+        try:
+            return fn(*args)
+        finally:
+            profile[0].disable()
+            profile[1] -= 1
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own:
+                        continue
+                    code = frame.f_code
+                    if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                        self.idle_samples += 1
+                        continue
+
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    self._stacks[";".join(reversed(stack))] += 1
+                    self.samples += 1
+
+    def stop(self, top: int = 20) -> dict:
+        """
+        結束分析並寫出結果檔案
+
+        Args:
+            top: 回傳摘要的函式數量
+
+        Returns:
+            dict: duration、mode、files (collapsed / pstats / summary / tracemalloc 檔案路徑)，
+                  sample 模式另有 samples、idle_samples、top (最內層函式的取樣比例)，
+                  cprofile 模式另有 top_cumulative (累計時間最長的函式)，tracemalloc 另有 memory
+        """
+        duration = time.perf_counter() - self.started_at
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if self._global_profile is not None:
+            self._global_profile.disable()
+        self.started_at = None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"profile-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}")
+        result = {"mode": self.mode, "duration": round(duration, 3), "files": {}}
+
+        writers = []
+        if self.mode in ("sample", "both"):
+            writers.append(self._write_samples)
+        if self.mode in ("cprofile", "both"):
+            writers.append(self._write_pstats)
+        if self.tracemalloc_frames:
+            writers.append(self._write_tracemalloc)
+
+        for writer in writers:
+            part = writer(prefix, top)
+            result["files"].update(part.pop("files"))
+            result.update(part)
+        return result
+
+    def _write_samples(self, prefix: str, top: int) -> dict:
+        path = prefix + ".collapsed"
+        leaves = Counter()
+        with self._lock:
+            stacks = dict(self._stacks)
+            samples, idle = self.samples, self.idle_samples
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+                leaves[stack.rsplit(";", 1)[-1]] += count
+
+        return {
+            "files": {"collapsed": path},
+            "samples": samples,
+            "idle_samples": idle,
+            "top": [
+                {"function": name, "samples": count, "ratio": round(count / samples, 4)}
+                for name, count in leaves.most_common(top)
+            ]
+        }
+
+    def _write_pstats(self, prefix: str, top: int) -> dict:
+        import io
+        import pstats
+
+        with self._lock:
+            profiles = [profile for profile, _ in self._profiles.values()]
+        if self._global_profile is not None:
+            profiles.append(self._global_profile)
+        files = {}
+        if not profiles:
+            return {"files": files, "top_cumulative": []}
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+
+        files["pstats"] = prefix + ".pstats"
+        stats.dump_stats(files["pstats"])
+
+        summary = io.StringIO()
+        pstats.Stats(files["pstats"], stream=summary).sort_stats("cumulative").print_stats(50)
+        files["summary"] = prefix + ".txt"
+        with open(files["summary"], "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+
+        entries = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:top]
+        return {
+            "files": files,
+            "top_cumulative": [
+                {
+                    "function": f"{os.path.basename(filename)}:{line}({name})",
+                    "calls": calls,
+                    "total_time": round(total_time, 6),
+                    "cumulative_time": round(cumulative_time, 6)
+                }
+                for (filename, line, name), (_, calls, total_time, cumulative_time, _) in entries
+            ]
+        }
+
+    def _write_tracemalloc(self, prefix: str, top: int) -> dict:
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot()
+        files = {"tracemalloc": prefix + ".tracemalloc"}
+        snapshot.dump(files["tracemalloc"])
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        differences = snapshot.compare_to(self._snapshot, "lineno")
+        files["tracemalloc_summary"] = prefix + ".tracemalloc.txt"
+        with open(files["tracemalloc_summary"], "w", encoding="utf-8") as f:
+            for difference in differences[:100]:
+                f.write(f"{difference}\n")
+
+        return {
+            "files": files,
+            "memory": {
+                "current_kb": current // 1024,
+                "peak_kb": peak // 1024,
+                "top_growth": [
+                    {"location": str(difference.traceback[0]), "size_diff_kb": difference.size_diff // 1024,
+                     "count_diff": difference.count_diff}
+                    for difference in differences[:top]
+                ]
+            }
+        }
@@ -0,0 +1,248 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional
+
+from tool.RateSeries import RateSeries, RATE_FIELDS
+
+
+class RollingWindow:
+    """
+    固定大小的滑動視窗統計 (平均、最小、最大、標準差)
+
+    每次 push 為 O(1) (最小/最大值使用單調佇列，攤銷 O(1))，NaN 會佔用視窗位置但不列入統計，
+    與 RateSeries.mean(last=n) 忽略 NaN 的方式相同。
+    """
+
+    __slots__ = ("size", "_values", "_sum", "_sumsq", "_count", "_min", "_max", "_index")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._values = deque()
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._count = 0
+        self._min = deque()
+        self._max = deque()
+        self._index = 0
+
+    def push(self, value: float):
+        self._index += 1
+        self._values.append(value)
+        if not math.isnan(value):
+            self._sum += value
+            self._sumsq += value * value
+            self._count += 1
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((self._index, value))
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((self._index, value))
+
+        if len(self._values) > self.size:
+            dropped = self._values.popleft()
+            if not math.isnan(dropped):
+                self._sum -= dropped
+                self._sumsq -= dropped * dropped
+                self._count -= 1
+
+        oldest = self._index - self.size
+        while self._min and self._min[0][0] <= oldest:
+            self._min.popleft()
+        while self._max and self._max[0][0] <= oldest:
+            self._max.popleft()
+
+    @property
+    def count(self) -> int:
+        """視窗內的有效值數量"""
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self._count if self._count else math.nan
+
+    @property
+    def min(self) -> float:
+        return self._min[0][1] if self._min else math.nan
+
+    @property
+    def max(self) -> float:
+        return self._max[0][1] if self._max else math.nan
+
+    @property
+    def std(self) -> float:
+        """樣本標準差 (有效值少於 2 個時為 NaN)"""
+        if self._count < 2:
+            return math.nan
+        variance = (self._sumsq - self._sum * self._sum / self._count) / (self._count - 1)
+        return math.sqrt(max(0.0, variance))
+
+
+class _CurrencyState:
+    """單一貨幣的序列與各視窗統計"""
+
+    def __init__(self, currency: str, windows: Iterable[int]):
+        self.series = RateSeries(currency)
+        self.updated_at = None
+        self.rates = {size: RollingWindow(size) for size in windows}
+        self.returns = {size: RollingWindow(size) for size in windows}
+        self.spreads = {size: RollingWindow(size) for size in windows}
+
+    def append(self, row: dict):
+        previous = self.series.cash_sell[-1] if len(self.series) else math.nan
+        self.series.append(row['date'], row['cash_buy'], row['cash_sell'], row['spot_buy'], row['spot_sell'])
+        self._push(previous, self.series.cash_buy[-1], self.series.cash_sell[-1])
+
+    def replace_last(self, row: dict) -> bool:
+        """
+        以新的值取代最後一天的資料 (當日匯率在收盤前仍可能修正)
+
+        滑動視窗無法移除最後加入的值，因此以序列尾端重新計算各視窗 (只需最大視窗 + 1 筆)。
+
+        Returns:
+            bool: 資料是否有變動
+        """
+        series = self.series
+        old = series.row(-1)
+        for column in (series.dates, series.cash_buy, series.cash_sell, series.spot_buy, series.spot_sell):
+            column.pop()
+        series.append(row['date'], row['cash_buy'], row['cash_sell'], row['spot_buy'], row['spot_sell'])
+        if all(_same(old[field], series.column(field)[-1]) for field in RATE_FIELDS):
+            return False
+
+        sizes = list(self.rates)
+        self.rates = {size: RollingWindow(size) for size in sizes}
+        self.returns = {size: RollingWindow(size) for size in sizes}
+        self.spreads = {size: RollingWindow(size) for size in sizes}
+        start = max(0, len(series) - max(sizes, default=0) - 1)
+        for i in range(start, len(series)):
+            previous = series.cash_sell[i - 1] if i > start else math.nan
+            self._push(previous, series.cash_buy[i], series.cash_sell[i])
+        return True
+
+    def _push(self, previous: float, cash_buy: float, cash_sell: float):
+        # 日報酬率 (%)，用來計算波動度
+        change = (cash_sell / previous - 1) * 100 if previous and not math.isnan(previous) else math.nan
+        for size in self.rates:
+            self.rates[size].push(cash_sell)
+            self.returns[size].push(change)
+            self.spreads[size].push(cash_sell - cash_buy)
+
+
+class RateAnalytics:
+    """
+    增量的匯率統計
+
+    依貨幣保存每日匯率序列，新的日期加入時以 O(1) 更新各視窗的現金賣出價平均、最小/最大值、
+    波動度 (日報酬率的標準差，%) 與買賣價差 (cash_sell - cash_buy)。
+    查詢趨勢時直接讀取已算好的統計，不需要重新查詢與計算整段歷史資料。
+
+    Example:
+        >>> analytics = RateAnalytics(windows=(3, 7))
+        >>> analytics.update(exchanger.get_historical_series("USD", days=7))
+        >>> analytics.stats("USD")["windows"]["3"]["mean"]
+    """
+
+    def __init__(self, windows: Iterable[int] = (3, 7), max_rows: int = 400,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            windows: 統計視窗大小 (資料筆數)
+            max_rows: 每種貨幣最多保存的資料筆數
+            clock: 取得目前時間的函式 (測試用)
+        """
+        self.windows = tuple(windows)
+        self.max_rows = max_rows
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._states: Dict[str, _CurrencyState] = {}
+
+    def update(self, series: RateSeries) -> int:
+        """
+        加入序列中比現有資料更新的日期；與最後一天相同日期的資料 (當日匯率修正) 會取代原本的值
+
+        Returns:
+            int: 新加入或有變動的資料筆數
+        """
+        currency = series.currency.upper()
+        with self._lock:
+            state = self._states.get(currency)
+            if state is None:
+                state = self._states[currency] = _CurrencyState(currency, self.windows)
+
+            last_date = state.series.dates[-1] if len(state.series) else ""
+            added = 0
+            for i, date in enumerate(series.dates):
+                if date > last_date:
+                    state.append(series.row(i))
+                    last_date = date
+                    added += 1
+                elif date == last_date and state.replace_last(series.row(i)):
+                    added += 1
+
+            if len(state.series) > 2 * self.max_rows:
+                state.series = state.series.tail(self.max_rows)
+            state.updated_at = self._clock()
+            return added
+
+    def is_fresh(self, currency: str, max_age: float) -> bool:
+        """是否在 max_age 秒內更新過 (且有資料)"""
+        with self._lock:
+            state = self._states.get(currency.upper())
+            return (state is not None and state.updated_at is not None and len(state.series) > 0
+                    and self._clock() - state.updated_at <= max_age)
+
+    def series(self, currency: str, start_date: Optional[str] = None) -> RateSeries:
+        """取得保存的序列 (可指定開始日期)"""
+        with self._lock:
+            state = self._states.get(currency.upper())
+            if state is None:
+                return RateSeries(currency.upper())
+            return state.series.slice(start_date)
+
+    def stats(self, currency: str) -> Optional[dict]:
+        """
+        取得最新的統計
+
+        Returns:
+            dict: date, cash_buy, cash_sell, spread 與各視窗的 mean/min/max/volatility/spread_mean/days
+                  (視窗大小為字串 key)，沒有資料時返回 None
+        """
+        with self._lock:
+            state = self._states.get(currency.upper())
+            if state is None or not len(state.series):
+                return None
+
+            latest = state.series.latest()
+            windows = {}
+            for size in self.windows:
+                rates = state.rates[size]
+                windows[str(size)] = {
+                    "days": rates.count,
+                    "mean": _clean(rates.mean),
+                    "min": _clean(rates.min),
+                    "max": _clean(rates.max),
+                    "volatility": _clean(state.returns[size].std),
+                    "spread_mean": _clean(state.spreads[size].mean)
+                }
+
+            return {
+                "currency": currency.upper(),
+                "date": latest["date"],
+                "cash_buy": _clean(latest["cash_buy"]),
+                "cash_sell": _clean(latest["cash_sell"]),
+                "spread": _clean(latest["cash_sell"] - latest["cash_buy"]),
+                "windows": windows
+            }
+
+
+def _same(a: float, b: float) -> bool:
+    """比較兩個匯率值 (兩者皆為 NaN 時視為相同)"""
+    return a == b or (math.isnan(a) and math.isnan(b))
+
+
+def _clean(value: float) -> Optional[float]:
+    """NaN 轉為 None (JSON 不支援 NaN)"""
+    return None if math.isnan(value) else value
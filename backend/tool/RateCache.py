@@ -0,0 +1,209 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class RateCache:
+    """
+    記憶體匯率快取 (TTL + LRU)
+
+    - 在 ttl 秒內的資料直接回傳
+    - 超過 ttl 但未超過 ttl + max_stale 的資料會先回傳舊值，並在背景啟動一次更新
+      (同一個 key 同時只會有一個背景更新)
+    - 超過容量時淘汰最久未使用的項目
+    - loader 回傳 None 時不寫入快取
+    """
+
+    def __init__(self, maxsize: int = 64, ttl: float = 300.0, max_stale: float = 3600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化快取
+
+        Args:
+            maxsize: 最多保存的項目數量
+            ttl: 資料保持新鮮的秒數
+            max_stale: 過期後仍可回傳舊值的秒數，超過則同步重新載入
+            clock: 取得目前時間的函式 (測試用)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._refreshing = set()
+        # get_or_load_async 載入中的 future ((event loop, key) → Future)
+        self._loading = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[Hashable], Any]) -> Any:
+        """
+        取得快取值，必要時呼叫 loader(key) 載入
+
+        Args:
+            key: 快取鍵值
+            loader: 載入函式，接收 key 並回傳資料
+
+        Returns:
+            快取或新載入的資料
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = now - stored_at
+                if age <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if age <= self.ttl + self.max_stale:
+                    self._data.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+                    return value
+            self.misses += 1
+
+        value = loader(key)
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[Hashable], Awaitable[Any]]) -> Any:
+        """
+        get_or_load 的 async 版本
+
+        - loader 為 async 函式；過期資料的背景更新以 task 執行，不另開執行緒
+        - 同一個 key 同時未命中時只呼叫一次 loader，其他呼叫端等待同一個結果
+        - 與同步版共用資料與背景更新狀態 (不會對同一個 key 重複背景更新)
+        """
+        loop = asyncio.get_running_loop()
+        now = self._clock()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = now - stored_at
+                if age <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if age <= self.ttl + self.max_stale:
+                    self._data.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        loop.create_task(self._refresh_async(key, loader))
+                    return value
+            self.misses += 1
+
+            future = self._loading.get((loop, key))
+            owner = future is None
+            if owner:
+                future = self._loading[(loop, key)] = loop.create_future()
+
+        if not owner:
+            return await asyncio.shield(future)
+
+        try:
+            value = await loader(key)
+            if value is not None:
+                self.put(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 沒有其他等待者時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop((loop, key), None)
+
+    async def _refresh_async(self, key: Hashable, loader: Callable[[Hashable], Awaitable[Any]]):
+        """背景更新單一項目 (async)"""
+        try:
+            value = await loader(key)
+            if value is not None:
+                self.put(key, value)
+            with self._lock:
+                self.refreshes += 1
+        except Exception:
+            with self._lock:
+                self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh(self, key: Hashable, loader: Callable[[Hashable], Any]):
+        """背景更新單一項目"""
+        try:
+            value = loader(key)
+            if value is not None:
+                self.put(key, value)
+            with self._lock:
+                self.refreshes += 1
+        except Exception:
+            with self._lock:
+                self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """取得快取值 (不論是否過期)，不存在時返回 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[0] if entry is not None else None
+
+    def put(self, key: Hashable, value: Any):
+        """寫入快取並依 LRU 淘汰多餘項目"""
+        with self._lock:
+            self._data[key] = (value, self._clock())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """移除指定項目 (不指定則清空)"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        """
+        取得快取統計資料
+
+        Returns:
+            dict: 包含 size, hits, stale_hits, misses, evictions, refreshes, refresh_errors, hit_ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0
+            }
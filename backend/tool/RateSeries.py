@@ -0,0 +1,253 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Optional
+
+
+RATE_FIELDS = ('cash_buy', 'cash_sell', 'spot_buy', 'spot_sell')
+
+
+def _to_float(value) -> float:
+    """轉為 float，無法轉換時為 NaN (與 pd.to_numeric(errors='coerce') 相同)"""
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _delta_encode(values: Iterable[float]) -> list:
+    """差值編碼：第一個有效值為原值，之後為與前一個有效值的差 (NaN 為 None)"""
+    result = []
+    previous = None
+    for value in values:
+        if math.isnan(value):
+            result.append(None)
+        else:
+            result.append(value if previous is None else round(value - previous, 6))
+            previous = value
+    return result
+
+
+class RateSeries:
+    """
+    單一貨幣的每日匯率序列
+
+    以平行的 array('d') 欄位加上日期索引保存資料，取代查詢路徑上的 pandas DataFrame：
+    取最新一筆、日期區間切片、移動平均都不需要載入 pandas，需要 DataFrame 時再呼叫 to_pandas()。
+
+    日期必須以遞增順序加入 (FinMind 與 RateStore 的回傳結果皆已排序)。
+    """
+
+    __slots__ = ('currency', 'dates', 'cash_buy', 'cash_sell', 'spot_buy', 'spot_sell')
+
+    def __init__(self, currency: str):
+        self.currency = currency
+        self.dates: List[str] = []
+        self.cash_buy = array('d')
+        self.cash_sell = array('d')
+        self.spot_buy = array('d')
+        self.spot_sell = array('d')
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict], currency: Optional[str] = None) -> "RateSeries":
+        """
+        由資料列建立序列
+
+        Args:
+            rows: 包含 date, cash_buy, cash_sell, spot_buy, spot_sell 的 dict
+            currency: 貨幣代碼，預設取第一筆資料的 currency 欄位
+        """
+        series = cls(currency or "")
+        for row in rows:
+            if not series.currency:
+                series.currency = row.get('currency') or ""
+            series.append(row.get('date'), row.get('cash_buy'), row.get('cash_sell'),
+                          row.get('spot_buy'), row.get('spot_sell'))
+        return series
+
+    @classmethod
+    def split_by_currency(cls, rows: Iterable[dict]) -> dict:
+        """
+        將多貨幣的資料列依 currency 欄位拆分為多個序列 (單次走訪)
+
+        Returns:
+            dict: 以貨幣代碼為 key，RateSeries 為 value (依首次出現順序)
+        """
+        result = {}
+        for row in rows:
+            currency = row.get('currency')
+            series = result.get(currency)
+            if series is None:
+                series = result[currency] = cls(currency)
+            series.append(row.get('date'), row.get('cash_buy'), row.get('cash_sell'),
+                          row.get('spot_buy'), row.get('spot_sell'))
+        return result
+
+    def append(self, date, cash_buy, cash_sell, spot_buy, spot_sell):
+        """在序列尾端加入一天的資料"""
+        self.dates.append(str(date)[:10])
+        self.cash_buy.append(_to_float(cash_buy))
+        self.cash_sell.append(_to_float(cash_sell))
+        self.spot_buy.append(_to_float(spot_buy))
+        self.spot_sell.append(_to_float(spot_sell))
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def empty(self) -> bool:
+        return not self.dates
+
+    def column(self, name: str) -> array:
+        """取得匯率欄位 (cash_buy, cash_sell, spot_buy, spot_sell)"""
+        if name not in RATE_FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def row(self, index: int) -> dict:
+        """取得第 index 筆資料 (可為負數)"""
+        return {
+            'date': self.dates[index],
+            'currency': self.currency,
+            'cash_buy': self.cash_buy[index],
+            'cash_sell': self.cash_sell[index],
+            'spot_buy': self.spot_buy[index],
+            'spot_sell': self.spot_sell[index],
+        }
+
+    def latest(self) -> Optional[dict]:
+        """取得最新一筆資料，沒有資料時返回 None"""
+        if not self.dates:
+            return None
+        return self.row(-1)
+
+    def to_rows(self) -> List[dict]:
+        return [self.row(i) for i in range(len(self.dates))]
+
+    def _take(self, start: int, stop: int) -> "RateSeries":
+        series = RateSeries(self.currency)
+        series.dates = self.dates[start:stop]
+        series.cash_buy = self.cash_buy[start:stop]
+        series.cash_sell = self.cash_sell[start:stop]
+        series.spot_buy = self.spot_buy[start:stop]
+        series.spot_sell = self.spot_sell[start:stop]
+        return series
+
+    def slice(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> "RateSeries":
+        """取得 [start_date, end_date] 區間 (含頭尾) 的子序列"""
+        start = bisect_left(self.dates, start_date) if start_date else 0
+        stop = bisect_right(self.dates, end_date) if end_date else len(self.dates)
+        return self._take(start, stop)
+
+    def tail(self, n: int) -> "RateSeries":
+        """取得最後 n 筆資料"""
+        return self._take(max(0, len(self.dates) - n), len(self.dates))
+
+    def mean(self, column: str = 'cash_sell', last: Optional[int] = None) -> float:
+        """
+        計算欄位平均 (忽略 NaN)
+
+        Args:
+            column: 匯率欄位
+            last: 只計算最後 last 筆，預設為全部
+
+        Returns:
+            float: 平均值，沒有資料時為 NaN
+        """
+        values = self.column(column)
+        if last is not None:
+            values = values[max(0, len(values) - last):]
+        valid = [value for value in values if not math.isnan(value)]
+        return sum(valid) / len(valid) if valid else math.nan
+
+    def rolling_mean(self, column: str = 'cash_sell', window: int = 3) -> array:
+        """
+        計算移動平均 (視窗內需全部為有效值，否則為 NaN；前 window - 1 筆為 NaN)
+
+        Returns:
+            array: 與序列等長的移動平均
+        """
+        values = self.column(column)
+        result = array('d', [math.nan]) * len(values)
+        total = 0.0
+        invalid = 0
+        for i, value in enumerate(values):
+            if math.isnan(value):
+                invalid += 1
+            else:
+                total += value
+            if i >= window:
+                dropped = values[i - window]
+                if math.isnan(dropped):
+                    invalid -= 1
+                else:
+                    total -= dropped
+            if i >= window - 1 and invalid == 0:
+                result[i] = total / window
+        return result
+
+    def to_dict(self) -> dict:
+        """輸出與 DataFrame.to_dict() 相同結構的字典 ({欄位: {列索引: 值}})"""
+        columns = {'date': self.dates, 'currency': [self.currency] * len(self.dates)}
+        for name in RATE_FIELDS:
+            columns[name] = getattr(self, name)
+        return {name: dict(enumerate(values)) for name, values in columns.items()}
+
+    def to_columns(self, max_points: Optional[int] = None, delta: bool = False) -> dict:
+        """
+        輸出精簡的欄式結構 (用於 JSON 回應)
+
+        貨幣代碼只出現一次，日期與各匯率欄位為等長的陣列，NaN 轉為 None。
+        相較 to_dict() 不需要列索引 key，也不會在每一列重複貨幣代碼。
+
+        Args:
+            max_points: 最多輸出的筆數 (可選)，超過時等間隔取樣，並一定保留最新一筆
+            delta: 是否以差值編碼匯率欄位 (第一個有效值為原值，之後為與前一個有效值的差，
+                   四捨五入到小數第 6 位；None 表示該日沒有資料)
+
+        Returns:
+            dict: currency, dates, cash_buy, cash_sell, spot_buy, spot_sell，
+                  以及 rows (原始筆數)、step (取樣間隔)、encoding ("plain" 或 "delta")
+
+        Example:
+            >>> series.to_columns(max_points=60)
+            {'currency': 'USD', 'dates': [...], 'cash_sell': [...], 'rows': 365, 'step': 7, ...}
+        """
+        rows = len(self.dates)
+        step = 1
+        if max_points and rows > max_points:
+            step = -(-rows // max_points)
+        # 由最新一筆往回取樣，確保最新的匯率一定包含在內
+        indexes = range(rows - 1, -1, -step)[::-1] if step > 1 else range(rows)
+
+        result = {
+            'currency': self.currency,
+            'rows': rows,
+            'step': step,
+            'encoding': 'delta' if delta else 'plain',
+            'dates': [self.dates[i] for i in indexes],
+        }
+        for name in RATE_FIELDS:
+            values = getattr(self, name)
+            values = [values[i] for i in indexes] if step > 1 else values
+            result[name] = _delta_encode(values) if delta else [None if math.isnan(v) else v for v in values]
+        return result
+
+    def to_pandas(self):
+        """轉為 pandas DataFrame (需安裝 pandas)"""
+        import pandas as pd
+
+        return pd.DataFrame({
+            'date': self.dates,
+            'currency': [self.currency] * len(self.dates),
+            'cash_buy': list(self.cash_buy),
+            'cash_sell': list(self.cash_sell),
+            'spot_buy': list(self.spot_buy),
+            'spot_sell': list(self.spot_sell),
+        }, columns=['date', 'currency', *RATE_FIELDS])
+
+    def __repr__(self) -> str:
+        latest = self.dates[-1] if self.dates else None
+        return f"RateSeries(currency={self.currency!r}, rows={len(self.dates)}, latest={latest!r})"
@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+from tool.RateSeries import RateSeries
+
+
+RATE_COLUMNS = ['date', 'currency', 'cash_buy', 'cash_sell', 'spot_buy', 'spot_sell']
+
+
+def default_store_path() -> str:
+    """取得預設的匯率快取檔案路徑 (可由環境變數 EXCHANGE_RATE_STORE 覆寫)"""
+    path = os.environ.get("EXCHANGE_RATE_STORE")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "nkust-calculater", "rates.sqlite3")
+
+
+def _to_date(value: str) -> date:
+    return datetime.strptime(value[:10], "%Y-%m-%d").date()
+
+
+class RateStore:
+    """
+    本機匯率資料庫 (SQLite)
+
+    以 (currency, date) 為主鍵保存每日匯率，並記錄哪些日期已經向 FinMind 查詢過，
+    讓 TaiwanExchangeRate 只需補抓缺少的日期區間。
+
+    假日沒有匯率資料，因此另外用 coverage 表記錄「已確認」的日期：
+    - 今天以前有資料的日期視為已確認
+    - 沒資料的日期只有在超過 settle_days 天之後才視為已確認 (API 可能有延遲)
+    """
+
+    def __init__(self, path: Optional[str] = None, settle_days: int = 3):
+        """
+        初始化匯率資料庫
+
+        Args:
+            path: SQLite 檔案路徑，預設為 default_store_path()；傳入 ":memory:" 可使用記憶體資料庫
+            settle_days: 幾天前的空白日期可視為確定沒有資料 (假日)
+        """
+        self.path = path or default_store_path()
+        self.settle_days = settle_days
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rates ("
+                " currency TEXT NOT NULL,"
+                " date TEXT NOT NULL,"
+                " cash_buy REAL, cash_sell REAL, spot_buy REAL, spot_sell REAL,"
+                " PRIMARY KEY (currency, date))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                " currency TEXT NOT NULL,"
+                " date TEXT NOT NULL,"
+                " PRIMARY KEY (currency, date))"
+            )
+
+    def get_rows(self, currency: str, start_date: str, end_date: str) -> List[dict]:
+        """
+        讀取指定區間內已保存的匯率資料 (依日期排序)
+
+        Returns:
+            list: 每筆為包含 RATE_COLUMNS 欄位的 dict
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT date, currency, cash_buy, cash_sell, spot_buy, spot_sell FROM rates"
+                " WHERE currency = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (currency, start_date, end_date)
+            )
+            return [dict(zip(RATE_COLUMNS, row)) for row in cursor.fetchall()]
+
+    def get_series(self, currency: str, start_date: str, end_date: str) -> RateSeries:
+        """讀取指定區間內已保存的匯率資料，直接組成 RateSeries (不建立中間的 dict)"""
+        series = RateSeries(currency)
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT date, cash_buy, cash_sell, spot_buy, spot_sell FROM rates"
+                " WHERE currency = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (currency, start_date, end_date)
+            )
+            for row in cursor:
+                series.append(*row)
+        return series
+
+    def missing_range(self, currency: str, start_date: str, end_date: str) -> Optional[Tuple[str, str]]:
+        """
+        找出區間內尚未確認的日期，回傳需要補抓的最小連續區間
+
+        Returns:
+            tuple: (start_date, end_date)，若全部已確認則返回 None
+        """
+        start, end = _to_date(start_date), _to_date(end_date)
+        if start > end:
+            return None
+
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT date FROM coverage WHERE currency = ? AND date BETWEEN ? AND ?",
+                (currency, start_date, end_date)
+            )
+            covered = {row[0] for row in cursor.fetchall()}
+
+        missing = []
+        day = start
+        while day <= end:
+            key = day.isoformat()
+            if key not in covered:
+                missing.append(key)
+            day += timedelta(days=1)
+
+        if not missing:
+            return None
+        return missing[0], missing[-1]
+
+    def put_rows(self, currency: str, rows: List[dict], start_date: str, end_date: str,
+                 today: Optional[date] = None):
+        """
+        寫入一次查詢的結果，並標記 [start_date, end_date] 區間的確認狀態
+
+        Args:
+            currency: 貨幣代碼
+            rows: FinMind 回傳的資料列
+            start_date: 本次查詢的開始日期
+            end_date: 本次查詢的結束日期
+            today: 基準日期，預設為今天 (TaiwanExchangeRate 傳入 get_now() 的日期，與查詢區間使用同一個時鐘)
+        """
+        today = today or date.today()
+        settled_before = today - timedelta(days=self.settle_days)
+
+        values = [
+            (currency, str(row.get('date'))[:10],
+             row.get('cash_buy'), row.get('cash_sell'), row.get('spot_buy'), row.get('spot_sell'))
+            for row in rows
+        ]
+        # 今天的匯率可能仍會更新，只確認今天以前的資料
+        covered = {value[1] for value in values if value[1] < today.isoformat()}
+
+        day, end = _to_date(start_date), _to_date(end_date)
+        while day <= end and day <= settled_before:
+            covered.add(day.isoformat())
+            day += timedelta(days=1)
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rates"
+                " (currency, date, cash_buy, cash_sell, spot_buy, spot_sell)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                values
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO coverage (currency, date) VALUES (?, ?)",
+                [(currency, key) for key in covered]
+            )
+
+    def clear(self, currency: Optional[str] = None):
+        """清除快取資料 (不指定貨幣則全部清除)"""
+        with self._lock, self._conn:
+            if currency:
+                self._conn.execute("DELETE FROM rates WHERE currency = ?", (currency,))
+                self._conn.execute("DELETE FROM coverage WHERE currency = ?", (currency,))
+            else:
+                self._conn.execute("DELETE FROM rates")
+                self._conn.execute("DELETE FROM coverage")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
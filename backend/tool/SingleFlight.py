@@ -0,0 +1,111 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _Call:
+    """進行中的一次呼叫"""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    合併同時進行的相同請求 (single-flight)
+
+    同一個 key 同時只會執行一次 fn，其他呼叫端等待並共用同一個結果或例外；
+    執行結束後即移除，之後的呼叫會重新執行 (本身不做快取)。
+
+    Example:
+        >>> flight = SingleFlight()
+        >>> flight.do(("USD", "2024-01-01", "2024-01-07"), lambda: fetch("USD"))
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        執行 fn，若相同 key 已在執行中則等待其結果
+
+        Raises:
+            執行中的 fn 拋出的例外 (所有等待者都會收到同一個例外)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """do 的 async 版本 (同一個 event loop 內合併)"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._async_calls.get((loop, key))
+            leader = future is None
+            if leader:
+                future = self._async_calls[(loop, key)] = loop.create_future()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            # 包含 KeyboardInterrupt 等非 Exception 的例外，否則等待者會一直卡住
+            future.set_exception(e)
+            # 沒有其他等待者時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._async_calls.pop((loop, key), None)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: executed (實際執行次數)、shared (共用結果的次數)、in_flight (執行中的 key 數量)
+        """
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "shared": self.shared,
+                "in_flight": len(self._calls) + len(self._async_calls)
+            }
@@ -0,0 +1,304 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# OTLP 的 span kind 與 status code
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+# 目前執行中的 span (asyncio task 之間自動隔離；切換執行緒時需以 contextvars.copy_context() 傳遞)
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+def default_trace_path() -> str:
+    """
+    取得追蹤紀錄檔案路徑
+
+    優先使用環境變數 TRACE_FILE，否則為 ~/.cache/nkust-calculater/traces.jsonl
+    """
+    path = os.environ.get("TRACE_FILE")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "nkust-calculater", "traces.jsonl")
+
+
+class _NoopSpan:
+    """未取樣時使用的 span，不記錄任何資料"""
+
+    __slots__ = ()
+    recording = False
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def record_error(self, message: str):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Trace:
+    """同一個 trace 內已結束的 span (跨執行緒共用)"""
+
+    __slots__ = ("trace_id", "root", "spans", "lock", "exported")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.root = None
+        self.spans = []
+        self.lock = threading.Lock()
+        self.exported = False
+
+
+class Span:
+    """記錄中的 span"""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "kind", "start_ns", "end_ns", "_started",
+                 "attributes", "error")
+    recording = True
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], kind: int, attributes: Optional[dict]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes) if attributes else {}
+        self.error = None
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter_ns()
+        self.end_ns = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_error(self, message: str):
+        """標記為失敗 (用於已在內部處理、不會拋出的錯誤)"""
+        self.error = message
+
+    def end(self):
+        # 以單調時鐘計算長度，避免系統時間調整影響
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._started)
+
+
+class Tracer:
+    """
+    請求追蹤
+
+    以 contextvars 傳遞目前的 span，IPC 請求、AI_Agent、FinMind 查詢與 Gemini 呼叫各自建立子 span。
+    是否記錄在 trace 開始時決定 (依 sample_rate 取樣，或由呼叫端強制)，未取樣的 trace 幾乎沒有額外負擔；
+    取樣的 trace 在根 span 結束時以 OTLP JSON (ExportTraceServiceRequest) 格式附加一行到檔案，
+    可由 OpenTelemetry Collector 的 otlpjsonfile receiver 或其他支援 OTLP 的工具讀取。
+
+    Example:
+        >>> with TRACER.span("ipc.exchange_rate", kind=KIND_SERVER, sampled=True) as span:
+        ...     with TRACER.span("finmind.request", kind=KIND_CLIENT):
+        ...         ...
+    """
+
+    def __init__(self, sample_rate: float = 0.0, path: Optional[str] = None,
+                 service_name: str = "nkust-calculater-backend"):
+        """
+        Args:
+            sample_rate: 取樣比例 (0 ~ 1)，0 表示只記錄強制取樣的請求
+            path: 輸出檔案路徑 (可選，預設為 default_trace_path())
+            service_name: OTLP resource 的 service.name
+        """
+        self.sample_rate = sample_rate
+        self.path = path
+        self.service_name = service_name
+        self._write_lock = threading.Lock()
+        self.exported = 0
+
+    def configure(self, sample_rate: Optional[float] = None, path: Optional[str] = None):
+        """
+        重新設定取樣比例與輸出位置
+
+        Args:
+            sample_rate: 取樣比例 (可選，預設讀取環境變數 TRACE_SAMPLE_RATE 或 0)
+            path: 輸出檔案路徑 (可選，預設讀取環境變數 TRACE_FILE)
+        """
+        if sample_rate is None:
+            sample_rate = float(os.environ.get("TRACE_SAMPLE_RATE", 0))
+        self.sample_rate = sample_rate
+        self.path = path or default_trace_path()
+
+    @staticmethod
+    def current():
+        """取得目前的 span (沒有時為 None)"""
+        return _current.get()
+
+    @contextmanager
+    def span(self, name: str, kind: int = KIND_INTERNAL, attributes: Optional[dict] = None,
+             trace_id: Optional[str] = None, sampled: Optional[bool] = None):
+        """
+        建立 span
+
+        沒有上層 span 時開始新的 trace；trace_id 與 sampled 只在開始新的 trace 時使用。
+
+        Args:
+            name: span 名稱
+            kind: KIND_INTERNAL、KIND_SERVER 或 KIND_CLIENT
+            attributes: 屬性
+            trace_id: 沿用呼叫端的 trace id (32 個十六進位字元，可選)
+            sampled: 強制記錄 (True) 或不記錄 (False)，None 表示依 sample_rate 取樣
+        """
+        parent = _current.get()
+        if parent is None:
+            if sampled is None:
+                sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+            if not sampled:
+                token = _current.set(_NOOP)
+                try:
+                    yield _NOOP
+                finally:
+                    _current.reset(token)
+                return
+            trace = _Trace(_valid_trace_id(trace_id) or os.urandom(16).hex())
+            span = Span(trace, name, None, kind, attributes)
+            trace.root = span
+        elif not parent.recording:
+            yield _NOOP
+            return
+        else:
+            span = Span(parent.trace, name, parent.span_id, kind, attributes)
+
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+            self._finish(span)
+
+    def start_span(self, name: str, kind: int = KIND_INTERNAL, attributes: Optional[dict] = None):
+        """
+        建立目前 span 的子 span，但不設為目前的 span (需自行呼叫 end_span)
+
+        用於橫跨 yield 的區段 (例如 Gemini 串流)，這類區段可能在不同的 context 中繼續執行，
+        不能使用 span() 設定 contextvars。沒有記錄中的上層 span 時回傳不記錄的 span。
+        """
+        parent = _current.get()
+        if parent is None or not parent.recording:
+            return _NOOP
+        return Span(parent.trace, name, parent.span_id, kind, attributes)
+
+    def end_span(self, span):
+        """結束 start_span 建立的 span"""
+        if span.recording:
+            span.end()
+            self._finish(span)
+
+    def _finish(self, span: Span):
+        trace = span.trace
+        with trace.lock:
+            if trace.exported:
+                # 根 span 結束後才結束的 span (例如背景執行緒) 單獨輸出
+                spans = [span]
+            else:
+                trace.spans.append(span)
+                if span is not trace.root:
+                    return
+                trace.exported = True
+                spans, trace.spans = trace.spans, []
+        self._export(spans)
+
+    def _export(self, spans: list):
+        record = {
+            "resourceSpans": [{
+                "resource": {"attributes": _attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": "nkust-calculater"},
+                    "spans": [_span_json(span) for span in spans]
+                }]
+            }]
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        path = self.path or default_trace_path()
+        try:
+            with self._write_lock:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                self.exported += 1
+        except OSError as e:
+            print(f"Warning: 無法寫入追蹤紀錄: {e}")
+
+
+def _valid_trace_id(value) -> Optional[str]:
+    """呼叫端提供的 trace id 必須是 32 個十六進位字元 (且不可全為 0)"""
+    if not isinstance(value, str) or len(value) != 32:
+        return None
+    try:
+        return value.lower() if int(value, 16) else None
+    except ValueError:
+        return None
+
+
+def _attributes(values: dict) -> list:
+    """轉為 OTLP JSON 的 KeyValue 列表"""
+    result = []
+    for key, value in values.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            encoded = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded = {"doubleValue": value}
+        else:
+            encoded = {"stringValue": str(value)}
+        result.append({"key": key, "value": encoded})
+    return result
+
+
+def _span_json(span: Span) -> dict:
+    data = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _attributes(span.attributes),
+        "status": {"code": STATUS_ERROR, "message": span.error} if span.error else {}
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    return data
+
+
+def run_in_context(fn):
+    """
+    包裝 fn，使其在建立時的 context (包含目前的 span) 中執行
+
+    用於交給其他執行緒執行的函式，例如 threading.Thread(target=run_in_context(fn))。
+    每次呼叫使用 context 的副本，可以同時在多個執行緒執行。
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+# 整個程序共用的追蹤器 (IPCServer 啟動時依環境變數設定)
+TRACER = Tracer()
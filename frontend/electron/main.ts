@@ -86,6 +86,9 @@ function startPythonBackend() {
         // Set up response handler for stdout
         setupPythonResponseHandler();
 
+        // Upgrade to out-of-order responses if the backend supports it
+        negotiateProtocol();
+
         if (pythonProcess.stderr) {
             pythonProcess.stderr.on('data', (data) => {
                 const errorMsg = data.toString();
@@ -127,49 +130,150 @@ function startPythonBackend() {
     }
 }
 
-// Queue to handle pending requests
-let requestQueue: Array<{
+// IPC protocol version supported by this client
+// 1: responses arrive in request order (FIFO)
+// 2: responses may arrive out of order and echo the request id
+const IPC_PROTOCOL_VERSION = 2;
+
+// Protocol version negotiated with the backend (starts at 1 until hello succeeds)
+let protocolVersion = 1;
+
+// Pending requests keyed by correlation id (Map keeps insertion order for FIFO fallback)
+type PendingRequest = {
     resolve: (value: any) => void;
     reject: (reason?: any) => void;
     timer: NodeJS.Timeout;
-}> = [];
+    onChunk?: (chunk: any) => void;
+};
+let pendingRequests = new Map<number, PendingRequest>();
+let nextRequestId = 1;
+
+// Take the pending request a response belongs to
+function takePendingRequest(id?: number): PendingRequest | undefined {
+    if (id !== undefined && pendingRequests.has(id)) {
+        const pending = pendingRequests.get(id);
+        pendingRequests.delete(id);
+        return pending;
+    }
 
-// Set up response handler once
-function setupPythonResponseHandler() {
-    if (!pythonProcess || !pythonProcess.stdout) return;
+    // Backends without correlation ids answer in order
+    if (protocolVersion < 2) {
+        const first = pendingRequests.entries().next();
+        if (!first.done) {
+            pendingRequests.delete(first.value[0]);
+            return first.value[1];
+        }
+    }
+    return undefined;
+}
 
-    pythonProcess.stdout.on('data', (data: Buffer) => {
-        const lines = data.toString().trim().split('\n');
+// Output framing negotiated with the backend
+// line: one JSON response per line
+// length-prefixed: 4-byte big-endian length + UTF-8 JSON payload
+let framing: 'line' | 'length-prefixed' = 'line';
+let stdoutBuffer: Buffer = Buffer.alloc(0);
 
-        for (const line of lines) {
-            if (!line) continue;
+function handlePythonResponse(response: any) {
+    // Switch framing right after the hello response, before reading the next bytes
+    if (response.framing === 'length-prefixed' && response.protocol) {
+        framing = 'length-prefixed';
+    }
 
-            // Skip non-JSON lines (logs, errors, etc.)
-            if (!line.startsWith('{')) {
-                console.log('Python output:', line);
-                continue;
-            }
+    // Streaming chunks keep the request pending until the final response arrives
+    if (response.event === 'chunk') {
+        const streaming = pendingRequests.get(response.id);
+        if (streaming && streaming.onChunk) {
+            streaming.onChunk(response);
+        }
+        return;
+    }
 
+    const pending = takePendingRequest(response.id);
+    if (pending) {
+        clearTimeout(pending.timer);
+        delete response.id;
+        pending.resolve(response);
+    } else {
+        console.warn('Received response for unknown request:', response.id);
+    }
+}
+
+function handleLine(line: string) {
+    if (!line) return;
+
+    // Skip non-JSON lines (logs, errors, etc.)
+    if (!line.startsWith('{')) {
+        console.log('Python output:', line);
+        return;
+    }
+
+    let response: any;
+    try {
+        response = JSON.parse(line);
+    } catch (error) {
+        console.error('Failed to parse Python response:', error, 'Line:', line);
+        const pending = protocolVersion < 2 ? takePendingRequest() : undefined;
+        if (pending) {
+            clearTimeout(pending.timer);
+            pending.reject(error);
+        }
+        return;
+    }
+
+    handlePythonResponse(response);
+}
+
+// Consume as many complete messages as the buffer holds
+function drainStdoutBuffer() {
+    while (stdoutBuffer.length > 0) {
+        if (framing === 'line') {
+            const newline = stdoutBuffer.indexOf(0x0a);
+            if (newline === -1) return;
+            const line = stdoutBuffer.subarray(0, newline).toString('utf8').trim();
+            stdoutBuffer = stdoutBuffer.subarray(newline + 1);
+            handleLine(line);
+        } else {
+            if (stdoutBuffer.length < 4) return;
+            const length = stdoutBuffer.readUInt32BE(0);
+            if (stdoutBuffer.length < 4 + length) return;
+            const payload = stdoutBuffer.subarray(4, 4 + length);
+            stdoutBuffer = stdoutBuffer.subarray(4 + length);
             try {
-                const response = JSON.parse(line);
-                const pending = requestQueue.shift();
-                if (pending) {
-                    clearTimeout(pending.timer);
-                    pending.resolve(response);
-                }
+                handlePythonResponse(JSON.parse(payload.toString('utf8')));
             } catch (error) {
-                console.error('Failed to parse Python response:', error, 'Line:', line);
-                const pending = requestQueue.shift();
-                if (pending) {
-                    clearTimeout(pending.timer);
-                    pending.reject(error);
-                }
+                console.error('Failed to parse Python frame:', error);
             }
         }
+    }
+}
+
+// Set up response handler once
+function setupPythonResponseHandler() {
+    if (!pythonProcess || !pythonProcess.stdout) return;
+
+    pythonProcess.stdout.on('data', (data: Buffer) => {
+        stdoutBuffer = stdoutBuffer.length ? Buffer.concat([stdoutBuffer, data]) : data;
+        drainStdoutBuffer();
     });
 }
 
-function sendToPython(request: any): Promise<any> {
+// Negotiate the IPC protocol version with the backend
+function negotiateProtocol() {
+    sendToPython({ action: 'hello', protocol: IPC_PROTOCOL_VERSION, framing: 'length-prefixed', codec: 'json' })
+        .then((response) => {
+            protocolVersion = response && response.success && response.protocol ? response.protocol : 1;
+            console.log('IPC protocol version:', protocolVersion, 'framing:', framing);
+            if (response && response.ready) {
+                console.log(`Python backend ready (startup ${response.startup_ms} ms)`);
+            }
+        })
+        .catch((error) => {
+            protocolVersion = 1;
+            console.error('IPC protocol negotiation failed, using FIFO mode:', error);
+        });
+}
+
+function sendToPython(request: any, onChunk?: (chunk: any) => void): Promise<any> {
     return new Promise((resolve, reject) => {
         if (!pythonProcess || !pythonProcess.stdin || !pythonProcess.stdout) {
             console.error('Python process not available');
@@ -177,53 +281,53 @@ function sendToPython(request: any): Promise<any> {
             return;
         }
 
+        const id = nextRequestId++;
+
         // Timeout after 30 seconds
         const timer = setTimeout(() => {
-            const index = requestQueue.findIndex(r => r.resolve === resolve);
-            if (index !== -1) {
-                requestQueue.splice(index, 1);
-            }
+            pendingRequests.delete(id);
             reject(new Error('Request timeout'));
         }, 30000);
 
-        // Add to queue
-        requestQueue.push({ resolve, reject, timer });
+        pendingRequests.set(id, { resolve, reject, timer, onChunk });
 
-        const requestStr = JSON.stringify(request) + '\n';
-        console.log('Sending to Python:', request.action);
+        const requestStr = JSON.stringify({ ...request, id }) + '\n';
+        console.log('Sending to Python:', request.action, `(id ${id})`);
+
+        const failRequest = (error: any) => {
+            const pending = pendingRequests.get(id);
+            if (pending) {
+                clearTimeout(pending.timer);
+                pendingRequests.delete(id);
+            }
+            reject(error);
+        };
 
         // Send request
         try {
             pythonProcess.stdin.write(requestStr, (error) => {
                 if (error) {
                     console.error('Failed to write to Python:', error);
-                    const index = requestQueue.findIndex(r => r.resolve === resolve);
-                    if (index !== -1) {
-                        clearTimeout(requestQueue[index].timer);
-                        requestQueue.splice(index, 1);
-                    }
-                    reject(error);
+                    failRequest(error);
                 }
             });
         } catch (error) {
             console.error('Exception while writing to Python:', error);
-            const index = requestQueue.findIndex(r => r.resolve === resolve);
-            if (index !== -1) {
-                clearTimeout(requestQueue[index].timer);
-                requestQueue.splice(index, 1);
-            }
-            reject(error);
+            failRequest(error);
         }
     });
 }
 
 function stopPythonBackend() {
     // Reject all pending requests
-    requestQueue.forEach(({ reject, timer }) => {
+    pendingRequests.forEach(({ reject, timer }) => {
         clearTimeout(timer);
         reject(new Error('Python process shutting down'));
     });
-    requestQueue = [];
+    pendingRequests = new Map();
+    protocolVersion = 1;
+    framing = 'line';
+    stdoutBuffer = Buffer.alloc(0);
 
     if (pythonProcess) {
         pythonProcess.kill();
@@ -379,11 +483,40 @@ ipcMain.handle('bank-agent:get-info', async () => {
     }
 });
 
-ipcMain.handle('bank-agent:chat', async (event, { query }) => {
+ipcMain.handle('bank-agent:chat', async (event, { query, streamId }) => {
     try {
+        // Forward Gemini output to the renderer as it arrives (protocol 2 only)
+        const stream = streamId !== undefined && protocolVersion >= 2;
         return await sendToPython({
             action: 'ai_chat',
-            query
+            query,
+            stream
+        }, stream ? (chunk) => {
+            event.sender.send('bank-agent:chat-chunk', { streamId, text: chunk.text });
+        } : undefined);
+    } catch (error: any) {
+        return { success: false, error: error.message };
+    }
+});
+
+ipcMain.handle('bank-agent:calculate-exchange-batch', async (event, { currencies, twdAmounts, isBuying }) => {
+    try {
+        return await sendToPython({
+            action: 'calculate_exchange_batch',
+            currencies,
+            twd_amounts: twdAmounts,
+            is_buying: isBuying
+        });
+    } catch (error: any) {
+        return { success: false, error: error.message };
+    }
+});
+
+ipcMain.handle('bank-agent:batch', async (event, { requests }) => {
+    try {
+        return await sendToPython({
+            action: 'batch',
+            requests
         });
     } catch (error: any) {
         return { success: false, error: error.message };
@@ -19,6 +19,10 @@ contextBridge.exposeInMainWorld('bankAgent', {
     calculateExchange: (currency: string, twdAmount: number, isBuying: boolean = true) =>
         ipcRenderer.invoke('bank-agent:calculate-exchange', { currency, twdAmount, isBuying }),
 
+    // Convert many amounts at once (one rate lookup per currency)
+    calculateExchangeBatch: (currencies: string[], twdAmounts: number[], isBuying: boolean | boolean[] = true) =>
+        ipcRenderer.invoke('bank-agent:calculate-exchange-batch', { currencies, twdAmounts, isBuying }),
+
     // Get multiple currencies rates
     getMultipleRates: (currencies: string[]) =>
         ipcRenderer.invoke('bank-agent:get-multiple-rates', { currencies }),
@@ -32,6 +36,25 @@ contextBridge.exposeInMainWorld('bankAgent', {
         ipcRenderer.invoke('bank-agent:get-info'),
 
     // AI Chat - Natural language query
-    chat: (query: string) =>
-        ipcRenderer.invoke('bank-agent:chat', { query }),
+    // onChunk receives partial AI output while the answer is being generated
+    chat: async (query: string, onChunk?: (text: string) => void) => {
+        if (!onChunk) {
+            return ipcRenderer.invoke('bank-agent:chat', { query });
+        }
+
+        const streamId = `${Date.now()}-${Math.random()}`;
+        const listener = (_event: Electron.IpcRendererEvent, chunk: { streamId: string; text: string }) => {
+            if (chunk.streamId === streamId) onChunk(chunk.text);
+        };
+        ipcRenderer.on('bank-agent:chat-chunk', listener);
+        try {
+            return await ipcRenderer.invoke('bank-agent:chat', { query, streamId });
+        } finally {
+            ipcRenderer.removeListener('bank-agent:chat-chunk', listener);
+        }
+    },
+
+    // Batch - Run several actions in one IPC round trip
+    batch: (requests: Array<{ action: string; [key: string]: any }>) =>
+        ipcRenderer.invoke('bank-agent:batch', { requests }),
 });
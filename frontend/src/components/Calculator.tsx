@@ -126,7 +126,12 @@ export default function Calculator() {
 
         try {
             // Call AI chat API
-            const response = await window.bankAgent.chat(inputMessage);
+            const response = await window.bankAgent.chat(inputMessage, () => {
+                // Gemini has started answering; the result follows shortly
+                setChatMessages(prev => prev.map(msg =>
+                    msg.type === 'ai-thinking' ? { ...msg, content: '✍️ 正在整理回覆...' } : msg
+                ));
+            });
 
             // Remove thinking message and add AI response
             setChatMessages(prev => {
@@ -11,10 +11,12 @@ declare global {
         bankAgent: {
             getExchangeRate: (currency: string, rateType?: string) => Promise<ExchangeRateResponse>;
             calculateExchange: (currency: string, twdAmount: number, isBuying?: boolean) => Promise<CalculateExchangeResponse>;
+            calculateExchangeBatch: (currencies: string[], twdAmounts: number[], isBuying?: boolean | boolean[]) => Promise<CalculateExchangeBatchResponse>;
             getMultipleRates: (currencies: string[]) => Promise<MultipleRatesResponse>;
             getBankRules: (currency?: string) => Promise<BankRulesResponse>;
             getAgentInfo: () => Promise<AgentInfoResponse>;
-            chat: (query: string) => Promise<AIChatResponse>;
+            chat: (query: string, onChunk?: (text: string) => void) => Promise<AIChatResponse>;
+            batch: (requests: BatchSubRequest[]) => Promise<BatchResponse>;
         };
     }
 }
@@ -81,10 +83,39 @@ export interface AgentInfoResponse {
     error?: string;
 }
 
+export interface CalculateExchangeBatchResponse {
+    success: boolean;
+    count?: number;
+    currencies?: string[];
+    twd_amounts?: number[];
+    is_buying?: boolean[];
+    foreign_amounts?: (number | null)[];
+    rates?: (number | null)[];
+    rate_types?: string[];
+    rates_used?: Record<string, { cash_sell: number; cash_buy: number; date: string }>;
+    warnings?: { index: number; message: string }[];
+    errors?: { index: number; currency: string; error?: string }[];
+    error?: string;
+}
+
 export interface AIChatResponse {
     success: boolean;
     type?: string;
     message?: string;
     data?: any;
     error?: string;
+    streamed?: boolean;
+}
+
+export interface BatchSubRequest {
+    id?: string | number;
+    action: string;
+    [key: string]: any;
+}
+
+export interface BatchResponse {
+    success: boolean;
+    results?: Array<{ id?: string | number; success: boolean; [key: string]: any }>;
+    deduplicated?: number;
+    error?: string;
 }
@@ -17,8 +17,7 @@ print("=" * 60)
 required_modules = [
     'dotenv',
     'google.genai',
-    'requests',
-    'pandas'
+    'requests'
 ]
 
 missing_modules = []
@@ -31,8 +30,6 @@ for module_name in required_modules:
             from dotenv import load_dotenv
         elif module_name == 'requests':
             import requests
-        elif module_name == 'pandas':
-            import pandas
         print(f"✅ {module_name} - 已安裝")
     except ImportError as e:
         print(f"❌ {module_name} - 未安裝")
@@ -142,6 +139,60 @@ try:
 except Exception as e:
     print(f"❌ 測試失敗: {e}")
 
+print("\n" + "=" * 60)
+print("測試 9: IPC Server 啟動時間預算")
+print("=" * 60)
+
+try:
+    from startup_check import run_check
+    report = run_check(runs=3)
+    print(f"   import ipc_server: {report['import_ms']} ms (預算 {report['import_budget_ms']} ms)")
+    print(f"   spawn → hello: {report['ready_ms']} ms (預算 {report['ready_budget_ms']} ms)")
+    if report['heavy_modules']:
+        print(f"   提前載入: {', '.join(report['heavy_modules'])}")
+    if report['passed']:
+        print("✅ 啟動時間在預算內")
+    else:
+        print("❌ 超過啟動時間預算 (詳細報告: cd backend && python3 startup_check.py)")
+        sys.exit(1)
+except Exception as e:
+    print(f"❌ 測試失敗: {e}")
+    sys.exit(1)
+
+print("\n" + "=" * 60)
+print("測試 10: HTTP 斷路器試探請求")
+print("=" * 60)
+
+try:
+    import requests
+    from tool.HttpSession import RetrySession, CircuitBreaker
+
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+    session = RetrySession(breaker=breaker)
+
+    def broken_get(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError("連線中斷")
+
+    session.session.get = broken_get
+    for _ in range(2):
+        now[0] += 60
+        try:
+            session.get("http://finmind.invalid", timeout=1)
+        except requests.exceptions.ChunkedEncodingError:
+            pass
+    # 試探請求失敗後應重新開啟 (而不是停在 half_open)
+    if breaker.state == CircuitBreaker.OPEN:
+        print("✅ 試探請求失敗後斷路器重新開啟")
+    else:
+        print(f"❌ 斷路器狀態錯誤: {breaker.state}")
+        sys.exit(1)
+except SystemExit:
+    raise
+except Exception as e:
+    print(f"❌ 測試失敗: {e}")
+    sys.exit(1)
+
 print("\n" + "=" * 60)
 print("✅ 所有基本測試完成!")
 print("=" * 60)